@@ -75,6 +75,9 @@ def _parse_length(length, subctl=None, default_prefix=None, required=True):
         return (get_int_param(length), default_prefix)
     return (None, default_prefix)
 
+def _get_range(addresses, start, end):
+    return addresses[bisect.bisect_left(addresses, start):bisect.bisect_left(addresses, end)]
+
 class CtlParser:
     def __init__(self, ctls=None):
         self._ctls = ctls or {}
@@ -293,11 +296,11 @@ class CtlParser:
             blocks.append(block)
 
         # Create sub-blocks
+        starts = block_addresses[:-1]
         for sub_address in sorted(self._subctls):
-            for block in blocks:
-                if block.start <= sub_address < block.end:
-                    block.add_block(self._subctls[sub_address], sub_address)
-                    break
+            i = bisect.bisect_right(starts, sub_address) - 1
+            if i >= 0 and sub_address < blocks[i].end:
+                blocks[i].add_block(self._subctls[sub_address], sub_address)
 
         # Set sub-block end addresses
         for block in blocks:
@@ -306,7 +309,8 @@ class CtlParser:
             block.blocks[-1].end = block.end
 
         # Set sub-block attributes
-        asm_directives = tuple(self._asm_directives.items())
+        asm_addresses = sorted(self._asm_directives)
+        ignoreua_addresses = sorted(self._ignoreua_directives)
         for block in blocks:
             for sub_block in block.blocks:
                 sub_address = sub_block.start
@@ -314,11 +318,12 @@ class CtlParser:
                 sub_block.header = self._mid_block_comments.get(sub_address, ())
                 sub_block.comment = self._instruction_comments.get(sub_address) or ''
                 sub_block.multiline_comment = self._multiline_comments.get(sub_address)
-                sub_block.asm_directives = dict([d for d in asm_directives if sub_address <= d[0] < sub_block.end])
+                sub_block.asm_directives = {}
+                for addr in _get_range(asm_addresses, sub_address, sub_block.end):
+                    sub_block.asm_directives[addr] = self._asm_directives[addr]
                 sub_block.ignoreua_directives = {}
-                for addr, dirs in self._ignoreua_directives.items():
-                    if sub_address <= addr < sub_block.end:
-                        sub_block.ignoreua_directives[addr] = tuple(dirs.difference(ENTRY_COMMENT_TYPES))
+                for addr in _get_range(ignoreua_addresses, sub_address, sub_block.end):
+                    sub_block.ignoreua_directives[addr] = tuple(self._ignoreua_directives[addr].difference(ENTRY_COMMENT_TYPES))
 
         return blocks
 
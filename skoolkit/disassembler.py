@@ -16,6 +16,12 @@
 
 from skoolkit.z80 import convert_case
 
+# Operand kinds in a decoded instruction record
+OPERAND_BYTE = 0
+OPERAND_WORD = 1
+OPERAND_INDEX = 2
+OPERAND_ARG = 3
+
 class Instruction:
     def __init__(self, address, operation, data):
         self.address = address
@@ -51,6 +57,7 @@ class Disassembler:
         self.asm_hex = asm_hex
         self.asm_lower = asm_lower
         self.defw_size = 2
+        self.decoded = [None] * 65536
         self.byte_formats = {
             'b': '%{:08b}',
             'h': '${:02X}',
@@ -85,14 +92,17 @@ class Disassembler:
     def disassemble(self, start, end=65536, base=None):
         instructions = []
         address = start
+        decoded = self.decoded
         while address < end:
-            byte = self.snapshot[address]
-            decoder, template = self.ops[byte]
-            if template is None:
-                operation, length = decoder(self, address, base)
-            else:
-                operation, length = decoder(self, template, address, base)
+            record = decoded[address]
+            if record is None:
+                record = decoded[address] = self.decode(address)
+            length, template, operands = record
             if address + length <= 65536:
+                if operands:
+                    operation = self._format_operation(template, operands, base)
+                else:
+                    operation = template
                 if self.asm_lower:
                     operation = convert_case(operation)
                 instructions.append(Instruction(address, operation, self.snapshot[address:address + length]))
@@ -101,24 +111,64 @@ class Disassembler:
             address += length
         return instructions
 
+    def decode(self, address):
+        """Decode the instruction at an address into a
+        `(length, template, operands)` record that is independent of the base
+        in which the operands will eventually be rendered.
+        """
+        decoder, template = self.ops[self.snapshot[address]]
+        if template is None:
+            return decoder(self, address)
+        return decoder(self, template, address)
+
+    def instruction_size(self, address):
+        record = self.decoded[address]
+        if record is None:
+            record = self.decoded[address] = self.decode(address)
+        return min(record[0], 65536 - address)
+
+    def reset(self, start, end):
+        """Discard the decoded instructions that overlap the given address
+        range (after the snapshot has been modified there)."""
+        start = max(start - 3, 0)
+        end = min(end, 65536)
+        for address in range(start, end):
+            self.decoded[address] = None
+
+    def _format_operation(self, template, operands, base):
+        items = []
+        for kind, value in operands:
+            if kind == OPERAND_BYTE:
+                items.append(self.num_str(value, 1, base))
+            elif kind == OPERAND_WORD:
+                items.append(self.num_str(value, 2, base))
+            elif kind == OPERAND_INDEX:
+                if value < 128:
+                    items.append('+{}'.format(self.num_str(value, 1, base)))
+                else:
+                    items.append('-{}'.format(self.num_str(256 - value, 1, base)))
+            elif base:
+                items.append(self.num_str(value, 1, base[-1]))
+            else:
+                items.append(self.num_str(value, 1))
+        return template.format(*items)
+
     def defb_range(self, start, end, sublengths):
         if sublengths[0][0] or end - start <= self.defb_size:
             return [self.defb_line(start, self.snapshot[start:end], sublengths)]
         instructions = []
-        data = []
-        aligned = start % self.defb_mod == 0
-        ready = False
-        for i in range(start, end):
-            data.append(self.snapshot[i])
-            if not aligned and (i + 1) % self.defb_mod == 0:
-                aligned = True
-                ready = True
-            if len(data) == self.defb_size or ready:
-                instructions.append(self.defb_line(i - len(data) + 1, data, sublengths))
-                data = []
-                ready = False
-        if data:
-            instructions.append(self.defb_line(i - len(data) + 1, data, sublengths))
+        if start % self.defb_mod:
+            aligned = start - start % self.defb_mod + self.defb_mod
+        else:
+            aligned = start
+        address = start
+        while address < end:
+            if address < aligned:
+                next_address = min(address + self.defb_size, aligned, end)
+            else:
+                next_address = min(address + self.defb_size, end)
+            instructions.append(self.defb_line(address, self.snapshot[address:next_address], sublengths))
+            address = next_address
         return instructions
 
     def _defw_items(self, data, sublengths):
@@ -189,27 +239,27 @@ class Disassembler:
             message += char
         return message
 
-    def no_arg(self, template, a, base):
-        return template, 1
+    def no_arg(self, template, a):
+        return 1, template, ()
 
-    def byte_arg(self, template, a, base):
-        return template.format(self.num_str(self.snapshot[a + 1], 1, base)), 2
+    def byte_arg(self, template, a):
+        return 2, template, ((OPERAND_BYTE, self.snapshot[a + 1]),)
 
-    def word_arg(self, template, a, base):
-        return template.format(self.num_str(self.snapshot[a + 1] + 256 * self.snapshot[a + 2], 2, base)), 3
+    def word_arg(self, template, a):
+        return 3, template, ((OPERAND_WORD, self.snapshot[a + 1] + 256 * self.snapshot[a + 2]),)
 
-    def jr_arg(self, template, a, base):
+    def jr_arg(self, template, a):
         offset = self.snapshot[a + 1]
         if offset < 128:
             address = a + 2 + offset
         else:
             address = a + offset - 254
         if 0 <= address < 65536:
-            return template.format(self.num_str(address, 2, base)), 2
+            return 2, template, ((OPERAND_WORD, address),)
         return self.defb(a, 2)
 
-    def rst_arg(self, rst_address, a, base):
-        return 'RST {}'.format(self.num_str(rst_address, 1, base)), 1
+    def rst_arg(self, rst_address, a):
+        return 1, 'RST {}', ((OPERAND_BYTE, rst_address),)
 
     def format_byte(self, value, base=None):
         if base not in self.byte_formats:
@@ -250,58 +300,48 @@ class Disassembler:
         return defb_dir
 
     def defb(self, a, length):
-        return self.defb_dir(self.snapshot[a:a + length]), length
+        return length, self.defb_dir(self.snapshot[a:a + length]), ()
 
-    def defb4(self, a, base):
+    def defb4(self, a):
         return self.defb(a, 4)
 
-    def index(self, template, a, base):
-        return template.format(self.index_offset(a, base)), 2
-
-    def index_arg(self, template, a, base):
-        if base:
-            arg_base = base[-1]
-        else:
-            arg_base = None
-        return template.format(self.index_offset(a, base), self.num_str(self.snapshot[a + 2], 1, arg_base)), 3
+    def index(self, template, a):
+        return 2, template, ((OPERAND_INDEX, self.snapshot[a + 1]),)
 
-    def index_offset(self, a, base):
-        i = self.snapshot[a + 1]
-        if i < 128:
-            return '+{}'.format(self.num_str(i, 1, base))
-        return '-{}'.format(self.num_str(abs(i - 256), 1, base))
+    def index_arg(self, template, a):
+        return 3, template, ((OPERAND_INDEX, self.snapshot[a + 1]), (OPERAND_ARG, self.snapshot[a + 2]))
 
-    def cb_arg(self, a, base):
-        return self.after_CB[self.snapshot[a + 1]], 2
+    def cb_arg(self, a):
+        return 2, self.after_CB[self.snapshot[a + 1]], ()
 
-    def ed_arg(self, a, base):
+    def ed_arg(self, a):
         decoder, template = self.after_ED.get(self.snapshot[a + 1], (None, None))
         if template:
-            operation, length = decoder(self, template, a + 1, base)
-            return operation, length + 1
+            length, template, operands = decoder(self, template, a + 1)
+            return length + 1, template, operands
         if decoder:
-            return decoder(self, a, base)
+            return decoder(self, a)
         return self.defb(a, 2)
 
-    def dd_arg(self, a, base):
+    def dd_arg(self, a):
         decoder, template = self.after_DD.get(self.snapshot[a + 1], (None, None))
         if template:
-            operation, length = decoder(self, template, a + 1, base)
-            return operation, length + 1
+            length, template, operands = decoder(self, template, a + 1)
+            return length + 1, template, operands
         if decoder:
-            return decoder(self, a, base)
+            return decoder(self, a)
         # The instruction is unchanged by the DD prefix
         return self.defb(a, 1)
 
-    def fd_arg(self, a, base):
-        operation, length = self.dd_arg(a, base)
-        return operation.replace('IX', 'IY'), length
+    def fd_arg(self, a):
+        length, template, operands = self.dd_arg(a)
+        return length, template.replace('IX', 'IY'), operands
 
-    def ddcb_arg(self, a, base):
+    def ddcb_arg(self, a):
         decoder, template = self.after_DDCB.get(self.snapshot[a + 3], (None, None))
         if template:
-            operation = decoder(self, template, a + 1, base)[0]
-            return operation, 4
+            operands = decoder(self, template, a + 1)[2]
+            return 4, template, operands
         return self.defb(a, 4)
 
     def defb_line(self, address, data, sublengths=((None, None),)):
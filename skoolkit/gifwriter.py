@@ -23,9 +23,13 @@ BINSTR = [['{:0{}b}'.format(n, width) for n in range(2 ** width)] for width in r
 BITS8 = [[(n >> m) & 1 for m in (7, 6, 5, 4, 3, 2, 1, 0)] for n in range(256)]
 
 class GifWriter:
-    def __init__(self, transparency, masks):
+    def __init__(self, transparency, masks, int_lzw=True):
         self.transparency = transparency
         self.masks = masks
+        if int_lzw:
+            self._compress = self._compress_int
+        else:
+            self._compress = self._compress_str
         self.gif_header = bytearray(GIF89A)
         self.aeb = bytearray(AEB)
         self.gif_trailer = bytearray((GIF_TRAILER,))
@@ -184,7 +188,68 @@ class GifWriter:
             pixels.append(''.join(pixel_row7) * scale)
         return ''.join(pixels)
 
-    def _compress(self, pixels, min_code_size):
+    def _compress_int(self, pixels, min_code_size):
+        # LZW compression using a dictionary that maps (prefix code, pixel)
+        # pairs to codes, and integer bit packing
+        clear_code = 1 << min_code_size
+        first_code = clear_code + 2
+        init_code_size = min_code_size + 1
+        d = {}
+        next_code = first_code
+        code_size = init_code_size
+        d_limit = 1 << code_size
+        output = bytearray()
+        bit_buf = clear_code
+        num_bits = code_size
+        data = pixels.encode('latin-1')
+        prefix = data[0]
+        for pixel in data[1:]:
+            key = (prefix << 8) + pixel
+            code = d.get(key)
+            if code is not None:
+                prefix = code
+                continue
+
+            # Output the code for the longest substring in the dictionary
+            bit_buf += prefix << num_bits
+            num_bits += code_size
+            while num_bits > 7:
+                output.append(bit_buf & 255)
+                bit_buf >>= 8
+                num_bits -= 8
+
+            # Add the code for the new substring
+            if next_code == d_limit:
+                code_size += 1
+                d_limit *= 2
+            d[key] = next_code
+            next_code += 1
+            prefix = pixel
+
+            # Check for max dictionary length
+            if next_code == 4096:
+                # Output a CLEAR code
+                bit_buf += clear_code << num_bits
+                num_bits += 12
+                # Initialise the dictionary and reset the code size
+                d = {}
+                next_code = first_code
+                code_size = init_code_size
+                d_limit = 1 << code_size
+
+        # Output the code for the last substring, followed by the STOP code
+        bit_buf += (prefix + (clear_code + 1 << code_size)) << num_bits
+        num_bits += 2 * code_size
+
+        # Flush any remaining bits from the buffer
+        while num_bits > 0:
+            output.append(bit_buf & 255)
+            bit_buf >>= 8
+            num_bits -= 8
+
+        return output
+
+    def _compress_str(self, pixels, min_code_size):
         # Initialise the dictionary
         init_d = {chr(i): i for i in range(1 << min_code_size)}
 
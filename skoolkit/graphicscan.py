@@ -0,0 +1,280 @@
+# Copyright 2017 Richard Dymond (rjdymond@gmail.com)
+#
+# This file is part of SkoolKit.
+#
+# SkoolKit is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# SkoolKit is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# SkoolKit. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+from itertools import accumulate, compress, repeat
+from operator import add, and_, floordiv, ge, gt, le, mul, not_, sub, xor
+
+from skoolkit.graphics import Frame, Udg
+
+def _table(f):
+    return bytes([f(b) for b in range(256)])
+
+def _entropy(b):
+    # The entropy of a row of 8 pixels, from 0 (all ink or all paper) to 100
+    p = bin(b).count('1') / 8
+    if p in (0, 1):
+        return 0
+    return int(-100 * (p * math.log(p, 2) + (1 - p) * math.log(1 - p, 2)))
+
+POPCOUNT = _table(lambda b: bin(b).count('1'))
+ENTROPY = _table(_entropy)
+NONZERO = _table(lambda b: int(b > 0))
+ZERO = _table(lambda b: int(b == 0))
+FULL = _table(lambda b: int(b == 255))
+NOT_FULL = _table(lambda b: int(b < 255))
+SYMMETRIC = _table(lambda b: int(b > 0 and '{:08b}'.format(b) == '{:08b}'.format(b)[::-1]))
+EDGED = _table(lambda b: int('1' not in '{:08b}'.format(b).strip('1')))
+
+# Layouts of 8-row graphics: kind, distance between rows, and the offsets of
+# the graphic bytes and the mask bytes from the start of the block
+LAYOUTS = (
+    ('udg', 1, 0, None),
+    ('masked', 2, 0, 1),
+    ('masked', 2, 1, 0),
+    ('masked', 1, 0, 8),
+    ('masked', 1, 8, 0)
+)
+
+FONT_LENGTH = 768
+
+class Candidate:
+    """A block of data that looks like graphic data.
+
+    :param kind: 'udg' (8 bytes), 'masked' (8 bytes of graphic data and 8
+                 bytes of mask data) or 'font' (96 characters).
+    :param score: The score (the higher, the more likely the data is
+                  graphic data).
+    :param address: The address of the start of the block.
+    :param length: The length of the block.
+    :param udg_addr: The address of the graphic data.
+    :param step: The distance between rows of graphic data.
+    :param mask_addr: The address of the mask data (if any).
+    :param data: The contents of the block.
+    """
+    def __init__(self, kind, score, address, length, udg_addr, step, mask_addr, data):
+        self.kind = kind
+        self.score = score
+        self.address = address
+        self.length = length
+        self.udg_addr = udg_addr
+        self.step = step
+        self.mask_addr = mask_addr
+        self.data = data
+
+    @property
+    def macro(self):
+        """The skool macro that renders the graphic data."""
+        if self.kind == 'font':
+            return '#FONT{}'.format(self.udg_addr)
+        macro = '#UDG{}'.format(self.udg_addr)
+        if self.step > 1:
+            macro += ',step={}'.format(self.step)
+        if self.mask_addr is not None:
+            macro += ':{}'.format(self.mask_addr)
+        return macro
+
+    def udgs(self, attr=56):
+        """Return the UDGs (instances of :class:`~skoolkit.graphics.Udg`) that
+        the graphic data consists of.
+
+        :param attr: The attribute byte to use.
+        """
+        if self.kind == 'font':
+            return [Udg(attr, list(self.data[i:i + 8])) for i in range(0, FONT_LENGTH, 8)]
+        i = self.udg_addr - self.address
+        udg_bytes = list(self.data[i:i + 8 * self.step:self.step])
+        mask_bytes = None
+        if self.mask_addr is not None:
+            i = self.mask_addr - self.address
+            mask_bytes = list(self.data[i:i + 8 * self.step:self.step])
+        return [Udg(attr, udg_bytes, mask_bytes)]
+
+def _window_sums(values, length, step=1):
+    # Return a list whose element at index a is the sum of
+    # values[a + k * step] for k in range(length), computed from the prefix
+    # sums of each strided column of values
+    n = len(values) - (length - 1) * step
+    if n <= 0:
+        return []
+    sums = [0] * n
+    for r in range(min(step, n)):
+        prefix = [0]
+        prefix.extend(accumulate(values[r::step]))
+        sums[r::step] = list(map(sub, prefix[length:], prefix[:-length]))[:len(range(r, n, step))]
+    return sums
+
+def _at_least(values, n):
+    return map(ge, values, repeat(n))
+
+def _at_most(values, n):
+    return map(le, values, repeat(n))
+
+def _all(*conditions):
+    valid = conditions[0]
+    for condition in conditions[1:]:
+        valid = map(and_, valid, condition)
+    return valid
+
+def _scale(values, factor):
+    return map(mul, values, repeat(factor))
+
+def _score_rows(data, step):
+    # Score the 8 rows of graphic data at every address in one batch: rows
+    # should be varied but smooth (few pixels change from one row to the
+    # next), preferably symmetric, and neither mostly blank nor mostly solid;
+    # return the scores (0 if the rows are unlikely to be graphic data)
+    changes = bytes(map(xor, data, data[step:]))
+    hd = _window_sums(changes.translate(POPCOUNT), 7, step)
+    non_blank = _window_sums(data.translate(NONZERO), 8, step)
+    valid = _all(
+        _at_least(non_blank, 5),
+        _at_least(_window_sums(changes.translate(NONZERO), 7, step), 3),
+        _at_most(hd, 24),
+        _at_most(_window_sums(data.translate(FULL), 8, step), 2)
+    )
+    scores = map(add, map(sub, repeat(60), hd), _scale(_window_sums(data.translate(SYMMETRIC), 8, step), 3))
+    scores = map(add, scores, _scale(non_blank, 4))
+    scores = map(add, scores, map(floordiv, _window_sums(data.translate(ENTROPY), 8, step), repeat(40)))
+    return list(map(mul, scores, valid))
+
+def _score_masks(data, step, distance):
+    # Score the 8 rows of mask data at every address in one batch against the
+    # graphic data a given distance away (before or after): a mask byte should
+    # have no bits in common with its graphic byte, most mask bytes should have
+    # their set bits at the edges (around the outline of the sprite), few mask
+    # rows should be blank, and the mask rows should be smooth; return the
+    # scores (0 if the rows are unlikely to be mask data), the validity of the
+    # graphic data at every address, and the number of edged bytes at every
+    # address
+    clashes = _window_sums(bytes(map(and_, data, data[distance:])).translate(NONZERO), 8, step)
+    valid = list(map(not_, clashes))
+    hd = _window_sums(bytes(map(xor, data, data[step:])).translate(POPCOUNT), 7, step)
+    edged = _window_sums(data.translate(EDGED), 8, step)
+    masks = _all(
+        _at_least(_window_sums(data.translate(NOT_FULL), 8, step), 4),
+        _at_least(_window_sums(data.translate(NONZERO), 8, step), 4),
+        _at_least(edged, 6),
+        _at_most(hd, 24)
+    )
+    scores = map(sub, repeat(20), map(floordiv, hd, repeat(2)))
+    return list(map(mul, scores, masks)), valid, edged
+
+def _score_udgs(data, rows, step, g_off, m_off):
+    # Combine the scores of the graphic rows and the mask rows (if any) of the
+    # blocks at every address; a mask should have more edged bytes than its
+    # graphic
+    scores = rows[g_off:]
+    if m_off is None:
+        return scores
+    masks, no_clashes, edged = _score_masks(data, step, abs(g_off - m_off))
+    valid = _all(
+        map(bool, scores),
+        map(bool, masks[m_off:]),
+        no_clashes[min(g_off, m_off):],
+        map(gt, edged[m_off:], edged[g_off:])
+    )
+    return list(map(mul, map(add, scores, masks[m_off:]), valid))
+
+def _score_fonts(data):
+    # Score every 768-byte block as a font: the first character (space)
+    # should be blank, most characters should not be, most should have a
+    # blank top row or a blank bottom row (and the more blank edge rows the
+    # better), and the characters should be smooth
+    zero = data.translate(ZERO)
+    top = _window_sums(zero, 96, 8)
+    bottom = _window_sums(zero[7:], 96, 8)
+    edges = list(map(add, top, bottom))
+    char_bytes = _window_sums(data.translate(NONZERO), 8)
+    non_blank = _window_sums(list(map(bool, char_bytes)), 96, 8)
+    changes = bytes(map(xor, data, data[1:])).translate(POPCOUNT)
+    hd = _window_sums(_window_sums(changes, 7), 96, 8)
+    conditions = (
+        map(not_, char_bytes),
+        _at_least(map(max, top, bottom), 80),
+        _at_least(non_blank, 90),
+        _at_most(hd, 1920)
+    )
+    return list(compress(enumerate(map(add, edges, non_blank)), _all(*conditions)))
+
+def scan_graphics(data, start=0, end=None, limit=None, org=0):
+    """Scan a buffer for blocks of data that look like graphic data (plain
+    UDGs, UDGs with masks, and fonts), and return them in order of score. No
+    two blocks returned overlap.
+
+    :param data: The buffer to scan (`bytes` or `bytearray`).
+    :param start: The address at which to start scanning.
+    :param end: The address at which to stop scanning (default: the end of the
+                buffer).
+    :param limit: The maximum number of blocks to return (default: no limit).
+    :param org: The address of the first byte in the buffer.
+    :return: A list of :class:`Candidate` objects.
+    """
+    if end is None:
+        end = org + len(data)
+    data = bytes(data[max(start - org, 0):end - org])
+    org = max(start, org)
+    scored = []
+    for index, score in _score_fonts(data):
+        scored.append((-score, -1, index))
+    rows = {step: _score_rows(data, step) for step in set(layout[1] for layout in LAYOUTS)}
+    for i, (kind, step, g_off, m_off) in enumerate(LAYOUTS):
+        scores = _score_udgs(data, rows[step], step, g_off, m_off)
+        scored.extend([(-scores[a], i, a) for a in compress(range(len(scores)), scores)])
+    scored.sort()
+    candidates = []
+    taken = bytearray(len(data))
+    for neg_score, layout, index in scored:
+        if layout < 0:
+            kind, step, length, g_off, m_off = 'font', 1, FONT_LENGTH, 0, None
+        else:
+            kind, step, g_off, m_off = LAYOUTS[layout]
+            length = 7 * step + 1 + max(g_off, m_off or 0)
+        if index + length <= len(data) and taken.find(1, index, index + length) < 0:
+            taken[index:index + length] = bytes([1]) * length
+            address = org + index
+            mask_addr = None if m_off is None else address + m_off
+            candidates.append(Candidate(kind, -neg_score, address, length, address + g_off, step, mask_addr, data[index:index + length]))
+            if len(candidates) == limit:
+                break
+    return candidates
+
+def contact_sheet(candidates, width=16, scale=2):
+    """Return a :class:`~skoolkit.graphics.Frame` that shows the graphic data
+    of a list of candidates in a grid, in order. A font occupies its own rows
+    of the grid.
+
+    :param candidates: The candidates.
+    :param width: The width of the grid (in UDGs).
+    :param scale: The scale of the image.
+    """
+    rows = [[]]
+    for i, candidate in enumerate(candidates):
+        udgs = candidate.udgs((56, 40)[i % 2])
+        if len(udgs) > 1 and rows[-1]:
+            rows.append([])
+        for udg in udgs:
+            if len(rows[-1]) == width:
+                rows.append([])
+            rows[-1].append(udg)
+        if len(udgs) > 1:
+            rows.append([])
+    if not rows[-1]:
+        rows.pop()
+    blank = Udg(56, [0] * 8)
+    for row in rows:
+        row.extend([blank] * (width - len(row)))
+    return Frame(rows or [[blank]], scale)
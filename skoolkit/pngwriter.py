@@ -16,6 +16,8 @@
 
 import zlib
 
+from skoolkit.graphics import Udg
+
 # http://www.libpng.org/pub/png/spec/iso/index-object.html
 # https://wiki.mozilla.org/APNG_Specification
 PNG_SIGNATURE = (137, 80, 78, 71, 13, 10, 26, 10)
@@ -29,24 +31,29 @@ FDAT = (102, 100, 65, 84)
 IEND_CHUNK = (0, 0, 0, 0, 73, 69, 78, 68, 174, 66, 96, 130)
 CRC_MASK = 4294967295
 
-BITS4 = [[int(d) for d in '{:04b}'.format(n)] for n in range(16)]
-BIT_PAIRS = [[((n << m) & 128) // 64 + ((n << m) & 8) // 8 for m in range(4)] for n in range(256)]
-
-BD_BYTES = {d: {1: [(i,) for i in range(256)]} for d in (1, 2, 4)}
-
-def _get_bytes(depth, scale):
-    bd_bytes = BD_BYTES.setdefault(depth, {})
-    if scale not in bd_bytes:
-        bd_bytes[scale] = []
-        for p in ['{:08b}'.format(v) for v in range(256)]:
-            if depth == 1:
-                b = ''.join([d * scale for d in p])
-            elif depth == 2:
-                b = p[:2] * scale + p[2:4] * scale + p[4:6] * scale + p[6:] * scale
-            else:
-                b = p[:4] * scale + p[4:] * scale
-            bd_bytes[scale].append(tuple([int(b[i:i + 8], 2) for i in range(0, len(b), 8)]))
-    return bd_bytes[scale]
+class _Patterns(dict):
+    # Maps (attribute, byte, mask byte) combinations to byte patterns, each
+    # of which is built when first needed
+    def __init__(self, attr_map, mask, bit_depth, scale, masked):
+        self.attr_map = attr_map
+        self.mask = mask
+        self.bit_depth = bit_depth
+        self.scale = scale
+        self.masked = masked
+
+    def __missing__(self, key):
+        if self.masked:
+            attr, byte, mask_byte = key >> 16, (key >> 8) & 255, key & 255
+        else:
+            attr, byte, mask_byte = key >> 8, key & 255, key & 255
+        paper, ink = self.attr_map[attr]
+        bit_depth = self.bit_depth
+        value = 0
+        for pixel in self.mask.apply(Udg(attr, (byte,), (mask_byte,)), 0, paper, ink, 0):
+            for i in range(self.scale):
+                value = (value << bit_depth) + pixel
+        pattern = self[key] = value.to_bytes(bit_depth * self.scale, 'big')
+        return pattern
 
 class PngWriter:
     def __init__(self, alpha=255, compression_level=9, masks=None):
@@ -140,26 +147,17 @@ class PngWriter:
                 for masked in (0, 1):
                     fs_method_dict[masked] = self._build_image_data_bd_any
 
+        # Bit depths 1, 2 and 4 (full size)
+        for bit_depth in (1, 2, 4):
+            fs_method_dict = self.png_method_dict[bit_depth][1]
+            fs_method_dict[0] = self._build_image_data_bulk_nt # Unmasked
+            fs_method_dict[1] = self._build_image_data_bulk_at # Masked
+
         # Bit depth 0 (1 colour)
         bd0_fs_method_dict = self.png_method_dict[0][1]
         bd0_fs_method_dict[0] = self._build_image_data_bd0 # Unmasked
         bd0_fs_method_dict[1] = self._build_image_data_bd0 # Masked
 
-        # Bit depth 1 (2 colours)
-        bd1_fs_method_dict = self.png_method_dict[1][1]
-        bd1_fs_method_dict[0] = self._build_image_data_bd1_nt # Unmasked
-        bd1_fs_method_dict[1] = self._build_image_data_bd1_at # Masked
-
-        # Bit depth 2
-        bd2_fs_method_dict = self.png_method_dict[2][1]
-        bd2_fs_method_dict[0] = self._build_image_data_bd2_nt # Unmasked
-        bd2_fs_method_dict[1] = self._build_image_data_bd2_at # Masked
-
-        # Bit depth 4
-        bd4_fs_method_dict = self.png_method_dict[4][1]
-        bd4_fs_method_dict[0] = self._build_image_data_bd4_nt # Unmasked
-        bd4_fs_method_dict[1] = self._build_image_data_bd_any # Masked
-
     def _to_bytes(self, num):
         return (num >> 24, (num >> 16) & 255, (num >> 8) & 255, num & 255)
 
@@ -245,28 +243,6 @@ class PngWriter:
         img_file.write(img_data)
         img_file.write(bytearray(self._get_crc(img_data))) # CRC
 
-    def _scan_frame(self, frame, scan_udg_f, *args):
-        compressor = zlib.compressobj(self.compression_level)
-        img_data = bytearray()
-        scale = frame.scale
-        for row in frame.udgs:
-            scanlines = (
-                bytearray((0,)), bytearray((0,)), bytearray((0,)), bytearray((0,)),
-                bytearray((0,)), bytearray((0,)), bytearray((0,)), bytearray((0,))
-            )
-            for udg in row:
-                scan_udg_f(udg, scanlines, *args)
-            img_data.extend(compressor.compress(scanlines[0] * scale))
-            img_data.extend(compressor.compress(scanlines[1] * scale))
-            img_data.extend(compressor.compress(scanlines[2] * scale))
-            img_data.extend(compressor.compress(scanlines[3] * scale))
-            img_data.extend(compressor.compress(scanlines[4] * scale))
-            img_data.extend(compressor.compress(scanlines[5] * scale))
-            img_data.extend(compressor.compress(scanlines[6] * scale))
-            img_data.extend(compressor.compress(scanlines[7] * scale))
-        img_data.extend(compressor.flush())
-        return img_data
-
     def _build_image_data_bd_any(self, frame, mask, bit_depth):
         # Build image data at any bit depth using a generic method
         compressor = zlib.compressobj(self.compression_level)
@@ -338,166 +314,39 @@ class PngWriter:
         img_data.extend(compressor.flush())
         return img_data
 
-    def _scan_udg_bd4_nt(self, udg, scanlines, attrs):
-        pixels = attrs[udg.attr & 127]
-        udg_bytes = udg.data
-        byte = udg_bytes[0]
-        scanlines[0].extend(pixels[byte // 16])
-        scanlines[0].extend(pixels[byte & 15])
-        byte = udg_bytes[1]
-        scanlines[1].extend(pixels[byte // 16])
-        scanlines[1].extend(pixels[byte & 15])
-        byte = udg_bytes[2]
-        scanlines[2].extend(pixels[byte // 16])
-        scanlines[2].extend(pixels[byte & 15])
-        byte = udg_bytes[3]
-        scanlines[3].extend(pixels[byte // 16])
-        scanlines[3].extend(pixels[byte & 15])
-        byte = udg_bytes[4]
-        scanlines[4].extend(pixels[byte // 16])
-        scanlines[4].extend(pixels[byte & 15])
-        byte = udg_bytes[5]
-        scanlines[5].extend(pixels[byte // 16])
-        scanlines[5].extend(pixels[byte & 15])
-        byte = udg_bytes[6]
-        scanlines[6].extend(pixels[byte // 16])
-        scanlines[6].extend(pixels[byte & 15])
-        byte = udg_bytes[7]
-        scanlines[7].extend(pixels[byte // 16])
-        scanlines[7].extend(pixels[byte & 15])
-
-    def _build_image_data_bd4_nt(self, frame, *args):
-        # Bit depth 4, full size, no masks
-        p = _get_bytes(4, frame.scale)
-        attrs = {attr: [p[t[d] * 16 + t[c]] + p[t[b] * 16 + t[a]] for d, c, b, a in BITS4] for attr, t in frame.attr_map.items()}
-        return self._scan_frame(frame, self._scan_udg_bd4_nt, attrs)
-
-    def _scan_udg_bd2_nt(self, udg, scanlines, attrs):
-        pixels = attrs[udg.attr & 127]
-        udg_bytes = udg.data
-        byte = udg_bytes[0]
-        scanlines[0].extend(pixels[byte // 16])
-        scanlines[0].extend(pixels[byte & 15])
-        byte = udg_bytes[1]
-        scanlines[1].extend(pixels[byte // 16])
-        scanlines[1].extend(pixels[byte & 15])
-        byte = udg_bytes[2]
-        scanlines[2].extend(pixels[byte // 16])
-        scanlines[2].extend(pixels[byte & 15])
-        byte = udg_bytes[3]
-        scanlines[3].extend(pixels[byte // 16])
-        scanlines[3].extend(pixels[byte & 15])
-        byte = udg_bytes[4]
-        scanlines[4].extend(pixels[byte // 16])
-        scanlines[4].extend(pixels[byte & 15])
-        byte = udg_bytes[5]
-        scanlines[5].extend(pixels[byte // 16])
-        scanlines[5].extend(pixels[byte & 15])
-        byte = udg_bytes[6]
-        scanlines[6].extend(pixels[byte // 16])
-        scanlines[6].extend(pixels[byte & 15])
-        byte = udg_bytes[7]
-        scanlines[7].extend(pixels[byte // 16])
-        scanlines[7].extend(pixels[byte & 15])
-
-    def _build_image_data_bd2_nt(self, frame, *args):
-        # Bit depth 2, full size, no masks
-        bits = _get_bytes(2, frame.scale)
-        attrs = {attr: [bits[t[d] * 64 + t[c] * 16 + t[b] * 4 + t[a]] for d, c, b, a in BITS4] for attr, t in frame.attr_map.items()}
-        return self._scan_frame(frame, self._scan_udg_bd2_nt, attrs)
-
-    def _scan_udg_bd2_at(self, udg, scanlines, attrs):
-        pixels = attrs[udg.attr & 127]
-        udg_bytes = udg.data
-        mask_bytes = udg.mask or udg_bytes
-        byte = udg_bytes[0]
-        mask_byte = mask_bytes[0]
-        scanlines[0].extend(pixels[(byte & 240) + mask_byte // 16])
-        scanlines[0].extend(pixels[(byte & 15) * 16 + (mask_byte & 15)])
-        byte = udg_bytes[1]
-        mask_byte = mask_bytes[1]
-        scanlines[1].extend(pixels[(byte & 240) + mask_byte // 16])
-        scanlines[1].extend(pixels[(byte & 15) * 16 + (mask_byte & 15)])
-        byte = udg_bytes[2]
-        mask_byte = mask_bytes[2]
-        scanlines[2].extend(pixels[(byte & 240) + mask_byte // 16])
-        scanlines[2].extend(pixels[(byte & 15) * 16 + (mask_byte & 15)])
-        byte = udg_bytes[3]
-        mask_byte = mask_bytes[3]
-        scanlines[3].extend(pixels[(byte & 240) + mask_byte // 16])
-        scanlines[3].extend(pixels[(byte & 15) * 16 + (mask_byte & 15)])
-        byte = udg_bytes[4]
-        mask_byte = mask_bytes[4]
-        scanlines[4].extend(pixels[(byte & 240) + mask_byte // 16])
-        scanlines[4].extend(pixels[(byte & 15) * 16 + (mask_byte & 15)])
-        byte = udg_bytes[5]
-        mask_byte = mask_bytes[5]
-        scanlines[5].extend(pixels[(byte & 240) + mask_byte // 16])
-        scanlines[5].extend(pixels[(byte & 15) * 16 + (mask_byte & 15)])
-        byte = udg_bytes[6]
-        mask_byte = mask_bytes[6]
-        scanlines[6].extend(pixels[(byte & 240) + mask_byte // 16])
-        scanlines[6].extend(pixels[(byte & 15) * 16 + (mask_byte & 15)])
-        byte = udg_bytes[7]
-        mask_byte = mask_bytes[7]
-        scanlines[7].extend(pixels[(byte & 240) + mask_byte // 16])
-        scanlines[7].extend(pixels[(byte & 15) * 16 + (mask_byte & 15)])
-
-    def _build_image_data_bd2_at(self, frame, mask, *args):
-        # Bit depth 2, full size, masked
-        attrs = {}
-        bits = _get_bytes(2, frame.scale)
-        for attr, (paper, ink) in frame.attr_map.items():
-            p = mask.colours((paper, ink, 0), 0, 1, 2)
-            attrs[attr] = [bits[p[d] * 64 + p[c] * 16 + p[b] * 4 + p[a]] for d, c, b, a in BIT_PAIRS]
-        return self._scan_frame(frame, self._scan_udg_bd2_at, attrs)
-
-    def _scan_udg_bd1_nt(self, udg, scanlines, attrs, bits):
-        paper, ink = attrs[udg.attr & 127]
-        b_mask = paper * 255
-        if ink == paper:
-            data = bits[b_mask]
-            scanlines[0].extend(data)
-            scanlines[1].extend(data)
-            scanlines[2].extend(data)
-            scanlines[3].extend(data)
-            scanlines[4].extend(data)
-            scanlines[5].extend(data)
-            scanlines[6].extend(data)
-            scanlines[7].extend(data)
-        else:
-            udg_data = udg.data
-            scanlines[0].extend(bits[udg_data[0] ^ b_mask])
-            scanlines[1].extend(bits[udg_data[1] ^ b_mask])
-            scanlines[2].extend(bits[udg_data[2] ^ b_mask])
-            scanlines[3].extend(bits[udg_data[3] ^ b_mask])
-            scanlines[4].extend(bits[udg_data[4] ^ b_mask])
-            scanlines[5].extend(bits[udg_data[5] ^ b_mask])
-            scanlines[6].extend(bits[udg_data[6] ^ b_mask])
-            scanlines[7].extend(bits[udg_data[7] ^ b_mask])
-
-    def _build_image_data_bd1_nt(self, frame, *args):
-        # 2 colours, full size, no masks
-        bits = _get_bytes(1, frame.scale)
-        return self._scan_frame(frame, self._scan_udg_bd1_nt, frame.attr_map, bits)
-
-    def _scan_udg_bd1_at(self, udg, scanlines, mask, attrs, pixels, bits):
-        p, i = attrs[udg.attr & 127]
-        paper, ink = pixels[p], pixels[i]
-        scanlines[0].extend(bits[int(''.join(mask.apply(udg, 0, paper, ink, '0')), 2)])
-        scanlines[1].extend(bits[int(''.join(mask.apply(udg, 1, paper, ink, '0')), 2)])
-        scanlines[2].extend(bits[int(''.join(mask.apply(udg, 2, paper, ink, '0')), 2)])
-        scanlines[3].extend(bits[int(''.join(mask.apply(udg, 3, paper, ink, '0')), 2)])
-        scanlines[4].extend(bits[int(''.join(mask.apply(udg, 4, paper, ink, '0')), 2)])
-        scanlines[5].extend(bits[int(''.join(mask.apply(udg, 5, paper, ink, '0')), 2)])
-        scanlines[6].extend(bits[int(''.join(mask.apply(udg, 6, paper, ink, '0')), 2)])
-        scanlines[7].extend(bits[int(''.join(mask.apply(udg, 7, paper, ink, '0')), 2)])
-
-    def _build_image_data_bd1_at(self, frame, mask, *args):
-        # Bit depth 1, full size, masked
-        pixels = ('0', '1')
-        bits = _get_bytes(1, frame.scale)
-        return self._scan_frame(frame, self._scan_udg_bd1_at, mask, frame.attr_map, pixels, bits)
+    def _build_image_data_bulk_nt(self, frame, mask, bit_depth):
+        # Any bit depth, full size, no masks
+        compressor = zlib.compressobj(self.compression_level)
+        img_data = bytearray()
+        scale = frame.scale
+        patterns = _Patterns(frame.attr_map, mask, bit_depth, scale, False)
+        for row in frame.udgs:
+            attrs = [(udg.attr & 127) << 8 for udg in row]
+            scanlines = []
+            for udg_bytes in zip(*[udg.data for udg in row]):
+                scanline = b'\x00' + b''.join([patterns[a + b] for a, b in zip(attrs, udg_bytes)])
+                scanlines.append(scanline * scale)
+            img_data.extend(compressor.compress(b''.join(scanlines)))
+        img_data.extend(compressor.flush())
+        return img_data
+
+    def _build_image_data_bulk_at(self, frame, mask, bit_depth):
+        # Any bit depth, full size, masked
+        compressor = zlib.compressobj(self.compression_level)
+        img_data = bytearray()
+        scale = frame.scale
+        patterns = _Patterns(frame.attr_map, mask, bit_depth, scale, True)
+        for row in frame.udgs:
+            attrs = [(udg.attr & 127) << 16 for udg in row]
+            udg_bytes = zip(*[udg.data for udg in row])
+            mask_bytes = zip(*[udg.mask or udg.data for udg in row])
+            scanlines = []
+            for data, masks in zip(udg_bytes, mask_bytes):
+                scanline = b'\x00' + b''.join([patterns[a + (b << 8) + m] for a, b, m in zip(attrs, data, masks)])
+                scanlines.append(scanline * scale)
+            img_data.extend(compressor.compress(b''.join(scanlines)))
+        img_data.extend(compressor.flush())
+        return img_data
 
     def _build_image_data_bd0(self, frame, *args):
         # 1 colour (i.e. blank), full size; placing the integer value in
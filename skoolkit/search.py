@@ -0,0 +1,79 @@
+# Copyright 2017 Richard Dymond (rjdymond@gmail.com)
+#
+# This file is part of SkoolKit.
+#
+# SkoolKit is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# SkoolKit is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# SkoolKit. If not, see <http://www.gnu.org/licenses/>.
+
+import re
+
+def find_patterns(data, patterns, steps=(1,), start=0, end=None):
+    """Search a buffer for one or more byte sequences. For each distance
+    between bytes, the buffer is split into strided slices (one per residue)
+    and each slice is scanned once for all the sequences.
+
+    :param data: The buffer to search (`bytes` or `bytearray`).
+    :param patterns: The byte sequences to search for (each a sequence of
+                     integers).
+    :param steps: The distances between bytes to search with.
+    :param start: The address at which to start searching.
+    :param end: The address at which to stop searching (default: the end of
+                the buffer); a match of length L at address A with distance D
+                between bytes is found only if A+L*D does not exceed this.
+    :return: A list of `(address, step, index)` tuples, where `index` is the
+             index of the matching sequence in `patterns`, sorted by step,
+             address and index.
+    """
+    if end is None:
+        end = len(data)
+    needles = [(bytes(p), i) for i, p in enumerate(patterns) if all(0 <= b < 256 for b in p)]
+    if not needles:
+        return []
+    if len(needles) == 1:
+        search = _find_one(*needles[0])
+    else:
+        search = _find_any(needles)
+    matches = []
+    for step in steps:
+        if step < 1:
+            continue
+        for r in range(min(step, max(end - start, 0))):
+            base = start + r
+            for i, index, length in search(data[base:end:step]):
+                address = base + i * step
+                if address + length * step <= end:
+                    matches.append((step, address, index))
+    matches.sort()
+    return [(address, step, index) for step, address, index in matches]
+
+def _find_one(needle, index):
+    length = len(needle)
+    def search(view):
+        i = view.find(needle)
+        while i >= 0:
+            yield i, index, length
+            i = view.find(needle, i + 1)
+    return search
+
+def _find_any(needles):
+    # Locate every position at which at least one needle starts by scanning
+    # with a single regular expression (a zero-width lookahead over the
+    # alternation, so that overlapping matches are found), and then check
+    # which needles start there
+    regex = re.compile(b'(?=' + b'|'.join([re.escape(n) for n, i in needles]) + b')')
+    def search(view):
+        for match in regex.finditer(view):
+            pos = match.start()
+            for needle, index in needles:
+                if view.startswith(needle, pos):
+                    yield pos, index, len(needle)
+    return search
@@ -109,7 +109,8 @@ class SftParser:
         if address is not None:
             comment_index = find_unquoted(line, ';')
             operation = line[7:comment_index].strip()
-            set_bytes(self.snapshot, address, operation)
+            size = set_bytes(self.snapshot, address, operation)
+            self.disassembler.reset(address, address + size)
 
     def _parse_sft(self, min_address, max_address):
         start_index = -1
@@ -0,0 +1,1188 @@
+# Copyright 2017 Richard Dymond (rjdymond@gmail.com)
+#
+# This file is part of SkoolKit.
+#
+# SkoolKit is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# SkoolKit is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# SkoolKit. If not, see <http://www.gnu.org/licenses/>.
+
+from functools import partial
+
+from skoolkit.disassembler import Disassembler
+
+# Indexes of the registers (and other CPU state) in Simulator.registers
+A, F, B, C, D, E, H, L, IXh, IXl, IYh, IYl, SP, I, R = range(15)
+xA, xF, xB, xC, xD, xE, xH, xL = range(15, 23)
+IFF, IM, R7 = range(23, 26)
+
+REGISTERS = {
+    'a': A, 'f': F, 'b': B, 'c': C, 'd': D, 'e': E, 'h': H, 'l': L,
+    'i': I, 'r': R, 'sp': SP, 'iff': IFF, 'im': IM,
+    '^a': xA, '^f': xF, '^b': xB, '^c': xC, '^d': xD, '^e': xE, '^h': xH, '^l': xL
+}
+
+PAIRS = {
+    'bc': (B, C), 'de': (D, E), 'hl': (H, L), 'ix': (IXh, IXl), 'iy': (IYh, IYl),
+    '^bc': (xB, xC), '^de': (xD, xE), '^hl': (xH, xL)
+}
+
+# The number of instructions executed between maskable interrupts; this
+# approximates one frame (69888 T-states) at 8 T-states per instruction
+INTERRUPT_INTERVAL = 8736
+
+_REG8 = {
+    'A': A, 'B': B, 'C': C, 'D': D, 'E': E, 'H': H, 'L': L,
+    'IXh': IXh, 'IXl': IXl, 'IYh': IYh, 'IYl': IYl
+}
+
+_REG16 = {'AF': (A, F), 'BC': (B, C), 'DE': (D, E), 'HL': (H, L), 'IX': (IXh, IXl), 'IY': (IYh, IYl)}
+
+_CONDITIONS = {
+    'NZ': (64, 0), 'Z': (64, 64), 'NC': (1, 0), 'C': (1, 1),
+    'PO': (4, 0), 'PE': (4, 4), 'P': (128, 0), 'M': (128, 128)
+}
+
+# Signed values of index offsets and relative jump displacements
+OFFSET = [d if d < 128 else d - 256 for d in range(256)]
+
+# Flags S, Z, 5 and 3 of a result
+SZ53 = [(v & 0xA8) + (0x40 if v == 0 else 0) for v in range(256)]
+
+# Flags S, Z, 5, 3 and P of a result
+SZ53P = [SZ53[v] + (0 if bin(v).count('1') % 2 else 4) for v in range(256)]
+
+# Flags S, Z, 5, H, 3 and V after INC and DEC
+INC_F = [SZ53[v] + (16 if v % 16 == 0 else 0) + (4 if v == 128 else 0) for v in range(256)]
+DEC_F = [SZ53[v] + (16 if v % 16 == 15 else 0) + (4 if v == 127 else 0) + 2 for v in range(256)]
+
+def _add(registers, value):
+    a = registers[A]
+    v = a + value
+    registers[A] = r = v & 255
+    registers[F] = SZ53[r] + (v > 255) + ((a ^ value ^ r) & 16) + (((a ^ ~value) & (a ^ r) & 128) >> 5)
+
+def _adc(registers, value):
+    a = registers[A]
+    v = a + value + (registers[F] & 1)
+    registers[A] = r = v & 255
+    registers[F] = SZ53[r] + (v > 255) + ((a ^ value ^ r) & 16) + (((a ^ ~value) & (a ^ r) & 128) >> 5)
+
+def _sub(registers, value):
+    a = registers[A]
+    v = a - value
+    registers[A] = r = v & 255
+    registers[F] = SZ53[r] + (v < 0) + ((a ^ value ^ r) & 16) + (((a ^ value) & (a ^ r) & 128) >> 5) + 2
+
+def _sbc(registers, value):
+    a = registers[A]
+    v = a - value - (registers[F] & 1)
+    registers[A] = r = v & 255
+    registers[F] = SZ53[r] + (v < 0) + ((a ^ value ^ r) & 16) + (((a ^ value) & (a ^ r) & 128) >> 5) + 2
+
+def _and(registers, value):
+    registers[A] = r = registers[A] & value
+    registers[F] = SZ53P[r] + 16
+
+def _xor(registers, value):
+    registers[A] = r = registers[A] ^ value
+    registers[F] = SZ53P[r]
+
+def _or(registers, value):
+    registers[A] = r = registers[A] | value
+    registers[F] = SZ53P[r]
+
+def _cp(registers, value):
+    a = registers[A]
+    v = a - value
+    r = v & 255
+    registers[F] = (SZ53[r] & 0xD7) + (value & 0x28) + (v < 0) + ((a ^ value ^ r) & 16) + (((a ^ value) & (a ^ r) & 128) >> 5) + 2
+
+def _rlc(registers, value):
+    r = ((value << 1) + (value >> 7)) & 255
+    registers[F] = SZ53P[r] + (value >> 7)
+    return r
+
+def _rrc(registers, value):
+    r = (value >> 1) + ((value & 1) << 7)
+    registers[F] = SZ53P[r] + (value & 1)
+    return r
+
+def _rl(registers, value):
+    r = ((value << 1) + (registers[F] & 1)) & 255
+    registers[F] = SZ53P[r] + (value >> 7)
+    return r
+
+def _rr(registers, value):
+    r = (value >> 1) + ((registers[F] & 1) << 7)
+    registers[F] = SZ53P[r] + (value & 1)
+    return r
+
+def _sla(registers, value):
+    r = (value << 1) & 255
+    registers[F] = SZ53P[r] + (value >> 7)
+    return r
+
+def _sra(registers, value):
+    r = (value >> 1) + (value & 128)
+    registers[F] = SZ53P[r] + (value & 1)
+    return r
+
+def _sll(registers, value):
+    r = ((value << 1) + 1) & 255
+    registers[F] = SZ53P[r] + (value >> 7)
+    return r
+
+def _srl(registers, value):
+    r = value >> 1
+    registers[F] = SZ53P[r] + (value & 1)
+    return r
+
+def _res(mask, registers, value):
+    return value & mask
+
+def _set(bit, registers, value):
+    return value | bit
+
+class Simulator:
+    """A Z80 instruction simulator that runs code in a 64K memory space. Its
+    dispatch tables are built from the instruction templates in
+    :class:`~skoolkit.disassembler.Disassembler`.
+
+    Writes to the ROM (addresses 0-16383) are ignored, all I/O ports read
+    255, and a maskable interrupt is accepted every
+    :data:`INTERRUPT_INTERVAL` instructions (or at a `HALT` instruction) while
+    interrupts are enabled.
+
+    :param memory: The 64K memory space (a `bytearray` or other sequence of
+                   byte values).
+    :param registers: A dictionary of initial register values (e.g.
+                      ``{'pc': 32768, 'sp': 65535, 'hl': 23296}``); names are
+                      as returned by :func:`skoolkit.snapshot.get_registers`.
+    """
+    def __init__(self, memory, registers=None):
+        self.memory = bytearray(memory[:65536])
+        self.memory.extend(bytes(65536 - len(self.memory)))
+        self.registers = [0] * 26
+        self.registers[SP] = 65535
+        self.pc = 0
+        self.code_map = bytearray(65536)
+        self.operations = 0
+        if registers:
+            self.set_registers(registers)
+        self.opcodes = self._build_tables()
+
+    def set_registers(self, registers):
+        """Set the values of registers.
+
+        :param registers: A dictionary of register values.
+        """
+        for name, value in registers.items():
+            name = name.lower()
+            if name == 'pc':
+                self.pc = value & 65535
+            elif name in PAIRS:
+                hi, lo = PAIRS[name]
+                self.registers[hi] = (value // 256) & 255
+                self.registers[lo] = value & 255
+            elif name in REGISTERS:
+                index = REGISTERS[name]
+                if index == SP:
+                    self.registers[index] = value & 65535
+                elif index == R:
+                    self.registers[R] = value & 127
+                    self.registers[R7] = value & 128
+                else:
+                    self.registers[index] = value & 255
+
+    def get_registers(self):
+        """Return a dictionary of the current register values."""
+        registers = {'pc': self.pc}
+        for name, index in REGISTERS.items():
+            registers[name] = self.registers[index]
+        registers['r'] = (self.registers[R] & 127) + self.registers[R7]
+        for name, (hi, lo) in PAIRS.items():
+            registers[name] = self.registers[hi] * 256 + self.registers[lo]
+        return registers
+
+    def run(self, start=None, stop=None, max_operations=0):
+        """Execute instructions until the program counter reaches `stop`, or
+        `max_operations` instructions have been executed, or the CPU halts
+        with interrupts disabled. The address of every instruction executed is
+        marked in :attr:`code_map`.
+
+        :param start: The address at which to start execution (default: the
+                      current value of the program counter).
+        :param stop: The address at which to stop execution (if any).
+        :param max_operations: The maximum number of instructions to execute
+                               (0 for no limit).
+        :return: The number of instructions executed.
+        """
+        if start is not None:
+            self.pc = start
+        if stop is None:
+            stop = -1
+        opcodes = self.opcodes
+        memory = self.memory
+        registers = self.registers
+        code_map = self.code_map
+        pc = self.pc
+        operations = 0
+        while max_operations == 0 or operations < max_operations:
+            batch = INTERRUPT_INTERVAL - self.operations % INTERRUPT_INTERVAL
+            if max_operations:
+                batch = min(batch, max_operations - operations)
+            count = 0
+            for count in range(batch):
+                if pc == stop:
+                    break
+                code_map[pc] = 1
+                pc = opcodes[memory[pc]](pc)
+                registers[R] += 1
+            else:
+                count = batch
+            operations += count
+            self.operations += count
+            if pc == stop or count < batch:
+                break
+            if self.operations % INTERRUPT_INTERVAL == 0:
+                if registers[IFF]:
+                    pc = self._interrupt(pc)
+                elif memory[pc] == 0x76:
+                    # HALT with interrupts disabled
+                    break
+        self.pc = pc
+        return operations
+
+    def _interrupt(self, pc):
+        registers = self.registers
+        memory = self.memory
+        if memory[pc] == 0x76:
+            # Resume after the HALT instruction
+            pc = (pc + 1) & 65535
+        registers[IFF] = 0
+        self._push(pc)
+        if registers[IM] == 2:
+            vaddr = registers[I] * 256 + 255
+            return memory[vaddr] + 256 * memory[(vaddr + 1) & 65535]
+        return 56
+
+    def _build_tables(self):
+        d = Disassembler
+        main = [None] * 256
+        after_cb = [None] * 256
+        after_ed = [None] * 256
+        after_dd = [None] * 256
+        after_fd = [None] * 256
+        after_ddcb = [None] * 256
+        after_fdcb = [None] * 256
+
+        for opcode, (decoder, template) in d.ops.items():
+            if decoder == d.cb_arg:
+                main[opcode] = partial(self.prefix, after_cb)
+            elif decoder == d.ed_arg:
+                main[opcode] = partial(self.prefix, after_ed)
+            elif decoder == d.dd_arg:
+                main[opcode] = partial(self.prefix, after_dd)
+            elif decoder == d.fd_arg:
+                main[opcode] = partial(self.prefix, after_fd)
+            else:
+                main[opcode] = self._handler(decoder, template, 0)
+
+        for opcode, template in d.after_CB.items():
+            after_cb[opcode] = self._handler(d.no_arg, template, 1)
+
+        for opcode in range(256):
+            decoder, template = d.after_ED.get(opcode, (None, None))
+            if template:
+                after_ed[opcode] = self._handler(decoder, template, 1)
+            elif opcode == 99:
+                after_ed[opcode] = self._handler(d.word_arg, 'LD ({0}),HL', 1)
+            elif opcode == 107:
+                after_ed[opcode] = self._handler(d.word_arg, 'LD HL,({0})', 1)
+            else:
+                after_ed[opcode] = partial(self.nop, 2)
+
+        for table, ddcb_table, reg in ((after_dd, after_ddcb, 'IX'), (after_fd, after_fdcb, 'IY')):
+            for opcode in range(256):
+                decoder, template = d.after_DD.get(opcode, (None, None))
+                if decoder == d.ddcb_arg:
+                    table[opcode] = partial(self.prefix_cb, ddcb_table)
+                elif template:
+                    table[opcode] = self._handler(decoder, template.replace('IX', reg), 1)
+                else:
+                    # The instruction is unchanged by the DD/FD prefix
+                    table[opcode] = partial(self.nop, 1)
+            for opcode in range(256):
+                decoder, template = d.after_DDCB[(opcode & 248) + 6]
+                op = template.replace('IX', reg)
+                if opcode & 7 == 6 or op.startswith('BIT'):
+                    ddcb_table[opcode] = self._handler(decoder, op, 2)
+                else:
+                    dest = (B, C, D, E, H, L, None, A)[opcode & 7]
+                    ddcb_table[opcode] = self._handler(decoder, op, 2, dest)
+
+        return main
+
+    def _handler(self, decoder, template, prefix, dest=None):
+        d = Disassembler
+        if decoder == d.rst_arg:
+            return partial(self.rst, template)
+        if decoder in (d.byte_arg, d.jr_arg):
+            template, size = template.format('n'), 2
+        elif decoder == d.word_arg:
+            template, size = template.format('nn'), 3
+        elif decoder == d.index:
+            template, size = template.format('+d'), 2
+        elif decoder == d.index_arg:
+            template, size = template.format('+d', 'n'), 3
+        else:
+            size = 1
+        size += prefix
+        if prefix == 2:
+            # DDCB/FDCB instructions are 4 bytes long
+            size = 4
+        op, sep, operands = template.partition(' ')
+        ops = operands.split(',') if operands else []
+        method = getattr(self, '_make_' + op.lower(), None)
+        if method:
+            return method(ops, size, dest)
+        return getattr(self, op.lower().replace("'", ''))
+
+    # Operand classification
+
+    def _operand(self, operand):
+        if operand in _REG8:
+            return 'r', (_REG8[operand],)
+        if operand in ('(HL)', '(BC)', '(DE)'):
+            return 'm', _REG16[operand[1:3]]
+        if operand in ('(IX+d)', '(IY+d)'):
+            return 'x', _REG16[operand[1:3]]
+        if operand in _REG16:
+            return 'rr', _REG16[operand]
+        return operand, ()
+
+    # Handler factories
+
+    def _make_ld(self, ops, size, dest):
+        (kd, pd), (ks, ps) = self._operand(ops[0]), self._operand(ops[1])
+        if kd == 'r':
+            if ks == 'r':
+                return partial(self.ld_r_r, pd[0], ps[0], size)
+            if ks == 'n':
+                return partial(self.ld_r_n, pd[0], size)
+            if ks == 'm':
+                return partial(self.ld_r_m, pd[0], ps[0], ps[1], size)
+            if ks == 'x':
+                return partial(self.ld_r_x, pd[0], ps[0], ps[1])
+            if ks == '(nn)':
+                return self.ld_a_mm
+            return partial(self.ld_a_ir, I if ks == 'I' else R)
+        if kd == 'm':
+            if ks == 'r':
+                return partial(self.ld_m_r, pd[0], pd[1], ps[0], size)
+            return partial(self.ld_m_n, pd[0], pd[1], size)
+        if kd == 'x':
+            if ks == 'r':
+                return partial(self.ld_x_r, pd[0], pd[1], ps[0])
+            return partial(self.ld_x_n, pd[0], pd[1])
+        if kd == 'rr':
+            if ks == 'nn':
+                return partial(self.ld_rr_nn, pd[0], pd[1], size)
+            return partial(self.ld_rr_mm, pd[0], pd[1], size)
+        if kd == '(nn)':
+            if ks == 'r':
+                return self.ld_mm_a
+            if ks == 'rr':
+                return partial(self.ld_mm_rr, ps[0], ps[1], size)
+            return partial(self.ld_mm_sp, size)
+        if kd == 'SP':
+            if ks == 'nn':
+                return partial(self.ld_sp_nn, size)
+            if ks == '(nn)':
+                return partial(self.ld_sp_mm, size)
+            return partial(self.ld_sp_rr, ps[0], ps[1], size)
+        return partial(self.ld_ir_a, I if kd == 'I' else R)
+
+    def _make_inc(self, ops, size, dest, inc=1):
+        kind, regs = self._operand(ops[0])
+        if kind == 'r':
+            return partial(self.inc_r, inc, regs[0], size)
+        if kind == 'm':
+            return partial(self.inc_m, inc)
+        if kind == 'x':
+            return partial(self.inc_x, inc, regs[0], regs[1])
+        if kind == 'rr':
+            return partial(self.inc_rr, inc, regs[0], regs[1], size)
+        return partial(self.inc_sp, inc)
+
+    def _make_dec(self, ops, size, dest):
+        return self._make_inc(ops, size, dest, -1)
+
+    def _make_alu(self, op, ops, size):
+        kind, regs = self._operand(ops[-1])
+        if kind == 'r':
+            return partial(self.alu_r, op, regs[0], size)
+        if kind == 'n':
+            return partial(self.alu_n, op, size)
+        if kind == 'm':
+            return partial(self.alu_m, op)
+        return partial(self.alu_x, op, regs[0], regs[1])
+
+    def _make_add(self, ops, size, dest):
+        if ops[0] == 'A':
+            return self._make_alu(_add, ops, size)
+        kd, pd = self._operand(ops[0])
+        ks, ps = self._operand(ops[1])
+        if ks == 'rr':
+            return partial(self.add_rr, pd[0], pd[1], ps[0], ps[1], size)
+        return partial(self.add_rr_sp, pd[0], pd[1], size)
+
+    def _make_adc(self, ops, size, dest, carry=1):
+        if ops[0] == 'A':
+            return self._make_alu(_adc if carry > 0 else _sbc, ops, size)
+        ks, ps = self._operand(ops[1])
+        if ks == 'rr':
+            return partial(self.adc_hl, carry, ps[0], ps[1])
+        return partial(self.adc_hl, carry, SP, None)
+
+    def _make_sbc(self, ops, size, dest):
+        return self._make_adc(ops, size, dest, -1)
+
+    def _make_sub(self, ops, size, dest):
+        return self._make_alu(_sub, ops, size)
+
+    def _make_and(self, ops, size, dest):
+        return self._make_alu(_and, ops, size)
+
+    def _make_xor(self, ops, size, dest):
+        return self._make_alu(_xor, ops, size)
+
+    def _make_or(self, ops, size, dest):
+        return self._make_alu(_or, ops, size)
+
+    def _make_cp(self, ops, size, dest):
+        return self._make_alu(_cp, ops, size)
+
+    def _make_shift(self, func, operand, size, dest):
+        kind, regs = self._operand(operand)
+        if kind == 'r':
+            return partial(self.cb_r, func, regs[0])
+        if kind == 'm':
+            return partial(self.cb_m, func)
+        return partial(self.cb_x, func, regs[0], regs[1], dest)
+
+    def _make_rlc(self, ops, size, dest):
+        return self._make_shift(_rlc, ops[0], size, dest)
+
+    def _make_rrc(self, ops, size, dest):
+        return self._make_shift(_rrc, ops[0], size, dest)
+
+    def _make_rl(self, ops, size, dest):
+        return self._make_shift(_rl, ops[0], size, dest)
+
+    def _make_rr(self, ops, size, dest):
+        return self._make_shift(_rr, ops[0], size, dest)
+
+    def _make_sla(self, ops, size, dest):
+        return self._make_shift(_sla, ops[0], size, dest)
+
+    def _make_sra(self, ops, size, dest):
+        return self._make_shift(_sra, ops[0], size, dest)
+
+    def _make_sll(self, ops, size, dest):
+        return self._make_shift(_sll, ops[0], size, dest)
+
+    def _make_srl(self, ops, size, dest):
+        return self._make_shift(_srl, ops[0], size, dest)
+
+    def _make_res(self, ops, size, dest):
+        return self._make_shift(partial(_res, 255 - (1 << int(ops[0]))), ops[1], size, dest)
+
+    def _make_set(self, ops, size, dest):
+        return self._make_shift(partial(_set, 1 << int(ops[0])), ops[1], size, dest)
+
+    def _make_bit(self, ops, size, dest):
+        bit = int(ops[0])
+        kind, regs = self._operand(ops[1])
+        if kind == 'r':
+            return partial(self.bit_r, bit, regs[0])
+        if kind == 'm':
+            return partial(self.bit_m, bit)
+        return partial(self.bit_x, bit, regs[0], regs[1])
+
+    def _make_jp(self, ops, size, dest):
+        if ops[0] == 'nn':
+            return self.jp
+        if ops[0] in _CONDITIONS:
+            return partial(self.jp_cc, *_CONDITIONS[ops[0]])
+        hi, lo = _REG16[ops[0][1:3]]
+        return partial(self.jp_rr, hi, lo)
+
+    def _make_jr(self, ops, size, dest):
+        if ops[0] == 'n':
+            return self.jr
+        return partial(self.jr_cc, *_CONDITIONS[ops[0]])
+
+    def _make_djnz(self, ops, size, dest):
+        return self.djnz
+
+    def _make_call(self, ops, size, dest):
+        if ops[0] == 'nn':
+            return self.call
+        return partial(self.call_cc, *_CONDITIONS[ops[0]])
+
+    def _make_ret(self, ops, size, dest):
+        if ops:
+            return partial(self.ret_cc, *_CONDITIONS[ops[0]])
+        return self.ret
+
+    def _make_reti(self, ops, size, dest):
+        return self.reti
+
+    def _make_retn(self, ops, size, dest):
+        return self.reti
+
+    def _make_push(self, ops, size, dest):
+        hi, lo = _REG16[ops[0]]
+        return partial(self.push, hi, lo, size)
+
+    def _make_pop(self, ops, size, dest):
+        hi, lo = _REG16[ops[0]]
+        return partial(self.pop, hi, lo, size)
+
+    def _make_ex(self, ops, size, dest):
+        if ops[0] == 'AF':
+            return self.ex_af
+        if ops[0] == 'DE':
+            return self.ex_de_hl
+        hi, lo = _REG16[ops[1]]
+        return partial(self.ex_sp_rr, hi, lo, size)
+
+    def _make_im(self, ops, size, dest):
+        return partial(self.im, int(ops[0]))
+
+    def _make_in(self, ops, size, dest):
+        if ops[1] == '(n)':
+            return self.in_a_n
+        return partial(self.in_r_c, _REG8[ops[0]])
+
+    def _make_out(self, ops, size, dest):
+        return partial(self.nop, size)
+
+    def _make_nop(self, ops, size, dest):
+        return partial(self.nop, size)
+
+    def _make_ldi(self, ops, size, dest):
+        return partial(self.ldi, 1, 0)
+
+    def _make_ldd(self, ops, size, dest):
+        return partial(self.ldi, -1, 0)
+
+    def _make_ldir(self, ops, size, dest):
+        return partial(self.ldi, 1, 2)
+
+    def _make_lddr(self, ops, size, dest):
+        return partial(self.ldi, -1, 2)
+
+    def _make_cpi(self, ops, size, dest):
+        return partial(self.cpi, 1, 0)
+
+    def _make_cpd(self, ops, size, dest):
+        return partial(self.cpi, -1, 0)
+
+    def _make_cpir(self, ops, size, dest):
+        return partial(self.cpi, 1, 2)
+
+    def _make_cpdr(self, ops, size, dest):
+        return partial(self.cpi, -1, 2)
+
+    def _make_ini(self, ops, size, dest):
+        return partial(self.ini, 1, 0, 255)
+
+    def _make_ind(self, ops, size, dest):
+        return partial(self.ini, -1, 0, 255)
+
+    def _make_inir(self, ops, size, dest):
+        return partial(self.ini, 1, 2, 255)
+
+    def _make_indr(self, ops, size, dest):
+        return partial(self.ini, -1, 2, 255)
+
+    def _make_outi(self, ops, size, dest):
+        return partial(self.ini, 1, 0, None)
+
+    def _make_outd(self, ops, size, dest):
+        return partial(self.ini, -1, 0, None)
+
+    def _make_otir(self, ops, size, dest):
+        return partial(self.ini, 1, 2, None)
+
+    def _make_otdr(self, ops, size, dest):
+        return partial(self.ini, -1, 2, None)
+
+    # Instruction handlers: each takes the address of the instruction and
+    # returns the address of the next one
+
+    def prefix(self, table, pc):
+        self.registers[R] += 1
+        return table[self.memory[(pc + 1) & 65535]](pc)
+
+    def prefix_cb(self, table, pc):
+        return table[self.memory[(pc + 3) & 65535]](pc)
+
+    def nop(self, size, pc):
+        return (pc + size) & 65535
+
+    def halt(self, pc):
+        return pc
+
+    def di(self, pc):
+        self.registers[IFF] = 0
+        return (pc + 1) & 65535
+
+    def ei(self, pc):
+        self.registers[IFF] = 1
+        return (pc + 1) & 65535
+
+    def im(self, mode, pc):
+        self.registers[IM] = mode
+        return (pc + 2) & 65535
+
+    def ld_r_r(self, dest, src, size, pc):
+        registers = self.registers
+        registers[dest] = registers[src]
+        return (pc + size) & 65535
+
+    def ld_r_n(self, dest, size, pc):
+        self.registers[dest] = self.memory[(pc + size - 1) & 65535]
+        return (pc + size) & 65535
+
+    def ld_r_m(self, dest, hi, lo, size, pc):
+        registers = self.registers
+        registers[dest] = self.memory[registers[hi] * 256 + registers[lo]]
+        return (pc + size) & 65535
+
+    def ld_r_x(self, dest, hi, lo, pc):
+        registers = self.registers
+        memory = self.memory
+        registers[dest] = memory[(registers[hi] * 256 + registers[lo] + OFFSET[memory[(pc + 2) & 65535]]) & 65535]
+        return (pc + 3) & 65535
+
+    def ld_m_r(self, hi, lo, src, size, pc):
+        registers = self.registers
+        addr = registers[hi] * 256 + registers[lo]
+        if addr > 16383:
+            self.memory[addr] = registers[src]
+        return (pc + size) & 65535
+
+    def ld_m_n(self, hi, lo, size, pc):
+        registers = self.registers
+        addr = registers[hi] * 256 + registers[lo]
+        if addr > 16383:
+            self.memory[addr] = self.memory[(pc + size - 1) & 65535]
+        return (pc + size) & 65535
+
+    def ld_x_r(self, hi, lo, src, pc):
+        registers = self.registers
+        memory = self.memory
+        addr = (registers[hi] * 256 + registers[lo] + OFFSET[memory[(pc + 2) & 65535]]) & 65535
+        if addr > 16383:
+            memory[addr] = registers[src]
+        return (pc + 3) & 65535
+
+    def ld_x_n(self, hi, lo, pc):
+        registers = self.registers
+        memory = self.memory
+        addr = (registers[hi] * 256 + registers[lo] + OFFSET[memory[(pc + 2) & 65535]]) & 65535
+        if addr > 16383:
+            memory[addr] = memory[(pc + 3) & 65535]
+        return (pc + 4) & 65535
+
+    def ld_a_mm(self, pc):
+        memory = self.memory
+        self.registers[A] = memory[memory[(pc + 1) & 65535] + 256 * memory[(pc + 2) & 65535]]
+        return (pc + 3) & 65535
+
+    def ld_mm_a(self, pc):
+        memory = self.memory
+        addr = memory[(pc + 1) & 65535] + 256 * memory[(pc + 2) & 65535]
+        if addr > 16383:
+            memory[addr] = self.registers[A]
+        return (pc + 3) & 65535
+
+    def ld_a_ir(self, src, pc):
+        registers = self.registers
+        if src == R:
+            a = registers[A] = (registers[R] & 127) + registers[R7]
+        else:
+            a = registers[A] = registers[I]
+        registers[F] = SZ53[a] + (registers[F] & 1) + 4 * registers[IFF]
+        return (pc + 2) & 65535
+
+    def ld_ir_a(self, dest, pc):
+        registers = self.registers
+        registers[dest] = registers[A]
+        if dest == R:
+            registers[R7] = registers[A] & 128
+        return (pc + 2) & 65535
+
+    def ld_rr_nn(self, hi, lo, size, pc):
+        registers = self.registers
+        memory = self.memory
+        registers[lo] = memory[(pc + size - 2) & 65535]
+        registers[hi] = memory[(pc + size - 1) & 65535]
+        return (pc + size) & 65535
+
+    def ld_rr_mm(self, hi, lo, size, pc):
+        registers = self.registers
+        memory = self.memory
+        addr = memory[(pc + size - 2) & 65535] + 256 * memory[(pc + size - 1) & 65535]
+        registers[lo] = memory[addr]
+        registers[hi] = memory[(addr + 1) & 65535]
+        return (pc + size) & 65535
+
+    def ld_mm_rr(self, hi, lo, size, pc):
+        registers = self.registers
+        memory = self.memory
+        addr = memory[(pc + size - 2) & 65535] + 256 * memory[(pc + size - 1) & 65535]
+        self._poke(addr, registers[lo], registers[hi])
+        return (pc + size) & 65535
+
+    def ld_sp_nn(self, size, pc):
+        memory = self.memory
+        self.registers[SP] = memory[(pc + size - 2) & 65535] + 256 * memory[(pc + size - 1) & 65535]
+        return (pc + size) & 65535
+
+    def ld_sp_mm(self, size, pc):
+        memory = self.memory
+        addr = memory[(pc + size - 2) & 65535] + 256 * memory[(pc + size - 1) & 65535]
+        self.registers[SP] = memory[addr] + 256 * memory[(addr + 1) & 65535]
+        return (pc + size) & 65535
+
+    def ld_mm_sp(self, size, pc):
+        memory = self.memory
+        sp = self.registers[SP]
+        addr = memory[(pc + size - 2) & 65535] + 256 * memory[(pc + size - 1) & 65535]
+        self._poke(addr, sp & 255, sp // 256)
+        return (pc + size) & 65535
+
+    def ld_sp_rr(self, hi, lo, size, pc):
+        registers = self.registers
+        registers[SP] = registers[hi] * 256 + registers[lo]
+        return (pc + size) & 65535
+
+    def _poke(self, addr, lo, hi):
+        memory = self.memory
+        if addr > 16383:
+            memory[addr] = lo
+        addr = (addr + 1) & 65535
+        if addr > 16383:
+            memory[addr] = hi
+
+    def inc_r(self, inc, reg, size, pc):
+        registers = self.registers
+        registers[reg] = v = (registers[reg] + inc) & 255
+        registers[F] = (INC_F if inc > 0 else DEC_F)[v] + (registers[F] & 1)
+        return (pc + size) & 65535
+
+    def inc_m(self, inc, pc):
+        registers = self.registers
+        addr = registers[H] * 256 + registers[L]
+        v = (self.memory[addr] + inc) & 255
+        if addr > 16383:
+            self.memory[addr] = v
+        registers[F] = (INC_F if inc > 0 else DEC_F)[v] + (registers[F] & 1)
+        return (pc + 1) & 65535
+
+    def inc_x(self, inc, hi, lo, pc):
+        registers = self.registers
+        memory = self.memory
+        addr = (registers[hi] * 256 + registers[lo] + OFFSET[memory[(pc + 2) & 65535]]) & 65535
+        v = (memory[addr] + inc) & 255
+        if addr > 16383:
+            memory[addr] = v
+        registers[F] = (INC_F if inc > 0 else DEC_F)[v] + (registers[F] & 1)
+        return (pc + 3) & 65535
+
+    def inc_rr(self, inc, hi, lo, size, pc):
+        registers = self.registers
+        v = (registers[hi] * 256 + registers[lo] + inc) & 65535
+        registers[hi] = v // 256
+        registers[lo] = v & 255
+        return (pc + size) & 65535
+
+    def inc_sp(self, inc, pc):
+        self.registers[SP] = (self.registers[SP] + inc) & 65535
+        return (pc + 1) & 65535
+
+    def alu_r(self, op, reg, size, pc):
+        op(self.registers, self.registers[reg])
+        return (pc + size) & 65535
+
+    def alu_n(self, op, size, pc):
+        op(self.registers, self.memory[(pc + size - 1) & 65535])
+        return (pc + size) & 65535
+
+    def alu_m(self, op, pc):
+        registers = self.registers
+        op(registers, self.memory[registers[H] * 256 + registers[L]])
+        return (pc + 1) & 65535
+
+    def alu_x(self, op, hi, lo, pc):
+        registers = self.registers
+        memory = self.memory
+        op(registers, memory[(registers[hi] * 256 + registers[lo] + OFFSET[memory[(pc + 2) & 65535]]) & 65535])
+        return (pc + 3) & 65535
+
+    def add_rr(self, dh, dl, sh, sl, size, pc):
+        registers = self.registers
+        self._add16(dh, dl, registers[sh] * 256 + registers[sl])
+        return (pc + size) & 65535
+
+    def add_rr_sp(self, dh, dl, size, pc):
+        self._add16(dh, dl, self.registers[SP])
+        return (pc + size) & 65535
+
+    def _add16(self, hi, lo, value):
+        registers = self.registers
+        rr = registers[hi] * 256 + registers[lo]
+        v = rr + value
+        registers[F] = (registers[F] & 0xC4) + (v > 65535) + (((rr ^ value ^ v) >> 8) & 16) + ((v >> 8) & 0x28)
+        v &= 65535
+        registers[hi] = v // 256
+        registers[lo] = v & 255
+
+    def adc_hl(self, sign, sh, sl, pc):
+        registers = self.registers
+        if sl is None:
+            value = registers[SP]
+        else:
+            value = registers[sh] * 256 + registers[sl]
+        hl = registers[H] * 256 + registers[L]
+        if sign > 0:
+            v = hl + value + (registers[F] & 1)
+            overflow = ((hl ^ ~value) & (hl ^ v) & 0x8000) >> 13
+            f = (v > 65535) + overflow
+        else:
+            v = hl - value - (registers[F] & 1)
+            overflow = ((hl ^ value) & (hl ^ v) & 0x8000) >> 13
+            f = (v < 0) + overflow + 2
+        r = v & 65535
+        registers[F] = f + ((r >> 8) & 0xA8) + (64 if r == 0 else 0) + (((hl ^ value ^ v) >> 8) & 16)
+        registers[H] = r // 256
+        registers[L] = r & 255
+        return (pc + 2) & 65535
+
+    def cb_r(self, func, reg, pc):
+        registers = self.registers
+        registers[reg] = func(registers, registers[reg])
+        return (pc + 2) & 65535
+
+    def cb_m(self, func, pc):
+        registers = self.registers
+        addr = registers[H] * 256 + registers[L]
+        v = func(registers, self.memory[addr])
+        if addr > 16383:
+            self.memory[addr] = v
+        return (pc + 2) & 65535
+
+    def cb_x(self, func, hi, lo, dest, pc):
+        registers = self.registers
+        memory = self.memory
+        addr = (registers[hi] * 256 + registers[lo] + OFFSET[memory[(pc + 2) & 65535]]) & 65535
+        v = func(registers, memory[addr])
+        if addr > 16383:
+            memory[addr] = v
+        if dest is not None:
+            registers[dest] = v
+        return (pc + 4) & 65535
+
+    def bit_r(self, bit, reg, pc):
+        registers = self.registers
+        v = registers[reg]
+        self._bit(bit, v, v)
+        return (pc + 2) & 65535
+
+    def bit_m(self, bit, pc):
+        registers = self.registers
+        v = self.memory[registers[H] * 256 + registers[L]]
+        self._bit(bit, v, registers[H])
+        return (pc + 2) & 65535
+
+    def bit_x(self, bit, hi, lo, pc):
+        registers = self.registers
+        memory = self.memory
+        addr = (registers[hi] * 256 + registers[lo] + OFFSET[memory[(pc + 2) & 65535]]) & 65535
+        self._bit(bit, memory[addr], addr // 256)
+        return (pc + 4) & 65535
+
+    def _bit(self, bit, value, xy):
+        registers = self.registers
+        v = value & (1 << bit)
+        registers[F] = (registers[F] & 1) + 16 + (xy & 0x28) + (v & 128) + (0 if v else 0x44)
+
+    def rlca(self, pc):
+        registers = self.registers
+        a = registers[A]
+        registers[A] = r = ((a << 1) + (a >> 7)) & 255
+        registers[F] = (registers[F] & 0xC4) + (r & 0x28) + (a >> 7)
+        return (pc + 1) & 65535
+
+    def rrca(self, pc):
+        registers = self.registers
+        a = registers[A]
+        registers[A] = r = (a >> 1) + ((a & 1) << 7)
+        registers[F] = (registers[F] & 0xC4) + (r & 0x28) + (a & 1)
+        return (pc + 1) & 65535
+
+    def rla(self, pc):
+        registers = self.registers
+        a = registers[A]
+        registers[A] = r = ((a << 1) + (registers[F] & 1)) & 255
+        registers[F] = (registers[F] & 0xC4) + (r & 0x28) + (a >> 7)
+        return (pc + 1) & 65535
+
+    def rra(self, pc):
+        registers = self.registers
+        a = registers[A]
+        registers[A] = r = (a >> 1) + ((registers[F] & 1) << 7)
+        registers[F] = (registers[F] & 0xC4) + (r & 0x28) + (a & 1)
+        return (pc + 1) & 65535
+
+    def rld(self, pc):
+        registers = self.registers
+        addr = registers[H] * 256 + registers[L]
+        a = registers[A]
+        m = self.memory[addr]
+        if addr > 16383:
+            self.memory[addr] = ((m << 4) & 240) + (a & 15)
+        registers[A] = a = (a & 240) + (m >> 4)
+        registers[F] = SZ53P[a] + (registers[F] & 1)
+        return (pc + 2) & 65535
+
+    def rrd(self, pc):
+        registers = self.registers
+        addr = registers[H] * 256 + registers[L]
+        a = registers[A]
+        m = self.memory[addr]
+        if addr > 16383:
+            self.memory[addr] = ((a << 4) & 240) + (m >> 4)
+        registers[A] = a = (a & 240) + (m & 15)
+        registers[F] = SZ53P[a] + (registers[F] & 1)
+        return (pc + 2) & 65535
+
+    def daa(self, pc):
+        registers = self.registers
+        a = registers[A]
+        f = registers[F]
+        t = 0
+        if f & 16 or a & 15 > 9:
+            t = 6
+        if f & 1 or a > 0x99:
+            t += 0x60
+        if f & 2:
+            r = (a - t) & 255
+            h = 16 if f & 16 and a & 15 < 6 else 0
+        else:
+            r = (a + t) & 255
+            h = 16 if a & 15 > 9 else 0
+        registers[A] = r
+        registers[F] = SZ53P[r] + h + (f & 2) + (1 if f & 1 or a > 0x99 else 0)
+        return (pc + 1) & 65535
+
+    def cpl(self, pc):
+        registers = self.registers
+        registers[A] = a = registers[A] ^ 255
+        registers[F] = (registers[F] & 0xC5) + (a & 0x28) + 18
+        return (pc + 1) & 65535
+
+    def neg(self, pc):
+        registers = self.registers
+        a = registers[A]
+        registers[A] = 0
+        _sub(registers, a)
+        return (pc + 2) & 65535
+
+    def scf(self, pc):
+        registers = self.registers
+        registers[F] = (registers[F] & 0xC4) + (registers[A] & 0x28) + 1
+        return (pc + 1) & 65535
+
+    def ccf(self, pc):
+        registers = self.registers
+        f = registers[F]
+        registers[F] = ((f & 0xC5) + ((f & 1) << 4) + (registers[A] & 0x28)) ^ 1
+        return (pc + 1) & 65535
+
+    def jp(self, pc):
+        memory = self.memory
+        return memory[(pc + 1) & 65535] + 256 * memory[(pc + 2) & 65535]
+
+    def jp_cc(self, mask, value, pc):
+        if self.registers[F] & mask == value:
+            memory = self.memory
+            return memory[(pc + 1) & 65535] + 256 * memory[(pc + 2) & 65535]
+        return (pc + 3) & 65535
+
+    def jp_rr(self, hi, lo, pc):
+        registers = self.registers
+        return registers[hi] * 256 + registers[lo]
+
+    def jr(self, pc):
+        return (pc + 2 + OFFSET[self.memory[(pc + 1) & 65535]]) & 65535
+
+    def jr_cc(self, mask, value, pc):
+        if self.registers[F] & mask == value:
+            return (pc + 2 + OFFSET[self.memory[(pc + 1) & 65535]]) & 65535
+        return (pc + 2) & 65535
+
+    def djnz(self, pc):
+        registers = self.registers
+        registers[B] = b = (registers[B] - 1) & 255
+        if b:
+            return (pc + 2 + OFFSET[self.memory[(pc + 1) & 65535]]) & 65535
+        return (pc + 2) & 65535
+
+    def _push(self, value):
+        registers = self.registers
+        registers[SP] = sp = (registers[SP] - 2) & 65535
+        self._poke(sp, value & 255, value // 256)
+
+    def _pop(self):
+        registers = self.registers
+        memory = self.memory
+        sp = registers[SP]
+        registers[SP] = (sp + 2) & 65535
+        return memory[sp] + 256 * memory[(sp + 1) & 65535]
+
+    def call(self, pc):
+        memory = self.memory
+        self._push((pc + 3) & 65535)
+        return memory[(pc + 1) & 65535] + 256 * memory[(pc + 2) & 65535]
+
+    def call_cc(self, mask, value, pc):
+        if self.registers[F] & mask == value:
+            return self.call(pc)
+        return (pc + 3) & 65535
+
+    def ret(self, pc):
+        return self._pop()
+
+    def ret_cc(self, mask, value, pc):
+        if self.registers[F] & mask == value:
+            return self._pop()
+        return (pc + 1) & 65535
+
+    def reti(self, pc):
+        return self._pop()
+
+    def rst(self, addr, pc):
+        self._push((pc + 1) & 65535)
+        return addr
+
+    def push(self, hi, lo, size, pc):
+        registers = self.registers
+        self._push(registers[hi] * 256 + registers[lo])
+        return (pc + size) & 65535
+
+    def pop(self, hi, lo, size, pc):
+        registers = self.registers
+        memory = self.memory
+        sp = registers[SP]
+        registers[lo] = memory[sp]
+        registers[hi] = memory[(sp + 1) & 65535]
+        registers[SP] = (sp + 2) & 65535
+        return (pc + size) & 65535
+
+    def ex_af(self, pc):
+        registers = self.registers
+        registers[A], registers[F], registers[xA], registers[xF] = registers[xA], registers[xF], registers[A], registers[F]
+        return (pc + 1) & 65535
+
+    def ex_de_hl(self, pc):
+        registers = self.registers
+        registers[D], registers[E], registers[H], registers[L] = registers[H], registers[L], registers[D], registers[E]
+        return (pc + 1) & 65535
+
+    def exx(self, pc):
+        registers = self.registers
+        registers[B:H + 2], registers[xB:xL + 1] = registers[xB:xL + 1], registers[B:H + 2]
+        return (pc + 1) & 65535
+
+    def ex_sp_rr(self, hi, lo, size, pc):
+        registers = self.registers
+        memory = self.memory
+        sp = registers[SP]
+        value = memory[sp] + 256 * memory[(sp + 1) & 65535]
+        self._poke(sp, registers[lo], registers[hi])
+        registers[hi] = value // 256
+        registers[lo] = value & 255
+        return (pc + size) & 65535
+
+    def in_a_n(self, pc):
+        self.registers[A] = 255
+        return (pc + 2) & 65535
+
+    def in_r_c(self, reg, pc):
+        registers = self.registers
+        registers[reg] = 255
+        registers[F] = SZ53P[255] + (registers[F] & 1)
+        return (pc + 2) & 65535
+
+    def ldi(self, inc, repeat, pc):
+        registers = self.registers
+        memory = self.memory
+        hl = registers[H] * 256 + registers[L]
+        de = registers[D] * 256 + registers[E]
+        bc = (registers[B] * 256 + registers[C] - 1) & 65535
+        v = memory[hl]
+        if de > 16383:
+            memory[de] = v
+        hl = (hl + inc) & 65535
+        de = (de + inc) & 65535
+        registers[H], registers[L] = hl // 256, hl & 255
+        registers[D], registers[E] = de // 256, de & 255
+        registers[B], registers[C] = bc // 256, bc & 255
+        n = v + registers[A]
+        registers[F] = (registers[F] & 0xC1) + (4 if bc else 0) + (n & 8) + ((n & 2) << 4)
+        if repeat and bc:
+            return pc
+        return (pc + 2) & 65535
+
+    def cpi(self, inc, repeat, pc):
+        registers = self.registers
+        hl = registers[H] * 256 + registers[L]
+        bc = (registers[B] * 256 + registers[C] - 1) & 65535
+        a = registers[A]
+        value = self.memory[hl]
+        r = (a - value) & 255
+        h = (a ^ value ^ r) & 16
+        n = r - (h >> 4)
+        hl = (hl + inc) & 65535
+        registers[H], registers[L] = hl // 256, hl & 255
+        registers[B], registers[C] = bc // 256, bc & 255
+        registers[F] = (registers[F] & 1) + (SZ53[r] & 0xC0) + h + (4 if bc else 0) + 2 + (n & 8) + ((n & 2) << 4)
+        if repeat and bc and r:
+            return pc
+        return (pc + 2) & 65535
+
+    def ini(self, inc, repeat, value, pc):
+        registers = self.registers
+        hl = registers[H] * 256 + registers[L]
+        if value is not None and hl > 16383:
+            self.memory[hl] = value
+        registers[B] = b = (registers[B] - 1) & 255
+        hl = (hl + inc) & 65535
+        registers[H], registers[L] = hl // 256, hl & 255
+        registers[F] = (registers[F] & 1) + SZ53[b] + 2
+        if repeat and b:
+            return pc
+        return (pc + 2) & 65535
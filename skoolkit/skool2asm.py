@@ -16,9 +16,10 @@
 
 import argparse
 import os.path
+import re
 import time
 
-from skoolkit import info, get_class, show_package_dir, VERSION
+from skoolkit import SkoolKitError, info, get_class, show_package_dir, VERSION
 from skoolkit.skoolasm import AsmWriter
 from skoolkit.skoolparser import SkoolParser, CASE_LOWER, CASE_UPPER, BASE_10, BASE_16
 
@@ -30,17 +31,28 @@ def clock(quiet, prefix, operation, *args, **kwargs):
         info('{} ({:0.2f}s)'.format(prefix, stop - go))
     return result
 
-def run(skoolfile, options):
-    # Create the parser
-    if skoolfile == '-':
-        fname = 'stdin'
-    else:
-        fname = skoolfile
-    parser = clock(options.quiet, 'Parsed {}'.format(fname), SkoolParser, skoolfile,
-                   options.case, options.base, options.asm_mode, options.warn, options.fix_mode,
-                   False, options.create_labels, True, options.start, options.end)
+VARIANT = re.compile('(f[0-3]|[rsluDH])+$')
 
-    # Write the ASM file
+def _variant(spec):
+    if VARIANT.match(spec):
+        return spec
+    raise argparse.ArgumentTypeError("invalid variant: '{}'".format(spec))
+
+def _variant_options(spec, options):
+    # Apply the options in a variant specification to the command line options
+    asm_mode, fix_mode, case, base = options.asm_mode, options.fix_mode, options.case, options.base
+    for opt in re.findall('f[0-3]|[rsluDH]', spec):
+        if opt[0] == 'f':
+            fix_mode = int(opt[1])
+        elif opt in 'rs':
+            asm_mode = 3 if opt == 'r' else 2
+        elif opt in 'lu':
+            case = CASE_LOWER if opt == 'l' else CASE_UPPER
+        else:
+            base = BASE_10 if opt == 'D' else BASE_16
+    return asm_mode, fix_mode, case, base
+
+def write_asm(skoolfile, parser, options, lower, outfile):
     cls_name = options.writer or parser.asm_writer_class
     if cls_name:
         asm_writer_class = get_class(cls_name, os.path.dirname(skoolfile))
@@ -55,8 +67,52 @@ def run(skoolfile, options):
             properties[name] = value
     if not options.warn:
         properties['warnings'] = '0'
-    asm_writer = asm_writer_class(parser, properties, options.case == CASE_LOWER)
-    clock(options.quiet, 'Wrote ASM to stdout', asm_writer.write)
+    asm_writer = asm_writer_class(parser, properties, lower)
+    jobs = 1 if options.stream else options.jobs
+    if outfile:
+        with open(outfile, 'w', newline='') as f:
+            clock(options.quiet, 'Wrote ASM to {}'.format(outfile), asm_writer.write, f, jobs)
+    else:
+        clock(options.quiet, 'Wrote ASM to stdout', asm_writer.write, None, jobs)
+
+def write_variants(skoolfile, fname, options):
+    # Parse the skool file once for each distinct combination of asm mode and
+    # fix mode (which determine the lines that are parsed), and derive the
+    # case and base variants from that parse
+    root = os.path.splitext(options.output or os.path.basename(fname))[0]
+    groups = {}
+    for spec in options.variants:
+        asm_mode, fix_mode, case, base = _variant_options(spec, options)
+        groups.setdefault((asm_mode, fix_mode), {}).setdefault((case, base), spec)
+    if skoolfile == '-' and len(groups) > 1:
+        raise SkoolKitError('Cannot read standard input more than once for variants with different substitution or fix modes')
+    for (asm_mode, fix_mode), variants in groups.items():
+        parser = None
+        for (case, base), spec in variants.items():
+            if parser:
+                variant = clock(options.quiet, 'Converted {} ({})'.format(fname, spec), parser.get_variant, case, base)
+            else:
+                parser = variant = clock(options.quiet, 'Parsed {} ({})'.format(fname, spec), SkoolParser, skoolfile,
+                                         case, base, asm_mode, options.warn, fix_mode, False, options.create_labels,
+                                         True, options.start, options.end, cache_dir=options.parse_cache, variants=True)
+            write_asm(skoolfile, variant, options, case == CASE_LOWER, '{}-{}.asm'.format(root, spec))
+
+def run(skoolfile, options):
+    # Create the parser
+    if skoolfile == '-':
+        fname = 'stdin'
+    else:
+        fname = skoolfile
+    if options.variants:
+        write_variants(skoolfile, fname, options)
+        return
+    parser = clock(options.quiet, 'Parsed {}'.format(fname), SkoolParser, skoolfile,
+                   options.case, options.base, options.asm_mode, options.warn, options.fix_mode,
+                   False, options.create_labels, True, options.start, options.end, stream=options.stream,
+                   cache_dir=options.parse_cache)
+
+    # Write the ASM file
+    write_asm(skoolfile, parser, options, options.case == CASE_LOWER, options.output)
 
 def main(args):
     parser = argparse.ArgumentParser(
@@ -82,8 +138,18 @@ def main(args):
                             "  N=3: @ofix, @bfix and @rfix (implies -r)")
     group.add_argument('-H', '--hex', dest='base', action='store_const', const=BASE_16,
                        help="Write the disassembly in hexadecimal")
+    group.add_argument('-J', '--jobs', dest='jobs', metavar='N', type=int, default=1,
+                       help="Render entries using N worker processes (default: 1)")
+    group.add_argument('-k', '--parse-cache', dest='parse_cache', metavar='DIR',
+                       help="Cache the parsed skool file in this directory and\n"
+                            "reuse it while the file and options are unchanged")
     group.add_argument('-l', '--lower', dest='case', action='store_const', const=CASE_LOWER,
                        help="Write the disassembly in lower case")
+    group.add_argument('-M', '--stream', dest='stream', action='store_true',
+                       help="Parse the skool file in two passes, keeping only one\n"
+                            "entry in memory at a time")
+    group.add_argument('-o', '--output', dest='output', metavar='FILE',
+                       help="Write the ASM file to FILE instead of standard output")
     group.add_argument('-p', '--package-dir', dest='package_dir', action='store_true',
                        help="Show path to skoolkit package directory and exit")
     group.add_argument('-P', '--set', dest='properties', metavar='p=v', action='append', default=[],
@@ -98,6 +164,12 @@ def main(args):
                        help="Start converting at this address")
     group.add_argument('-u', '--upper', dest='case', action='store_const', const=CASE_UPPER,
                        help="Write the disassembly in upper case")
+    group.add_argument('-v', '--variant', dest='variants', metavar='SPEC', type=_variant, action='append', default=[],
+                       help="Write a variant of the ASM file to NAME-SPEC.asm, where\n"
+                            "NAME is the -o file name or the skool file name minus\n"
+                            "its extension, and SPEC combines f0-f3, l, u, D, H, r\n"
+                            "and s (as in the options with those letters); this\n"
+                            "option may be used multiple times")
     group.add_argument('-V', '--version', action='version', version='SkoolKit {}'.format(VERSION),
                        help='Show SkoolKit version number and exit')
     group.add_argument('-w', '--no-warnings', dest='warn', action='store_false',
@@ -15,28 +15,43 @@
 # SkoolKit. If not, see <http://www.gnu.org/licenses/>.
 
 import argparse
+import re
 
-from skoolkit import SkoolParsingError, open_file, info, warn, get_int_param, VERSION
+from skoolkit import SkoolKitError, SkoolParsingError, open_file, info, warn, write_text, get_int_param, VERSION
 from skoolkit.skoolparser import parse_asm_block_directive
 from skoolkit.skoolsft import VALID_CTLS
 from skoolkit.textutils import find_unquoted
-from skoolkit.z80 import assemble
+from skoolkit.z80 import assemble, split_operation
 
 SKIP_BLOCKS = ('d', 'r')
 
+# A label (optionally followed by an offset) as an operand, possibly in
+# brackets
+LABEL_OPERAND = re.compile(r'(\(?)([A-Za-z_][A-Za-z0-9_]*)([+-][$%]?[0-9A-Fa-f]+)?(\)?)$')
+
+# Operands that look like labels but are register names or conditions
+REGISTERS = frozenset(('A', 'B', 'C', 'D', 'E', 'H', 'L', 'I', 'R', 'AF', "AF'", 'BC', 'DE', 'HL', 'SP', 'IX', 'IY',
+                       'IXH', 'IXL', 'IYH', 'IYL', 'NZ', 'Z', 'NC', 'PO', 'PE', 'P', 'M'))
+
 class BinWriter:
     def __init__(self, skoolfile, asm_mode=0, fix_mode=0):
         self.asm_mode = asm_mode
         self.fix_mode = fix_mode
-        self.snapshot = [0] * 65536
+        self.snapshot = bytearray(65536)
         self.base_address = len(self.snapshot)
         self.end_address = 0
         self.stack = []
         self.include = True
         self.subs = [None] * 4
+        self.label = None
+        self.labels = {}
+        self.instructions = []
         self._parse_skool(skoolfile)
+        self._assemble()
 
     def _parse_skool(self, skoolfile):
+        # First pass: collect the operations to assemble, their addresses, and
+        # the addresses of @label directives
         entry_ctl = None
         f = open_file(skoolfile)
         for line in f:
@@ -45,9 +60,10 @@ class BinWriter:
             if line.startswith('@'):
                 self._parse_asm_directive(line[1:].rstrip())
                 continue
+            s_line = line.strip()
             if not self.include:
+                self._skip_line(line, s_line)
                 continue
-            s_line = line.strip()
             if not s_line:
                 # This line is blank
                 entry_ctl = None
@@ -56,6 +72,7 @@ class BinWriter:
             if entry_ctl is None and line.startswith(SKIP_BLOCKS):
                 entry_ctl = line[0]
             if entry_ctl in SKIP_BLOCKS:
+                self._skip_line(line, s_line)
                 continue
             if s_line.startswith(';'):
                 # This line is a continuation of an instruction comment
@@ -70,6 +87,7 @@ class BinWriter:
             address = get_int_param(line[1:6])
         except ValueError:
             raise SkoolParsingError("Invalid address ({}):\n{}".format(line[1:6], line.rstrip()))
+        self._bind_label(address)
         for sub in self.subs:
             if sub is not None:
                 operation = sub
@@ -78,14 +96,67 @@ class BinWriter:
         else:
             comment_index = find_unquoted(line, ';', 6)
             operation = line[7:comment_index].strip()
-        data = assemble(operation, address)
-        if data:
-            end_address = address + len(data)
-            self.snapshot[address:end_address] = data
-            self.base_address = min(self.base_address, address)
-            self.end_address = max(self.end_address, end_address)
-        else:
-            warn("Failed to assemble:\n {} {}".format(address, operation))
+        self.instructions.append((address, operation))
+
+    def _skip_line(self, line, s_line):
+        # Bind any pending @label to the address of an instruction that is not
+        # assembled, so that it is not carried over to the next one that is
+        if self.label and s_line and not s_line.startswith(';') and (line[0] in VALID_CTLS or line[0] in SKIP_BLOCKS):
+            try:
+                self._bind_label(get_int_param(line[1:6]))
+            except ValueError:
+                warn('Ignoring label ({}) on line with invalid address:\n{}'.format(self.label, line.rstrip()))
+                self.label = None
+
+    def _bind_label(self, address):
+        if self.label:
+            if self.label in self.labels:
+                warn('Duplicate label: {}'.format(self.label))
+            else:
+                self.labels[self.label] = address
+            self.label = None
+
+    def _assemble(self):
+        # Second pass: assemble each operation (replacing any labels in its
+        # operands with their addresses) and write the bytes
+        snapshot = self.snapshot
+        base_address, end_address = self.base_address, self.end_address
+        for address, operation in self.instructions:
+            data = assemble(self._resolve_labels(address, operation), address)
+            if data:
+                snapshot[address:address + len(data)] = data
+                base_address = min(base_address, address)
+                end_address = max(end_address, address + len(data))
+            else:
+                warn("Failed to assemble:\n {} {}".format(address, operation))
+        self.base_address, self.end_address = base_address, end_address
+
+    def _resolve_labels(self, address, operation):
+        # Replace any labels in the operands with their addresses; an
+        # unresolved label in a DEFB/DEFM/DEFS/DEFW directive would otherwise
+        # be assembled silently as 0, so warn about it
+        elements = split_operation(operation)
+        directive = elements[0].upper().startswith('DEF')
+        resolved = False
+        for i, operand in enumerate(elements[1:], 1):
+            match = LABEL_OPERAND.match(operand)
+            if match is None or (not directive and match.group(2).upper() in REGISTERS):
+                continue
+            lb, label, offset, rb = match.groups()
+            if label in self.labels:
+                value = self.labels[label]
+                if offset:
+                    if offset[0] == '+':
+                        value += get_int_param(offset[1:])
+                    else:
+                        value -= get_int_param(offset[1:])
+                elements[i] = '{}{}{}'.format(lb, value % 65536, rb or '')
+                resolved = True
+            elif directive:
+                warn("Unresolved label ({}):\n {} {}".format(label, address, operation))
+        if resolved:
+            return '{} {}'.format(elements[0], ','.join(elements[1:]))
+        return operation
 
     def _parse_asm_directive(self, directive):
         if parse_asm_block_directive(directive, self.stack):
@@ -109,7 +180,9 @@ class BinWriter:
                     return
         if not self.include:
             return
-        if directive.startswith('isub=') and self.asm_mode > 0:
+        if directive.startswith('label='):
+            self.label = directive[6:].rstrip()
+        elif directive.startswith('isub=') and self.asm_mode > 0:
             self.subs[3] = directive[5:].rstrip()
         elif directive.startswith('ssub=') and self.asm_mode > 1:
             self.subs[2] = directive[5:].rstrip()
@@ -128,15 +201,39 @@ class BinWriter:
         else:
             end_address = end
         data = self.snapshot[base_address:end_address]
-        with open_file(binfile, 'wb') as f:
-            f.write(bytearray(data))
+        f = open_file(binfile, 'wb')
+        f.write(bytearray(data))
         if binfile == '-':
+            # Leave standard output open for anything written after this
+            f.flush()
             binfile = 'stdout'
+        else:
+            f.close()
         info("Wrote {}: start={}, end={}, size={}".format(binfile, base_address, end_address, len(data)))
 
+    def write_map(self, mapfile):
+        lines = ['{} EQU {}\n'.format(label, address) for address, label in sorted((a, l) for l, a in self.labels.items())]
+        if mapfile == '-':
+            write_text(''.join(lines))
+            mapfile = 'stdout'
+        else:
+            with open(mapfile, 'w') as f:
+                f.writelines(lines)
+        info("Wrote {}: {} labels".format(mapfile, len(self.labels)))
+
+def _region(spec):
+    start, end, binfile = spec.split(',', 2)
+    return get_int_param(start), get_int_param(end), binfile
+
 def run(skoolfile, binfile, options):
     binwriter = BinWriter(skoolfile, options.asm_mode, options.fix_mode)
-    binwriter.write(binfile, options.start, options.end)
+    if options.regions:
+        for start, end, region_file in options.regions:
+            binwriter.write(region_file, start, end)
+    else:
+        binwriter.write(binfile, options.start, options.end)
+    if options.mapfile:
+        binwriter.write_map(options.mapfile)
 
 def main(args):
     parser = argparse.ArgumentParser(
@@ -156,8 +253,13 @@ def main(args):
                        help='Stop converting at this address')
     group.add_argument('-i', '--isub', dest='asm_mode', action='store_const', const=1, default=0,
                        help="Apply @isub directives")
+    group.add_argument('-m', '--map', dest='mapfile', metavar='FILE',
+                       help="Write the address of each @label to this file")
     group.add_argument('-o', '--ofix', dest='fix_mode', action='store_const', const=1, default=0,
                        help="Apply @ofix directives")
+    group.add_argument('-r', '--region', dest='regions', metavar='START,END,FILE', type=_region, action='append', default=[],
+                       help="Write the bytes from START to END-1 to FILE instead of writing 'file.bin'; "
+                            "this option may be used multiple times, but not with --start, --end or 'file.bin'")
     group.add_argument('-s', '--ssub', dest='asm_mode', action='store_const', const=2, default=0,
                        help="Apply @isub and @ssub directives")
     group.add_argument('-S', '--start', dest='start', metavar='ADDR', type=int,
@@ -170,6 +272,10 @@ def main(args):
         parser.exit(2, parser.format_help())
 
     binfile = namespace.binfile
+    if namespace.regions and (binfile or namespace.start is not None or namespace.end is not None):
+        raise SkoolKitError("--region cannot be used with --start, --end or 'file.bin'")
+    if namespace.mapfile == '-' and '-' in [binfile] + [r[2] for r in namespace.regions]:
+        raise SkoolKitError('The map file and the binary file cannot both be written to standard output')
     if binfile is None:
         if skoolfile.lower().endswith('.skool'):
             binfile = skoolfile[:-6] + '.bin'
@@ -22,7 +22,7 @@ from skoolkit.skoolctl import (CtlWriter, ASM_DIRECTIVES, BLOCKS, BLOCK_TITLES,
 
 def run(skoolfile, options):
     writer = CtlWriter(skoolfile, options.elements, options.write_hex,
-                       options.preserve_base, options.start, options.end)
+                       options.preserve_base, options.start, options.end, options.parse_cache)
     writer.write()
 
 def main(args):
@@ -42,6 +42,9 @@ def main(args):
                        help="Stop converting at this address")
     group.add_argument('-h', '--hex', action='store_const', dest='write_hex', const=1, default=0,
                        help='Write addresses in upper case hexadecimal format')
+    group.add_argument('-k', '--parse-cache', dest='parse_cache', metavar='DIR',
+                       help='Cache the parsed skool file in this directory and\n'
+                            'reuse it while the file and options are unchanged')
     group.add_argument('-l', '--hex-lower', action='store_const', dest='write_hex', const=-1, default=0,
                        help='Write addresses in lower case hexadecimal format')
     group.add_argument('-S', '--start', dest='start', metavar='ADDR', type=int, default=0,
@@ -20,6 +20,7 @@ from os.path import isfile, isdir, basename, dirname
 import shutil
 import time
 import argparse
+import multiprocessing
 from io import StringIO
 
 from skoolkit import defaults, SkoolKitError, show_package_dir, write, write_line, get_class, normpath, PACKAGE_DIR, VERSION
@@ -34,6 +35,10 @@ SEARCH_DIRS = (
     os.path.join(PACKAGE_DIR, 'resources')
 )
 
+# Skool macros whose effects may carry over from one page to the next, and
+# which therefore prevent pages from being written in parallel
+SERIAL_MACROS = ('#CALL', '#POKES', '#POPS', '#PUSHS', '#UDGARRAY*')
+
 SEARCH_DIRS_MSG = """
 skool2html.py searches the following directories for skool files, ref files,
 CSS files, JavaScript files, font files, and files listed in the [Resources]
@@ -236,8 +241,8 @@ def process_file(infile, topdir, options):
         fname = 'skool file from standard input'
     else:
         fname = skoolfile_f
-    skool_parser = clock(SkoolParser, 'Parsing {}'.format(fname), skoolfile_f, case=case, base=options.base, html=True, create_labels=options.create_labels, asm_labels=options.asm_labels)
-    file_info = FileInfo(topdir, game_dir, options.new_images)
+    skool_parser = clock(SkoolParser, 'Parsing {}'.format(fname), skoolfile_f, case=case, base=options.base, html=True, create_labels=options.create_labels, asm_labels=options.asm_labels, cache_dir=options.parse_cache)
+    file_info = FileInfo(topdir, game_dir, options.new_images, options.image_cache)
     html_writer = html_writer_class(skool_parser, ref_parser, file_info, case)
 
     # Check that the specified pages exist
@@ -247,9 +252,40 @@ def process_file(infile, topdir, options):
             raise SkoolKitError('Invalid page ID: {0}'.format(page_id))
     pages = pages or all_page_ids
 
-    write_disassembly(html_writer, options.files, ref_search_dir, extra_search_dirs, pages, options.themes, options.single_css)
+    jobs = options.jobs
+    if jobs > 1 and (stdin or not can_write_in_parallel([skoolfile_f] + reffiles, options.config_specs)):
+        notify('Writing files serially (found {} in the input)'.format('/'.join(SERIAL_MACROS)))
+        jobs = 1
+
+    write_disassembly(html_writer, options.files, ref_search_dir, extra_search_dirs, pages, options.themes, options.single_css, jobs)
+
+def can_write_in_parallel(fnames, config_specs):
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return False
+    texts = list(config_specs)
+    for fname in fnames:
+        with open(fname) as f:
+            texts.append(f.read())
+    return not any([m in text for text in texts for m in SERIAL_MACROS])
+
+def _write_file(method_name, *args):
+    getattr(_html_writer, method_name)(*args)
+
+def write_files(pool, html_writer, method_name, messages, arg_lists):
+    # Write a batch of files with the same HtmlWriter method, either serially
+    # or by sharding them across a pool of worker processes
+    if pool:
+        if arg_lists:
+            for message in messages[:-1]:
+                notify(message)
+            tasks = [(method_name,) + tuple(args) for args in arg_lists]
+            clock(pool.starmap, messages[-1], _write_file, tasks)
+    else:
+        method = getattr(html_writer, method_name)
+        for message, args in zip(messages, arg_lists):
+            clock(method, message, *args)
 
-def write_disassembly(html_writer, files, search_dir, extra_search_dirs, pages, css_themes, single_css):
+def write_disassembly(html_writer, files, search_dir, extra_search_dirs, pages, css_themes, single_css, jobs=1):
     game_dir = html_writer.file_info.game_dir
     paths = html_writer.paths
     game_vars = html_writer.game_vars
@@ -274,25 +310,49 @@ def write_disassembly(html_writer, files, search_dir, extra_search_dirs, pages,
             raise SkoolKitError('Cannot copy resource "{}": file not found'.format(normpath(f)))
         copy_resource(fname, odir, dest_dir)
 
-    # Write disassembly files
-    if 'd' in files:
-        if html_writer.asm_single_page_template:
-            message = 'Writing {}'.format(normpath(game_dir, paths['AsmSinglePage']))
-        else:
-            message = 'Writing disassembly files in {}'.format(normpath(game_dir, html_writer.code_path))
-        clock(html_writer.write_asm_entries, '  ' + message)
-
-    # Write the memory map files
-    if 'm' in files:
-        for map_name in html_writer.main_memory_maps:
-            clock(html_writer.write_map, '  Writing {}'.format(normpath(game_dir, paths[map_name])), map_name)
+    pool = None
+    if jobs > 1:
+        # The worker processes inherit the parsed skool file and ref files
+        global _html_writer
+        _html_writer = html_writer
+        pool = multiprocessing.get_context('fork').Pool(jobs)
 
-    # Write pages defined by [Page:*] sections
-    if 'P' in files:
-        for page_id in pages:
-            page_details = html_writer.pages[page_id]
-            copy_resources(search_dir, extra_search_dirs, odir, page_details.get('JavaScript'), js_path, indent=2)
-            clock(html_writer.write_page, '  Writing {}'.format(normpath(game_dir, paths[page_id])), page_id)
+    try:
+        # Write disassembly files
+        if 'd' in files:
+            if html_writer.asm_single_page_template:
+                message = 'Writing {}'.format(normpath(game_dir, paths['AsmSinglePage']))
+            else:
+                message = 'Writing disassembly files in {}'.format(normpath(game_dir, html_writer.code_path))
+            if pool and not html_writer.asm_single_page_template:
+                arg_lists = [(html_writer.code_path, i, paths['MemoryMap']) for i in range(len(html_writer.memory_map))]
+                write_files(pool, html_writer, 'write_entry', ['  ' + message], arg_lists)
+            else:
+                clock(html_writer.write_asm_entries, '  ' + message)
+
+        # Write the memory map files
+        if 'm' in files:
+            map_names = html_writer.main_memory_maps
+            messages = ['  Writing {}'.format(normpath(game_dir, paths[m])) for m in map_names]
+            write_files(pool, html_writer, 'write_map', messages, [(m,) for m in map_names])
+
+        # Write pages defined by [Page:*] sections
+        if 'P' in files:
+            messages = []
+            for page_id in pages:
+                page_details = html_writer.pages[page_id]
+                copy_resources(search_dir, extra_search_dirs, odir, page_details.get('JavaScript'), js_path, indent=2)
+                message = '  Writing {}'.format(normpath(game_dir, paths[page_id]))
+                if pool:
+                    messages.append(message)
+                else:
+                    clock(html_writer.write_page, message, page_id)
+            if pool:
+                write_files(pool, html_writer, 'write_page', messages, [(p,) for p in pages])
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
 
     # Write other code files
     if 'o' in files:
@@ -351,8 +411,17 @@ def main(args):
                        help="Write the disassembly in decimal")
     group.add_argument('-H', '--hex', dest='base', action='store_const', const=BASE_16,
                        help="Write the disassembly in hexadecimal")
+    group.add_argument('-I', '--image-cache', dest='image_cache', metavar='DIR',
+                       help="Cache image files in this directory and reuse them\n"
+                            "across output directories and runs")
     group.add_argument('-j', '--join-css', dest='single_css', metavar='NAME',
                        help="Concatenate CSS files into a single file with this name")
+    group.add_argument('-J', '--jobs', dest='jobs', metavar='N', type=int, default=1,
+                       help="Write disassembly files, memory maps and other pages\n"
+                            "using N worker processes (default: 1)")
+    group.add_argument('-k', '--parse-cache', dest='parse_cache', metavar='DIR',
+                       help="Cache the parsed skool file in this directory and\n"
+                            "reuse it while the file and options are unchanged")
     group.add_argument('-l', '--lower', dest='case', action='store_const', const=CASE_LOWER,
                        help="Write the disassembly in lower case")
     group.add_argument('-o', '--rebuild-images', dest='new_images', action='store_true',
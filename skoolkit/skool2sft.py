@@ -20,7 +20,7 @@ from skoolkit import VERSION
 from skoolkit.skoolsft import SftWriter
 
 def run(skoolfile, options):
-    writer = SftWriter(skoolfile, options.write_hex, options.preserve_base)
+    writer = SftWriter(skoolfile, options.write_hex, options.preserve_base, options.parse_cache)
     writer.write(options.start, options.end)
 
 def main(args):
@@ -38,6 +38,9 @@ def main(args):
                        help="Stop converting at this address")
     group.add_argument('-h', '--hex', action='store_const', dest='write_hex', const=1, default=0,
                        help='Write addresses in upper case hexadecimal format')
+    group.add_argument('-k', '--parse-cache', dest='parse_cache', metavar='DIR',
+                       help='Cache the parsed skool file in this directory and '
+                            'reuse it while the file and options are unchanged')
     group.add_argument('-l', '--hex-lower', action='store_const', dest='write_hex', const=-1, default=0,
                        help='Write addresses in lower case hexadecimal format')
     group.add_argument('-S', '--start', dest='start', metavar='ADDR', type=int, default=0,
@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License along with
 # SkoolKit. If not, see <http://www.gnu.org/licenses/>.
 
+import multiprocessing
 import re
 
 from skoolkit import skoolmacro, SkoolKitError, SkoolParsingError, warn, write_text, wrap
@@ -25,6 +26,35 @@ UDGTABLE_MARKER = '#UDGTABLE'
 
 DEF_INSTRUCTION_WIDTH = 23
 
+# The number of lines to accumulate before writing them in a single chunk
+BUFFER_LINES = 1024
+
+# Macros that modify the memory snapshot (or may do anything at all), and so
+# prevent the entries that follow them from being written in parallel
+SERIAL_MACROS = ('#CALL', '#POKES', '#POPS', '#PUSHS')
+
+def _render_entry(index):
+    # Render an entry in a worker process (which inherits the ASM writer and
+    # the list of entries), collecting its warnings so that the main process
+    # can print them in entry order
+    _asm_writer._lines = []
+    _asm_writer._warnings = []
+    _asm_writer._print_entry(_entries[index])
+    return _asm_writer._lines, _asm_writer._warnings
+
+def _entry_texts(entry):
+    yield entry.description
+    yield from entry.details
+    for reg in entry.registers:
+        yield reg.contents
+    for instruction in entry.instructions:
+        yield instruction.comment.text
+        yield from instruction.mid_block_comment or ()
+    yield from entry.end_comment
+
+def _is_serial(entry):
+    return any(m in text for text in _entry_texts(entry) for m in SERIAL_MACROS)
+
 class AsmWriter:
     def __init__(self, parser, properties, lower):
         self.parser = parser
@@ -93,6 +123,9 @@ class AsmWriter:
 
         self.list_parser = ListParser()
 
+        self._lines = []
+        self._warnings = None
+
         self.macros = skoolmacro.get_macros(self)
 
     def _get_int_property(self, properties, name, default):
@@ -103,25 +136,77 @@ class AsmWriter:
 
     def warn(self, s):
         if self.show_warnings:
-            warn(s)
+            if self._warnings is None:
+                warn(s)
+            else:
+                self._warnings.append(s)
 
-    def write(self):
+    def write(self, outfile=None, jobs=1):
+        """Write the ASM file.
+
+        :param outfile: The file object to write to (default: standard
+                        output).
+        :param jobs: The number of worker processes to use for rendering
+                     entries. Entries are rendered in parallel up to the
+                     first one that uses a macro that modifies the memory
+                     snapshot (such as #POKES), and serially from there on.
+        """
+        if outfile is None:
+            write = write_text
+        else:
+            write = outfile.write
+        self._lines = []
         self.print_header(self.parser.header)
         self.print_equs(self.parser.equs)
-        for entry in self.parser.memory_map:
-            first_instruction = entry.instructions[0]
-            org = first_instruction.org
-            if org:
-                if self.lower:
-                    org_dir = 'org'
-                else:
-                    org_dir = 'ORG'
-                org_addr_str = self.parser.convert_address_operand(org)
-                self.write_line('{0}{1} {2}'.format(self.indent, org_dir, org_addr_str))
-                self.write_line('')
-            self.entry = entry
-            self.print_entry()
+        for entry, rendered in self._render_entries(jobs):
+            if rendered is None:
+                self._print_entry(entry)
+            else:
+                lines, warnings = rendered
+                for message in warnings:
+                    warn(message)
+                self._lines.extend(lines)
+            if len(self._lines) >= BUFFER_LINES:
+                write(''.join(self._lines))
+                self._lines = []
+        write(''.join(self._lines))
+        self._lines = []
+
+    def _render_entries(self, jobs):
+        # Yield each entry along with its lines and warnings (if rendered by a
+        # worker process) or None (if it should be rendered by this process)
+        entries = self.parser.get_entries()
+        if jobs > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            entries = list(entries)
+            parallel = len(entries)
+            for i, entry in enumerate(entries):
+                if _is_serial(entry):
+                    parallel = i
+                    break
+            if parallel > 1:
+                global _asm_writer, _entries
+                _asm_writer, _entries = self, entries
+                with multiprocessing.get_context('fork').Pool(jobs) as pool:
+                    chunksize = max(1, parallel // (jobs * 4))
+                    yield from zip(entries, pool.imap(_render_entry, range(parallel), chunksize))
+                entries = entries[parallel:]
+        for entry in entries:
+            yield entry, None
+
+    def _print_entry(self, entry):
+        first_instruction = entry.instructions[0]
+        org = first_instruction.org
+        if org:
+            if self.lower:
+                org_dir = 'org'
+            else:
+                org_dir = 'ORG'
+            org_addr_str = self.parser.convert_address_operand(org)
+            self.write_line('{0}{1} {2}'.format(self.indent, org_dir, org_addr_str))
             self.write_line('')
+        self.entry = entry
+        self.print_entry()
+        self.write_line('')
 
     def print_header(self, header):
         if header:
@@ -154,7 +239,7 @@ class AsmWriter:
             self.print_comment_lines(self.entry.end_comment, ignoreua=self.entry.ignoreua['e'])
 
     def write_line(self, s):
-        write_text('{0}{1}'.format(s, self.end))
+        self._lines.append('{0}{1}'.format(s, self.end))
 
     def pop_snapshot(self):
         """Discard the current memory snapshot and replace it with the one that
@@ -348,7 +433,7 @@ class AsmWriter:
             if lines:
                 started = True
             for line in lines:
-                if not ignoreua:
+                if self.show_warnings and not ignoreua:
                     uaddress = self.find_unconverted_address(line)
                     if uaddress:
                         if instruction:
@@ -371,7 +456,7 @@ class AsmWriter:
                 prefix = indent
             reg_label = prefix + reg.name
             reg_desc = self.expand(reg.contents)
-            if not self.entry.ignoreua['r']:
+            if self.show_warnings and not self.entry.ignoreua['r']:
                 uaddress = self.find_unconverted_address(reg_desc)
                 if uaddress:
                     line = '; {} {}'.format(reg_label, reg_desc)
@@ -433,12 +518,13 @@ class AsmWriter:
                     line_comment = ''
                     oline = '{0}{1}'.format(self.indent, operation)
                 self.write_line(oline)
-                if not ignoreua:
-                    uaddress = self.find_unconverted_address(line_comment)
-                    if uaddress:
-                        self.warn('Comment at {0} contains address ({1}) not converted to a label:\n{2}'.format(iaddress, uaddress, oline))
-                if len(oline) > self.line_width:
-                    self.warn('Line is {0} characters long:\n{1}'.format(len(oline), oline))
+                if self.show_warnings:
+                    if not ignoreua:
+                        uaddress = self.find_unconverted_address(line_comment)
+                        if uaddress:
+                            self.warn('Comment at {0} contains address ({1}) not converted to a label:\n{2}'.format(iaddress, uaddress, oline))
+                    if len(oline) > self.line_width:
+                        self.warn('Line is {0} characters long:\n{1}'.format(len(oline), oline))
                 continue # pragma: no cover
 
             ignoreua = instruction.ignoreua
@@ -0,0 +1,134 @@
+# Copyright 2017 Richard Dymond (rjdymond@gmail.com)
+#
+# This file is part of SkoolKit.
+#
+# SkoolKit is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# SkoolKit is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# SkoolKit. If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+from skoolkit import VERSION, open_file
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, f, node_class):
+        pickle.Pickler.__init__(self, f, pickle.HIGHEST_PROTOCOL)
+        self.node_class = node_class
+        self.nodes = []
+        self._node_ids = {}
+
+    def persistent_id(self, obj):
+        # Pickle each node (e.g. a SkoolEntry) by reference, so that chains of
+        # references between nodes do not turn into deep recursion
+        if self.node_class and isinstance(obj, self.node_class):
+            node_id = self._node_ids.get(id(obj))
+            if node_id is None:
+                node_id = self._node_ids[id(obj)] = len(self.nodes)
+                self.nodes.append(obj)
+            return (node_id, obj.__class__)
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, f):
+        pickle.Unpickler.__init__(self, f)
+        self.nodes = {}
+
+    def persistent_load(self, pid):
+        node_id, node_class = pid
+        node = self.nodes.get(node_id)
+        if node is None:
+            node = self.nodes[node_id] = node_class.__new__(node_class)
+        return node
+
+class SkoolCache:
+    """Stores and retrieves the parsed form of a skool file.
+
+    The cache file is a pickle, and loading it can run arbitrary code, so the
+    cache directory must be one that only trusted users can write to.
+
+    :param cache_dir: The directory in which to store the cache file, or
+                      `None` to disable caching.
+    :param skoolfile: The name of the skool file.
+    :param key: A tuple of the parser class and options that determine the
+                parsed form of the skool file.
+    """
+    def __init__(self, cache_dir, skoolfile, key):
+        self.fname = None
+        if cache_dir is not None and isinstance(skoolfile, str) and skoolfile != '-':
+            # The file name is made from a hash of the skool file's path and
+            # the options, followed by a hash of its contents; a cache file
+            # with the same prefix but different contents is stale
+            key_digest = hashlib.sha256(repr((os.path.abspath(skoolfile), key)).encode())
+            digest = hashlib.sha256(repr((VERSION, pickle.HIGHEST_PROTOCOL)).encode())
+            with open_file(skoolfile, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    digest.update(chunk)
+            self.prefix = '{}-{}-'.format(os.path.basename(skoolfile), key_digest.hexdigest()[:16])
+            name = '{}{}.pickle'.format(self.prefix, digest.hexdigest())
+            self.fname = os.path.join(cache_dir or os.path.dirname(skoolfile), name)
+
+    def load(self):
+        """Return the cached state of the parser, or `None` if there is no
+        valid cache file.
+        """
+        if self.fname and os.path.isfile(self.fname):
+            try:
+                with open(self.fname, 'rb') as f:
+                    unpickler = _Unpickler(f)
+                    state = unpickler.load()
+                    while True:
+                        node_state = unpickler.load()
+                        if node_state is None:
+                            break
+                        node_id, attrs = node_state
+                        unpickler.nodes[node_id].__dict__.update(attrs)
+                return state
+            except Exception:
+                # Treat an unreadable cache file as a cache miss
+                pass
+
+    def save(self, state, node_class=None):
+        """Write the state of the parser to the cache file, and remove any
+        stale cache files for the same skool file and options.
+
+        :param state: The state to save.
+        :param node_class: The class of objects (if any) to pickle by
+                           reference.
+        """
+        if self.fname:
+            cache_dir = os.path.dirname(self.fname) or '.'
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_fname = tempfile.mkstemp(dir=cache_dir)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickler = _Pickler(f, node_class)
+                    pickler.dump(state)
+                    node_id = 0
+                    while node_id < len(pickler.nodes):
+                        pickler.dump((node_id, pickler.nodes[node_id].__dict__))
+                        node_id += 1
+                    pickler.dump(None)
+                os.replace(tmp_fname, self.fname)
+            except:
+                os.remove(tmp_fname)
+                raise
+            self._remove_stale_files(cache_dir)
+
+    def _remove_stale_files(self, cache_dir):
+        name = os.path.basename(self.fname)
+        for f in os.listdir(cache_dir):
+            if f.startswith(self.prefix) and f.endswith('.pickle') and f != name:
+                try:
+                    os.remove(os.path.join(cache_dir, f))
+                except OSError:
+                    pass
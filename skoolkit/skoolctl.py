@@ -17,6 +17,7 @@
 import re
 
 from skoolkit import SkoolParsingError, write_line, get_int_param, get_address_format, open_file
+from skoolkit.skoolcache import SkoolCache
 from skoolkit.skoolparser import (Comment, Register, parse_comment_block, parse_instruction, parse_address_comments,
                                   join_comments, parse_asm_block_directive, DIRECTIVES)
 from skoolkit.z80 import get_size, split_operation
@@ -213,8 +214,8 @@ def extract_entry_asm_directives(asm_directives):
 
 class CtlWriter:
     def __init__(self, skoolfile, elements='abtdrmsc', write_hex=0,
-                 preserve_base=False, min_address=0, max_address=65536):
-        self.parser = SkoolParser(skoolfile, preserve_base, min_address, max_address)
+                 preserve_base=False, min_address=0, max_address=65536, cache_dir=None):
+        self.parser = SkoolParser(skoolfile, preserve_base, min_address, max_address, cache_dir)
         self.elements = elements
         self.write_asm_dirs = ASM_DIRECTIVES in elements
         self.address_fmt = get_address_format(write_hex, write_hex < 0)
@@ -427,7 +428,7 @@ class CtlWriter:
         write_line('{} {}{} {}'.format(sub_block_ctl, addr_str, lengths, comment).rstrip())
 
 class SkoolParser:
-    def __init__(self, skoolfile, preserve_base, min_address, max_address):
+    def __init__(self, skoolfile, preserve_base, min_address, max_address, cache_dir=None):
         self.skoolfile = skoolfile
         self.preserve_base = preserve_base
         self.mode = Mode()
@@ -435,8 +436,16 @@ class SkoolParser:
         self.stack = []
         self.end_address = 65536
 
-        with open_file(skoolfile) as f:
-            self._parse_skool(f, min_address, max_address)
+        cache = SkoolCache(cache_dir, skoolfile, ('skoolctl.SkoolParser', preserve_base, min_address, max_address))
+        state = cache.load()
+        if state:
+            self.__dict__.update(state)
+        else:
+            with open_file(skoolfile) as f:
+                self._parse_skool(f, min_address, max_address)
+            state = self.__dict__.copy()
+            del state['skoolfile']
+            cache.save(state)
 
     def _parse_skool(self, skoolfile, min_address, max_address):
         map_entry = None
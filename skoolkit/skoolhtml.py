@@ -18,8 +18,10 @@
 Defines the :class:`FileInfo` and :class:`HtmlWriter` classes.
 """
 
+import hashlib
 import posixpath
 import os.path
+import shutil
 from os.path import isfile, isdir, basename
 from collections import defaultdict
 import re
@@ -998,11 +1000,29 @@ class HtmlWriter:
                        the image.
         """
         img_format = self._get_image_format(image_path)
+        key = None
+        if self.file_info.image_cache:
+            key = self._get_image_key(frames, img_format)
+            if self.file_info.copy_cached_image(key, image_path):
+                self.file_info.add_image(image_path)
+                return
         f = self.file_info.open_file(image_path, mode='wb')
         self.image_writer.write_image(frames, f, img_format)
         f.close()
+        if key:
+            self.file_info.cache_image(key, image_path)
         self.file_info.add_image(image_path)
 
+    def _get_image_key(self, frames, img_format):
+        image_writer = self.image_writer
+        digest = hashlib.sha256()
+        digest.update(repr((img_format, image_writer.colours, sorted(image_writer.options.items()))).encode())
+        for frame in frames:
+            digest.update(repr((frame.scale, frame.mask, frame.x, frame.y, frame.width, frame.height, frame.delay)).encode())
+            for row in frame.udgs:
+                digest.update(repr([(u.attr, list(u.data), u.mask and list(u.mask)) for u in row]).encode())
+        return digest.hexdigest()
+
     def build_table(self, table):
         rows = []
         for row in table.rows:
@@ -1250,11 +1270,14 @@ class FileInfo:
     :param game_dir: The subdirectory of `topdir` in which to write all HTML
                      files and image files.
     :param replace_images: Whether existing images should be overwritten.
+    :param image_cache: The directory in which to cache image files across
+                        runs (if any).
     """
-    def __init__(self, topdir, game_dir, replace_images):
+    def __init__(self, topdir, game_dir, replace_images, image_cache=None):
         self.game_dir = game_dir
         self.odir = join(topdir, game_dir)
         self.replace_images = replace_images
+        self.image_cache = image_cache
         self.images = set()
 
     def open_file(self, *names, mode='w'):
@@ -1262,12 +1285,36 @@ class FileInfo:
         for name in names:
             path = join(path, name)
         if not isdir(os.path.dirname(path)):
-            os.makedirs(os.path.dirname(path))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
         return open(path, mode)
 
     def add_image(self, image_path):
         self.images.add(image_path)
 
+    def _cached_image_path(self, key, image_path):
+        return join(self.image_cache, key[:2], key + image_path[-4:].lower())
+
+    def copy_cached_image(self, key, image_path):
+        # Copy (rather than hard-link) the cached image, so that rewriting the
+        # image in place later on cannot modify the cache; remove any existing
+        # image first, in case it is a hard link to a file in the cache
+        path = join(self.odir, image_path)
+        if isfile(path):
+            os.remove(path)
+        cached_path = self._cached_image_path(key, image_path)
+        if not isfile(cached_path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(cached_path, path)
+        return True
+
+    def cache_image(self, key, image_path):
+        cached_path = self._cached_image_path(key, image_path)
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(cached_path, os.getpid())
+        shutil.copyfile(join(self.odir, image_path), tmp_path)
+        os.replace(tmp_path, cached_path)
+
     def need_image(self, image_path):
         return (self.replace_images and image_path not in self.images) or not self.file_exists(image_path)
 
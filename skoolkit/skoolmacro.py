@@ -14,7 +14,9 @@
 # You should have received a copy of the GNU General Public License along with
 # SkoolKit. If not, see <http://www.gnu.org/licenses/>.
 
+import bisect
 from collections import defaultdict
+from functools import lru_cache
 import inspect
 import re
 
@@ -31,6 +33,9 @@ FILL_UDG = Udg(66, [129, 66, 36, 24, 24, 36, 66, 128])
 
 MACRO_CHARS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
+# The maximum number of pieces of text whose macro positions are remembered
+MACRO_CACHE_SIZE = 16384
+
 DELIMITERS = {
     '(': ')',
     '[': ']',
@@ -408,6 +413,24 @@ def get_macros(writer):
             macros['#' + match.group(1).upper()] = method
     return macros
 
+def _find_macros(text):
+    # Return the start positions, parameter indexes and names of the potential
+    # macros in a piece of text; since a macro name cannot contain '#', the
+    # first macro found by a search from any position is the first one listed
+    # here that starts at or after that position
+    nodes = [(m.start(), m.end(), m.group()) for m in RE_MACRO.finditer(text)]
+    return [n[0] for n in nodes], nodes
+
+@lru_cache(maxsize=MACRO_CACHE_SIZE)
+def _find_cached_macros(text):
+    # Text that is rebuilt during expansion is rarely seen again, so only the
+    # original text passed to expand_macros() goes through this cache
+    return _find_macros(text)
+
+def _is_macro_char(text, index):
+    # Return whether text[index] could continue a macro name after '#'
+    return index < len(text) and text[index] in MACRO_CHARS
+
 def expand_macros(writer, text, *cwd):
     global _writer, _cwd
     _writer = writer
@@ -416,18 +439,28 @@ def expand_macros(writer, text, *cwd):
     if text.find('#') < 0:
         return text
 
+    # Expanded text is collected in 'output'; text[pos:] remains to be
+    # expanded. The result is the same as that of repeatedly expanding the
+    # first macro in the text until none remains, but each replacement is
+    # built only once unless it contains another macro
+    output = []
+    last_char = ''
+    pos = 0
+    starts, nodes = _find_cached_macros(text)
     while 1:
-        search = RE_MACRO.search(text)
-        if not search:
+        i = bisect.bisect_left(starts, pos)
+        if i == len(nodes):
+            output.append(text[pos:])
             break
-        marker = search.group()
+        start, index, marker = nodes[i]
         if marker not in writer.macros:
             raise SkoolParsingError('Found unknown macro: {}'.format(marker))
-        start, index = search.span()
 
-        while RE_EXPAND.match(text, index):
-            end, expr = parse_strings(text, index + 1, 1)
-            text = text[:index] + expand_macros(writer, expr, *cwd) + text[end:]
+        if RE_EXPAND.match(text, index):
+            while RE_EXPAND.match(text, index):
+                end, expr = parse_strings(text, index + 1, 1)
+                text = text[:index] + expand_macros(writer, expr, *cwd) + text[end:]
+            starts, nodes = _find_macros(text)
 
         repf = writer.macros[marker]
         try:
@@ -436,9 +469,27 @@ def expand_macros(writer, text, *cwd):
             raise SkoolParsingError('Found unsupported macro: {}'.format(marker))
         except MacroParsingError as e:
             raise SkoolParsingError('Error while parsing {} macro: {}'.format(marker, e.args[0]))
-        text = text[:start] + rep + text[end:]
 
-    return text
+        output.append(text[pos:start])
+        if start > pos:
+            last_char = text[start - 1]
+        if (RE_MACRO.search(rep) or (last_char == '#' and _is_macro_char(rep, 0))
+                or ((rep[-1:] or last_char) == '#' and _is_macro_char(text, end))):
+            # The replacement contains a macro, or forms one with the
+            # surrounding text, so rescan it along with the rest of the text
+            prefix = ''.join(output)
+            text = prefix + rep + text[end:]
+            pos = len(prefix) - (last_char == '#')
+            output = [text[:pos]]
+            last_char = text[pos - 1:pos]
+            starts, nodes = _find_macros(text)
+        else:
+            output.append(rep)
+            if rep:
+                last_char = rep[-1]
+            pos = end
+
+    return ''.join(output)
 
 def parse_call(text, index, writer, cwd=None):
     # #CALL:methodName(args)
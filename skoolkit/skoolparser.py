@@ -14,10 +14,13 @@
 # You should have received a copy of the GNU General Public License along with
 # SkoolKit. If not, see <http://www.gnu.org/licenses/>.
 
+import bisect
+import copy
 import html
 import re
 
 from skoolkit import SkoolParsingError, warn, wrap, get_int_param, parse_int, open_file
+from skoolkit.skoolcache import SkoolCache
 from skoolkit.skoolmacro import DELIMITERS, INTEGER, ClosingBracketError, parse_brackets
 from skoolkit.textutils import partition_unquoted
 from skoolkit.z80 import assemble, convert_case, get_size, split_operation
@@ -48,6 +51,7 @@ def get_address(operation):
 def set_bytes(snapshot, address, operation):
     data = assemble(operation, address)
     snapshot[address:address + len(data)] = data
+    return len(data)
 
 def parse_asm_block_directive(directive, stack):
     prefix = directive[:4]
@@ -178,6 +182,12 @@ def parse_comment_block(comments, ignores, mode):
     start_comment = join_comments(sections[3], split=True, html=mode.html)
     return start_comment, title, description, registers
 
+def _copy(obj):
+    # A faster equivalent of copy.copy() for entries and instructions
+    obj_copy = obj.__class__.__new__(obj.__class__)
+    obj_copy.__dict__ = obj.__dict__.copy()
+    return obj_copy
+
 def parse_instruction(line):
     ctl = line[0]
     addr_str = line[1:6]
@@ -232,16 +242,46 @@ class SkoolParser:
     :param min_address: Ignore addresses below this one.
     :param max_address: Ignore addresses above this one.
     :param snapshot: Base snapshot to use instead of an empty one.
+    :param stream: Whether to parse the skool file in streaming mode. In this
+                   mode, only an index of the entries and instructions in the
+                   memory map is kept after the first pass over the skool
+                   file, and each entry is parsed in full on a second pass
+                   when it is returned by
+                   :meth:`~skoolkit.skoolparser.SkoolParser.get_entries`.
+                   Streaming mode is not available when reading the skool
+                   file from standard input.
+    :param cache_dir: The directory in which to cache the parsed skool file
+                      (an empty string for the directory containing the skool
+                      file), or `None` to disable caching. The cache is not
+                      used in streaming mode or when reading the skool file
+                      from standard input.
+    :param variants: Whether to keep a mode-neutral copy of the parsed skool
+                     file, from which
+                     :meth:`~skoolkit.skoolparser.SkoolParser.get_variant` can
+                     make copies of this parser with a different case or
+                     number base without parsing the skool file again. This
+                     option is ignored in streaming mode.
     """
     def __init__(self, skoolfile, case=None, base=None, asm_mode=0, warnings=False, fix_mode=0, html=False,
-                 create_labels=False, asm_labels=True, min_address=0, max_address=65536, snapshot=None):
+                 create_labels=False, asm_labels=True, min_address=0, max_address=65536, snapshot=None,
+                 stream=False, cache_dir=None, variants=False):
         self.skoolfile = skoolfile
-        self.mode = Mode(case, base, asm_mode, warnings, fix_mode, html, create_labels, asm_labels)
+        self._mode_args = (case, base, asm_mode, warnings, fix_mode, html, create_labels, asm_labels)
         self.case = case
         self.base = base
+        self._stream = stream and isinstance(skoolfile, str) and skoolfile != '-'
+        self._variants = variants and not self._stream
+        if self._variants:
+            # Parse in a mode that leaves case and number bases unchanged, and
+            # convert them after taking the mode-neutral copy
+            self.mode = Mode(None, None, *self._mode_args[2:])
+        else:
+            self.mode = Mode(*self._mode_args)
+        self._address_range = (min_address, max_address)
 
         self.snapshot = snapshot or [0] * 65536  # 64K of Spectrum memory
         self._instructions = {}                  # address -> [Instructions]
+        self._index = {}                         # asm_id -> (starts, ends, [Instructions])
         self._entries = {}                       # address -> SkoolEntry
         self.memory_map = []                     # SkoolEntry instances
         self.base_address = 65536
@@ -255,9 +295,23 @@ class SkoolParser:
         self._replacements = []
         self.equs = []
         self._equ_values = {}
-
-        with open_file(skoolfile) as f:
-            self._parse_skool(f, min_address, max_address)
+        self._warnings = []
+        self._neutral = None
+
+        if self._stream or snapshot:
+            cache_dir = None
+        cache = SkoolCache(cache_dir, skoolfile, ('skoolparser.SkoolParser', self._mode_args, self._address_range, self._variants))
+        state = cache.load()
+        if state:
+            self.__dict__.update(state)
+            for s in self._warnings:
+                warn(s)
+        else:
+            with open_file(skoolfile) as f:
+                self._parse_skool(f, min_address, max_address)
+            state = self.__dict__.copy()
+            del state['skoolfile']
+            cache.save(state, SkoolEntry)
 
     def clone(self, skoolfile):
         return SkoolParser(
@@ -273,10 +327,46 @@ class SkoolParser:
             snapshot=self.snapshot[:]
         )
 
+    def get_variant(self, case=None, base=None):
+        """Return a copy of this parser that converts the skool file to a
+        different case and number base, without parsing it again. The copy
+        shares the header and properties of this parser, but has its own
+        entries, instructions and memory snapshot. This method is
+        available only if the parser was created with `variants=True`.
+
+        :param case: :data:`~skoolkit.skoolparser.CASE_UPPER` to force upper
+                     case, :data:`~skoolkit.skoolparser.CASE_LOWER` to force
+                     lower case, or `None` to leave case unchanged.
+        :param base: :data:`~skoolkit.skoolparser.BASE_10` to force decimal,
+                     :data:`~skoolkit.skoolparser.BASE_16` to force
+                     hexadecimal, or `None` to leave number bases unchanged.
+        """
+        if self._neutral is None:
+            raise SkoolParsingError('No mode-neutral copy of the skool file is available')
+        variant = copy.copy(self)
+        variant._mode_args = (case, base) + self._mode_args[2:]
+        variant.mode = Mode(*variant._mode_args)
+        variant.case = case
+        variant.base = base
+        variant._warnings = []
+        variant._convert_instructions()
+        variant._process_operations()
+        return variant
+
     def get_entry(self, address):
         """Return the routine or data block that starts at `address`."""
         return self._entries.get(address)
 
+    def get_entries(self):
+        """Return an iterator over the routines and data blocks in the memory
+        map. In streaming mode, the skool file is parsed again, and each entry
+        is fully populated (with comments and labelled operands) only when it
+        is reached.
+        """
+        if self._stream:
+            return self._stream_entries()
+        return iter(self.memory_map)
+
     def get_instruction(self, address, asm_id=''):
         """Return the instruction at `address`."""
         for instruction in self._instructions.get(address, ()):
@@ -289,6 +379,34 @@ class SkoolParser:
         if instruction:
             return instruction.container
 
+    def find_instruction(self, address, asm_id=''):
+        """Return the instruction whose address range contains `address`, or
+        `None` if there is no such instruction. An instruction's address range
+        extends up to the address of the next instruction in the same routine
+        or data block, or (for the last instruction in a routine or data
+        block) up to the address after its last byte.
+
+        :param address: The address.
+        :param asm_id: The ID of the disassembly (an empty string for the main
+                       disassembly).
+        """
+        starts, ends, instructions = self._index.get(asm_id.lower(), ((), (), ()))
+        i = bisect.bisect_right(starts, address) - 1
+        if i >= 0 and address < ends[i]:
+            return instructions[i]
+
+    def find_entry(self, address, asm_id=''):
+        """Return the routine or data block whose address range contains
+        `address`, or `None` if there is no such routine or data block.
+
+        :param address: The address.
+        :param asm_id: The ID of the disassembly (an empty string for the main
+                       disassembly).
+        """
+        instruction = self.find_instruction(address, asm_id)
+        if instruction:
+            return instruction.container
+
     def get_entry_point_refs(self, address):
         """Return the addresses of the routines and data blocks that contain
         instructions that refer to `address`.
@@ -311,9 +429,125 @@ class SkoolParser:
         return self.mode.convert_address_operand(operand)
 
     def _parse_skool(self, skoolfile, min_address, max_address):
+        address_comments = []
+        for map_entry in self._parse_entries(skoolfile, address_comments):
+            if self._stream:
+                # Keep only what is needed to look up entries, instructions
+                # and labels on the second pass
+                map_entry.strip()
+                address_comments[:] = []
+
+        if min_address > 0 or max_address < 65536:
+            self.memory_map = [e for e in self.memory_map if min_address <= e.address < max_address]
+            self._entries = {k: v for k, v in self._entries.items() if min_address <= k < max_address}
+            if self._entries:
+                self.base_address = min(self._entries)
+                last_entry = self._entries[max(self._entries)]
+                last_entry.instructions = [i for i in last_entry.instructions if i.address is None or i.address < max_address]
+            else:
+                self.base_address = max_address
+            self._instructions = {k: v for k, v in self._instructions.items() if self.base_address <= k < max_address}
+            address_comments = [c for c in address_comments if c[0] is None or c[0].address is None or self.base_address <= c[0].address < max_address]
+
+        self._build_index()
+        if self.memory_map:
+            self.end_address = self._index[''][1][-1]
+
+        # Do some post-processing
+        parse_address_comments(address_comments, self.mode.html)
+        self.make_replacements(self)
+        if self._variants:
+            self._neutral = (self.memory_map, self._entries, self._instructions, self._index, self.snapshot)
+            self.mode = Mode(*self._mode_args)
+            self._convert_instructions()
+        self._process_operations()
+
+    def _convert_instructions(self):
+        # Copy the entries and instructions of the mode-neutral parse (sharing
+        # their comments), and apply the case and number base of the current
+        # mode to the register names, addresses and operations in the copies
+        memory_map, entries, instructions, index, snapshot = self._neutral
+        copies = {}
+        operations = {}
+        containers = {id(i[0].container): i[0].container for i in instructions.values()}
+        containers.update((id(e), e) for e in memory_map)
+        for entry in containers.values():
+            entry_copy = copies[id(entry)] = _copy(entry)
+            entry_copy.instructions = []
+            entry_copy.referrers = []
+            for instruction in entry.instructions:
+                instruction_copy = copies[id(instruction)] = _copy(instruction)
+                instruction_copy.referrers = []
+                instruction_copy.convert(self.mode, operations)
+                entry_copy.add_instruction(instruction_copy)
+            if entry_copy.addr_str is not None:
+                entry_copy.addr_str = entry_copy.instructions[0].addr_str
+            if entry.registers and (self.mode.lower or self.mode.upper):
+                entry_copy.registers = [Register(r.prefix, self.mode.apply_case(r.name, '')[0], r.contents) for r in entry.registers]
+        self.memory_map = [copies[id(e)] for e in memory_map]
+        self._entries = {a: copies[id(e)] for a, e in entries.items()}
+        self._instructions = {a: [copies[id(i)] for i in v] for a, v in instructions.items()}
+        self._index = {k: (starts, ends, [copies[id(i)] for i in v]) for k, (starts, ends, v) in index.items()}
+        self.snapshot = snapshot[:]
+
+    def _process_operations(self):
+        self._calculate_references()
+        if self.mode.asm_labels:
+            self._generate_labels()
+        if self.mode.html:
+            self._calculate_entry_sizes()
+            self._escape_instructions()
+        elif not self._stream:
+            self._substitute_labels()
+
+    def _stream_entries(self):
+        # Parse the skool file again, using a copy of this parser with fresh
+        # parsing state, and complete each entry as it is read
+        reader = copy.copy(self)
+        reader.mode = Mode(*self._mode_args)
+        reader.header = []
+        reader.stack = []
+        reader.comments = []
+        reader.ignores = []
+        reader.properties = {}
+        reader._replacements = []
+        reader.equs = []
+        reader._equ_values = {}
+        min_address, max_address = self._address_range
+        stubs = iter(self.memory_map)
+        stub = next(stubs, None)
+        address_comments = []
+        with open_file(self.skoolfile) as f:
+            for entry in reader._parse_entries(f, address_comments, False):
+                if stub and not entry.is_remote() and entry.address == stub.address and min_address <= entry.address < max_address:
+                    self._complete_entry(entry, stub, address_comments)
+                    yield entry
+                    stub = next(stubs, None)
+                address_comments[:] = []
+
+    def _complete_entry(self, entry, stub, address_comments):
+        if len(entry.instructions) > len(stub.instructions):
+            max_address = self._address_range[1]
+            entry.instructions = [i for i in entry.instructions if i.address is None or i.address < max_address]
+        parse_address_comments(address_comments, self.mode.html)
+        self.make_replacements(entry)
+        entry.referrers = stub.referrers
+        for instruction, stub_instruction in zip(entry.instructions, stub.instructions):
+            instruction.asm_label = stub_instruction.asm_label
+            instruction.reference = stub_instruction.reference
+            instruction.referrers = stub_instruction.referrers
+        for instruction in entry.instructions:
+            if self.mode.html:
+                instruction.html_escape()
+            elif instruction.sub or not instruction.keep:
+                self._label_operand(instruction)
+
+    def _parse_entries(self, skoolfile, address_comments, first_pass=True):
+        # Parse the skool file and yield each entry (including remote entries)
+        # when it is complete; on the first pass, also record the entries and
+        # instructions in the memory map and set bytes in the snapshot
         map_entry = None
         instruction = None
-        address_comments = []
         for line in skoolfile:
             if line.startswith(';'):
                 if self.mode.started and self.mode.include:
@@ -341,6 +575,8 @@ class SkoolParser:
                         self.header += self.comments
                 self.comments[:] = []
                 self.ignores[:] = []
+                if map_entry:
+                    yield map_entry
                 map_entry = None
                 continue
 
@@ -354,6 +590,8 @@ class SkoolParser:
             address = instruction.address
             addr_str = instruction.addr_str
             ctl = instruction.ctl
+            if map_entry and ctl in DIRECTIVES + 'dr':
+                yield map_entry
             if ctl in DIRECTIVES:
                 if address is None:
                     raise SkoolParsingError("Invalid address: '{}'".format(addr_str))
@@ -362,10 +600,11 @@ class SkoolParser:
                 instruction.mid_block_comment = start_comment
                 map_entry.ignoreua.update(self.mode.entry_ignoreua)
                 self.mode.reset_entry_ignoreua()
-                self._entries[address] = map_entry
-                self.memory_map.append(map_entry)
+                if first_pass:
+                    self._entries[address] = map_entry
+                    self.memory_map.append(map_entry)
+                    self.base_address = min((address, self.base_address))
                 self.comments[:] = []
-                self.base_address = min((address, self.base_address))
             elif ctl == 'd':
                 # This is a data definition entry
                 map_entry = None
@@ -375,7 +614,7 @@ class SkoolParser:
 
             if map_entry:
                 address_comments.append([instruction, address_comment])
-                if address is not None:
+                if first_pass and address is not None:
                     self._instructions.setdefault(address, []).append(instruction)
                 map_entry.add_instruction(instruction)
                 if self.comments:
@@ -387,41 +626,14 @@ class SkoolParser:
             self.ignores[:] = []
 
             # Set bytes in the snapshot if the instruction is DEF{B,M,S,W}
-            if address is not None:
+            if first_pass and address is not None:
                 operation = instruction.operation
                 if self.mode.assemble or operation.upper().startswith(('DEFB ', 'DEFM ', 'DEFS ', 'DEFW ')):
                     set_bytes(self.snapshot, address, operation)
         if self.comments and map_entry:
             self._add_end_comment(map_entry)
-
-        if min_address > 0 or max_address < 65536:
-            self.memory_map = [e for e in self.memory_map if min_address <= e.address < max_address]
-            self._entries = {k: v for k, v in self._entries.items() if min_address <= k < max_address}
-            if self._entries:
-                self.base_address = min(self._entries)
-                last_entry = self._entries[max(self._entries)]
-                last_entry.instructions = [i for i in last_entry.instructions if i.address is None or i.address < max_address]
-            else:
-                self.base_address = max_address
-            self._instructions = {k: v for k, v in self._instructions.items() if self.base_address <= k < max_address}
-            address_comments = [c for c in address_comments if c[0] is None or c[0].address is None or self.base_address <= c[0].address < max_address]
-
-        if self.memory_map:
-            end_address = max([i.address for e in self.memory_map for i in e.instructions if i.address is not None])
-            last_instruction = self.get_instruction(end_address)
-            self.end_address = end_address + (get_size(last_instruction.operation, end_address) or 1)
-
-        # Do some post-processing
-        parse_address_comments(address_comments, self.mode.html)
-        self.make_replacements(self)
-        self._calculate_references()
-        if self.mode.asm_labels:
-            self._generate_labels()
-        if self.mode.html:
-            self._calculate_entry_sizes()
-            self._escape_instructions()
-        else:
-            self._substitute_labels()
+        if map_entry:
+            yield map_entry
 
     def _add_replacement(self, s):
         try:
@@ -561,6 +773,26 @@ class SkoolParser:
                     return True
         return False
 
+    def _build_index(self):
+        # Build a sorted list of the address ranges covered by the instructions
+        # in each disassembly (main or remote), for looking up the instruction
+        # or entry that contains a given address by bisection
+        instructions = {}
+        for address in sorted(self._instructions):
+            for instruction in self._instructions[address]:
+                asm_id = instruction.container.asm_id.lower()
+                asm_instructions = instructions.setdefault(asm_id, [])
+                if not asm_instructions or asm_instructions[-1].address < address:
+                    asm_instructions.append(instruction)
+        self._index = {}
+        for asm_id, asm_instructions in instructions.items():
+            starts = [i.address for i in asm_instructions]
+            ends = starts[1:] + [None]
+            for j, instruction in enumerate(asm_instructions):
+                if ends[j] is None or asm_instructions[j + 1].container is not instruction.container:
+                    ends[j] = instruction.address + (get_size(instruction.operation, instruction.address) or 1)
+            self._index[asm_id] = (starts, ends, asm_instructions)
+
     def _calculate_references(self):
         # Parse operations for routine/data addresses
         for entry in self.memory_map:
@@ -592,6 +824,7 @@ class SkoolParser:
     def warn(self, s):
         if self.mode.warn:
             warn(s)
+            self._warnings.append(s)
 
     def _substitute_labels(self):
         for entry in self.memory_map:
@@ -864,12 +1097,7 @@ class Mode:
 class Instruction:
     def __init__(self, ctl, addr_str, operation):
         self.ctl = ctl
-        if addr_str[0].isdigit():
-            self.addr_str = addr_str
-            self.addr_base = BASE_10
-        else:
-            self.addr_str = addr_str[1:]
-            self.addr_base = BASE_16
+        self._set_addr_str(addr_str)
         self.address = parse_int(addr_str)
         self.operation = operation
         self.container = None
@@ -892,6 +1120,28 @@ class Instruction:
         self.ignoreua = False
         self.ignoremrcua = False
 
+    def _set_addr_str(self, addr_str):
+        if addr_str[0].isdigit():
+            self.addr_str = addr_str
+            self.addr_base = BASE_10
+        else:
+            self.addr_str = addr_str[1:]
+            self.addr_base = BASE_16
+
+    def convert(self, mode, operations):
+        if self.addr_base == BASE_10:
+            addr_str = self.addr_str
+        else:
+            addr_str = '$' + self.addr_str
+        addr_str = mode.apply_base(mode.apply_case(addr_str, '')[0], '')[0]
+        self._set_addr_str(addr_str)
+        operation = operations.get(self.operation)
+        if operation is None:
+            operation = operations[self.operation] = mode.apply_base('', mode.apply_case('', self.operation)[1])[1]
+        self.operation = operation
+        if self.sub is not None:
+            self.sub = operation
+
     def set_comment(self, rowspan, text):
         self.comment = Comment(rowspan, text)
 
@@ -968,6 +1218,15 @@ class SkoolEntry:
         instruction.container = self
         self.instructions.append(instruction)
 
+    def strip(self):
+        # Discard everything that is not needed to look up this entry, its
+        # instructions and their labels
+        self.details = ()
+        self.registers = []
+        self.end_comment = ()
+        for instruction in self.instructions:
+            instruction.mid_block_comment = None
+
     def add_referrer(self, routine):
         if routine not in self.referrers:
             self.referrers.append(routine)
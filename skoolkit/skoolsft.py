@@ -15,6 +15,7 @@
 # SkoolKit. If not, see <http://www.gnu.org/licenses/>.
 
 from skoolkit import SkoolParsingError, write_line, get_int_param, get_address_format, open_file
+from skoolkit.skoolcache import SkoolCache
 from skoolkit.skoolctl import (get_instruction_ctl, get_lengths, get_operand_bases,
                                get_defb_length, get_defs_length, get_defw_length)
 from skoolkit.skoolparser import parse_asm_block_directive, DIRECTIVES
@@ -103,9 +104,11 @@ class ControlLine:
         return False
 
 class SftWriter:
-    def __init__(self, skoolfile, write_hex=0, preserve_base=False):
+    def __init__(self, skoolfile, write_hex=0, preserve_base=False, cache_dir=None):
         self.skoolfile = skoolfile
+        self.write_hex = write_hex
         self.preserve_base = preserve_base
+        self.cache_dir = cache_dir
         self.stack = []
         self.verbatim = False
         self.address_fmt = get_address_format(write_hex, write_hex < 0)
@@ -221,5 +224,11 @@ class SftWriter:
         return compressed
 
     def write(self, min_address=0, max_address=65536):
-        for line in self._parse_skool(min_address, max_address):
+        cache = SkoolCache(self.cache_dir, self.skoolfile,
+                           ('SftWriter', self.write_hex, self.preserve_base, min_address, max_address))
+        lines = cache.load()
+        if lines is None:
+            lines = self._parse_skool(min_address, max_address)
+            cache.save(lines)
+        for line in lines:
             write_line(str(line))
@@ -17,21 +17,50 @@
 import argparse
 from os.path import isfile
 
-from skoolkit import info, read_bin_file, VERSION
+from skoolkit import SkoolKitError, get_int_param, info, read_bin_file, VERSION
 from skoolkit.ctlparser import CtlParser
 from skoolkit.sftparser import SftParser
-from skoolkit.snapshot import get_snapshot
-from skoolkit.snaskool import SkoolWriter, generate_ctls, write_ctl
+from skoolkit.simulator import Simulator
+from skoolkit.snapshot import get_registers, get_snapshot
+from skoolkit.snaskool import DisassemblyCache, SkoolWriter, generate_ctls, write_ctl
 
 START = 16384
 END = 65536
 DEFB_SIZE = 8
 DEFM_SIZE = 66
+TRACE_MAX_OPERATIONS = 10000000
 
 def find(fname):
     if isfile(fname):
         return fname
 
+def trace(snafile, snapshot, spec):
+    try:
+        params = [get_int_param(p) if p else None for p in spec.split(',', 2)]
+    except ValueError:
+        raise SkoolKitError('Invalid trace specification: {}'.format(spec))
+    start, stop, max_operations = params + [None] * (3 - len(params))
+    if snafile[-4:].lower() in ('.sna', '.szx', '.z80'):
+        registers = get_registers(snafile)
+    elif start is None:
+        raise SkoolKitError('A start address is required to trace {}'.format(snafile))
+    else:
+        registers = None
+    memory = bytearray(snapshot[:65536])
+    if not any(memory[:16384]):
+        # Without a ROM, make every ROM routine return immediately, and let
+        # the IM 1 interrupt routine re-enable interrupts
+        memory[:16384] = b'\xc9' * 16384
+        memory[56] = 0xFB
+    simulator = Simulator(memory, registers)
+    if start is None:
+        start = simulator.pc
+    if max_operations is None:
+        max_operations = TRACE_MAX_OPERATIONS
+    operations = simulator.run(start, stop, max_operations)
+    info('Traced {} instructions from {}'.format(operations, start))
+    return simulator.code_map
+
 def run(snafile, options):
     # Read the snapshot file
     if snafile[-4:].lower() in ('.sna', '.szx', '.z80'):
@@ -61,7 +90,10 @@ def run(snafile, options):
 
     if options.genctlfile:
         # Generate a control file
-        ctls = generate_ctls(snapshot, start, end, options.code_map)
+        code_map = options.code_map
+        if options.trace:
+            code_map = trace(snafile, snapshot, options.trace)
+        ctls = generate_ctls(snapshot, start, end, code_map)
         write_ctl(options.genctlfile, ctls, options.ctl_hex)
         ctl_parser = CtlParser(ctls)
     elif options.ctlfile:
@@ -71,8 +103,14 @@ def run(snafile, options):
         ctl_parser.parse_ctl(options.ctlfile, options.start, options.end)
     else:
         ctl_parser = CtlParser({start: 'c', end: 'i'})
-    writer = SkoolWriter(snapshot, ctl_parser, options)
+    if options.cache:
+        cache = DisassemblyCache(options.cache)
+    else:
+        cache = None
+    writer = SkoolWriter(snapshot, ctl_parser, options, cache)
     writer.write_skool(options.write_refs, options.text)
+    if cache:
+        cache.save()
 
 def main(args):
     parser = argparse.ArgumentParser(
@@ -85,6 +123,8 @@ def main(args):
     group = parser.add_argument_group('Options')
     group.add_argument('-c', '--ctl', dest='ctlfile', metavar='FILE',
                        help="Use FILE as the control file (may be '-' for standard input)")
+    group.add_argument('-C', '--cache', dest='cache', metavar='FILE',
+                       help='Reuse the disassembly of unchanged entries cached in FILE, and update FILE')
     group.add_argument('-e', '--end', dest='end', metavar='ADDR', type=int, default=END,
                        help='Stop disassembling at this address (default={})'.format(END))
     group.add_argument('-g', '--generate-ctl', dest='genctlfile', metavar='FILE',
@@ -123,6 +163,10 @@ def main(args):
                        help='Show SkoolKit version number and exit')
     group.add_argument('-w', '--line-width', dest='line_width', metavar='W', type=int, default=79,
                        help='Set the maximum line width of the skool file (default: 79)')
+    group.add_argument('-x', '--trace', dest='trace', metavar='START[,STOP][,MAXOPS]',
+                       help="Run the code from START (default: the snapshot's PC) until it reaches STOP or has executed MAXOPS "
+                            "instructions (default: {}), and use the trace as a code execution map when generating a "
+                            "control file".format(TRACE_MAX_OPERATIONS))
     group.add_argument('-z', '--defb-zfill', dest='zfill', action='store_true',
                        help='Pad decimal values in DEFB statements with leading zeroes')
 
@@ -130,6 +174,8 @@ def main(args):
     snafile = namespace.snafile
     if unknown_args or snafile is None:
         parser.exit(2, parser.format_help())
+    if namespace.trace and not namespace.genctlfile:
+        raise SkoolKitError('--trace requires --generate-ctl')
     if snafile[-4:].lower() in ('.bin', '.sna', '.szx', '.z80'):
         prefix = snafile[:-4]
     else:
@@ -15,10 +15,20 @@
 # SkoolKit. If not, see <http://www.gnu.org/licenses/>.
 
 import argparse
+import glob
+import json
+import multiprocessing
+import os
+from builtins import open
 
 from skoolkit import SkoolKitError, get_dword, get_int_param, get_word, read_bin_file, VERSION
 from skoolkit.basic import BasicLister, VariableLister, get_char
-from skoolkit.snapshot import get_snapshot
+from skoolkit.graphicscan import contact_sheet, scan_graphics
+from skoolkit.image import ImageWriter, GIF_ENABLE_ANIMATION, PNG_ENABLE_ANIMATION
+from skoolkit.search import find_patterns
+from skoolkit.snapshot import read_snapshot
+
+SNAPSHOT_TYPES = ('.sna', '.szx', '.z80')
 
 class Registers:
     reg_map = {
@@ -360,7 +370,16 @@ def _get_address_ranges(specs, step=1):
         addr_ranges.append(values + [values[0], step][len(values) - 1:])
     return addr_ranges
 
-def _find(snapshot, byte_seq, base_addr=16384):
+def _parse_steps(steps):
+    try:
+        if '-' in steps:
+            limits = [get_int_param(n) for n in steps.split('-', 1)]
+            return range(limits[0], limits[1] + 1)
+        return [get_int_param(steps)]
+    except ValueError:
+        raise SkoolKitError('Invalid distance: {}'.format(steps))
+
+def _parse_find(byte_seq):
     steps = '1'
     if '-' in byte_seq:
         byte_seq, steps = byte_seq.split('-', 1)
@@ -368,21 +387,9 @@ def _find(snapshot, byte_seq, base_addr=16384):
         byte_values = [get_int_param(i) for i in byte_seq.split(',')]
     except ValueError:
         raise SkoolKitError('Invalid byte sequence: {}'.format(byte_seq))
-    try:
-        if '-' in steps:
-            limits = [get_int_param(n) for n in steps.split('-', 1)]
-            steps = range(limits[0], limits[1] + 1)
-        else:
-            steps = [get_int_param(steps)]
-    except ValueError:
-        raise SkoolKitError('Invalid distance: {}'.format(steps))
-    for step in steps:
-        offset = step * len(byte_values)
-        for a in range(base_addr, 65537 - offset):
-            if snapshot[a:a + offset:step] == byte_values:
-                print("{0}-{1}-{2} {0:04X}-{1:04X}-{2:X}: {3}".format(a, a + offset - step, step, byte_seq))
+    return byte_seq, byte_values, _parse_steps(steps)
 
-def _find_tile(snapshot, coords):
+def _parse_tile(coords):
     steps = '1'
     if '-' in coords:
         coords, steps = coords.split('-', 1)
@@ -392,18 +399,67 @@ def _find_tile(snapshot, coords):
             raise ValueError
     except ValueError:
         raise SkoolKitError('Invalid tile coordinates: {}'.format(coords))
-    df_addr = 16384 + 2048 * (y // 8) + 32 * (y & 7) + x
-    byte_seq = snapshot[df_addr:df_addr + 2048:256]
-    for b in byte_seq:
+    return 16384 + 2048 * (y // 8) + 32 * (y & 7) + x, _parse_steps(steps)
+
+def _text_patterns(texts):
+    return [(text, [ord(c) for c in text], (1,)) for text in texts]
+
+def _search(memory, patterns, base_addr=16384):
+    # Search for all the patterns that share a range of distances in a single
+    # pass, and yield the matches in order of distance, address and pattern
+    groups = {}
+    for i, (label, byte_values, steps) in enumerate(patterns):
+        groups.setdefault(tuple(steps), []).append(i)
+    matches = []
+    for steps, indexes in groups.items():
+        byte_seqs = [patterns[i][1] for i in indexes]
+        for a, step, j in find_patterns(memory, byte_seqs, steps, base_addr):
+            matches.append((step, a, indexes[j]))
+    for step, a, i in sorted(matches):
+        label, byte_values = patterns[i][:2]
+        yield a, a + step * (len(byte_values) - 1), step, label
+
+def _get_tile_pattern(memory, df_addr, steps):
+    byte_seq = memory[df_addr:df_addr + 2048:256]
+    return (','.join([str(b) for b in byte_seq]), byte_seq, steps)
+
+def _find(memory, specs):
+    for a, end, step, byte_seq in _search(memory, [_parse_find(spec) for spec in specs]):
+        print("{0}-{1}-{2} {0:04X}-{1:04X}-{2:X}: {3}".format(a, end, step, byte_seq))
+
+def _find_tile(memory, coords):
+    pattern = _get_tile_pattern(memory, *_parse_tile(coords))
+    for b in pattern[1]:
         print('|{:08b}|'.format(b).replace('0', ' ').replace('1', '*'))
-    _find(snapshot, '{}-{}'.format(','.join([str(b) for b in byte_seq]), steps), 23296)
-
-def _find_text(snapshot, text):
-    size = len(text)
-    byte_values = [ord(c) for c in text]
-    for a in range(16384, 65536 - size + 1):
-        if snapshot[a:a + size] == byte_values:
-            print("{0}-{1} {0:04X}-{1:04X}: {2}".format(a, a + size - 1, text))
+    for a, end, step, tile in _search(memory, [pattern], 23296):
+        print("{0}-{1}-{2} {0:04X}-{1:04X}-{2:X}: {3}".format(a, end, step, tile))
+
+def _find_text(memory, texts):
+    for a, end, step, text in _search(memory, _text_patterns(texts)):
+        print("{0}-{1} {0:04X}-{1:04X}: {2}".format(a, end, text))
+
+def _scan_graphics(snapshot, limit):
+    # Scan the RAM at 16384-65535 and then (in a 128K snapshot) each RAM bank
+    # that is not mapped there, as if it were paged in at 49152
+    found = [(-1, c) for c in scan_graphics(snapshot.tobytes(), 16384, limit=limit)]
+    if snapshot.is128:
+        for bank in range(8):
+            if bank not in snapshot.slots:
+                found.extend((bank, c) for c in scan_graphics(bytes(snapshot.bank(bank)), limit=limit, org=49152))
+    found.sort(key=lambda f: (-f[1].score, f[0], f[1].address))
+    return [(None if bank < 0 else bank, c) for bank, c in found[:limit]]
+
+def _find_graphics(snapshot, limit, sheet):
+    found = _scan_graphics(snapshot, limit)
+    for bank, c in found:
+        suffix = '' if bank is None else ' (bank {})'.format(bank)
+        end = c.address + c.length - 1
+        print("{0}-{1} {0:04X}-{1:04X}: {2} {3} {4}{5}".format(c.address, end, c.kind, c.score, c.macro, suffix))
+    if sheet:
+        image_writer = ImageWriter(options={GIF_ENABLE_ANIMATION: 0, PNG_ENABLE_ANIMATION: 0})
+        image_format = 'gif' if sheet.lower()[-4:] == '.gif' else 'png'
+        with open(sheet, 'wb') as f:
+            image_writer.write_image([contact_sheet([c for bank, c in found])], f, image_format)
 
 def _peek(snapshot, specs):
     for addr1, addr2, step in _get_address_ranges(specs):
@@ -418,22 +474,85 @@ def _word(snapshot, specs):
             value = snapshot[a] + 256 * snapshot[a + 1]
             print('{0:>5} {0:04X}: {1:>5}  {1:04X}'.format(a, value))
 
+###############################################################################
+
+def _get_snapshot_files(paths):
+    infiles = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, subdirs, files in os.walk(path):
+                subdirs.sort()
+                infiles.extend(os.path.join(root, f) for f in sorted(files) if f[-4:].lower() in SNAPSHOT_TYPES)
+        elif any(c in path for c in '*?['):
+            infiles.extend(f for f in sorted(glob.glob(path)) if f[-4:].lower() in SNAPSHOT_TYPES)
+        else:
+            infiles.append(path)
+    return infiles
+
+def _search_file(infile, search, spec):
+    # Run a search on one snapshot (in a worker process if there is a pool)
+    # and return the matches as JSON lines
+    try:
+        memory = read_snapshot(infile).tobytes()
+    except SkoolKitError as e:
+        return [json.dumps({'file': infile, 'error': str(e)}, sort_keys=True)]
+    except OSError as e:
+        error = '{}: {}'.format(infile, e.strerror or e)
+        return [json.dumps({'file': infile, 'error': error}, sort_keys=True)]
+    if search == 'tile':
+        matches = _search(memory, [_get_tile_pattern(memory, *spec)], 23296)
+    else:
+        matches = _search(memory, spec)
+    lines = []
+    for a, end, step, match in matches:
+        result = {'file': infile, 'address': a, 'end': end, 'step': step, 'match': match}
+        lines.append(json.dumps(result, sort_keys=True))
+    return lines
+
+def _run_batch(paths, namespace):
+    if namespace.find:
+        search, spec = 'find', [_parse_find(f) for f in namespace.find]
+    elif namespace.tile:
+        search, spec = 'tile', _parse_tile(namespace.tile)
+    elif namespace.text:
+        search, spec = 'text', _text_patterns(namespace.text)
+    else:
+        raise SkoolKitError('Batch mode requires --find, --find-text or --find-tile')
+    infiles = _get_snapshot_files(paths)
+    tasks = [(infile, search, spec) for infile in infiles]
+    if namespace.jobs > 1 and len(tasks) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        # Each worker process is started once and handed snapshots in chunks
+        with multiprocessing.get_context('fork').Pool(namespace.jobs) as pool:
+            chunksize = max(1, len(tasks) // (namespace.jobs * 4))
+            results = pool.starmap(_search_file, tasks, chunksize)
+    else:
+        results = [_search_file(*task) for task in tasks]
+    for lines in results:
+        for line in lines:
+            print(line)
+
 def main(args):
     parser = argparse.ArgumentParser(
-        usage='snapinfo.py [options] file',
-        description="Analyse an SNA, SZX or Z80 snapshot.",
+        usage='snapinfo.py [options] file [file...]',
+        description="Analyse an SNA, SZX or Z80 snapshot, or search a batch of snapshots.",
         add_help=False
     )
-    parser.add_argument('infile', help=argparse.SUPPRESS, nargs='?')
+    parser.add_argument('infiles', help=argparse.SUPPRESS, nargs='*')
     group = parser.add_argument_group('Options')
     group.add_argument('-b', '--basic', action='store_true',
                        help='List the BASIC program')
-    group.add_argument('-f', '--find', metavar='A[,B...[-M[-N]]]',
-                       help='Search for the byte sequence A,B... with distance ranging from M to N (default=1) between bytes')
+    group.add_argument('-c', '--contact-sheet', dest='sheet', metavar='FILE',
+                       help='Write the graphic data found by --find-graphics to a PNG or GIF file')
+    group.add_argument('-f', '--find', metavar='A[,B...[-M[-N]]]', action='append',
+                       help='Search for the byte sequence A,B... with distance ranging from M to N (default=1) between bytes; this option may be used multiple times')
+    group.add_argument('-g', '--find-graphics', dest='graphics', metavar='N', type=int,
+                       help='Search for data that looks like sprites, UDGs or fonts, and list the N most likely candidates')
+    group.add_argument('-J', '--jobs', dest='jobs', metavar='N', type=int, default=1,
+                       help='Search a batch of snapshots using N worker processes (default: 1)')
     group.add_argument('-p', '--peek', metavar='A[-B[-C]]', action='append',
                        help='Show the contents of addresses A TO B STEP C; this option may be used multiple times')
-    group.add_argument('-t', '--find-text', dest='text', metavar='TEXT',
-                       help='Search for a text string')
+    group.add_argument('-t', '--find-text', dest='text', metavar='TEXT', action='append',
+                       help='Search for a text string; this option may be used multiple times')
     group.add_argument('-T', '--find-tile', dest='tile', metavar='X,Y[-M[-N]]',
                        help='Search for the graphic data of the tile at (X,Y) with distance ranging from M to N (default=1) between bytes')
     group.add_argument('-v', '--variables', action='store_true',
@@ -443,21 +562,28 @@ def main(args):
     group.add_argument('-w', '--word', metavar='A[-B[-C]]', action='append',
                        help='Show the words at addresses A TO B STEP C; this option may be used multiple times')
     namespace, unknown_args = parser.parse_known_args(args)
-    if unknown_args or namespace.infile is None:
+    if unknown_args or not namespace.infiles:
         parser.exit(2, parser.format_help())
-    infile = namespace.infile
+    infile = namespace.infiles[0]
+    if len(namespace.infiles) > 1 or os.path.isdir(infile) or any(c in infile for c in '*?['):
+        _run_batch(namespace.infiles, namespace)
+        return
     snapshot_type = infile[-4:].lower()
-    if snapshot_type not in ('.sna', '.szx', '.z80'):
+    if snapshot_type not in SNAPSHOT_TYPES:
         raise SkoolKitError('Unrecognised snapshot type')
 
-    if any((namespace.find, namespace.tile, namespace.text, namespace.peek, namespace.word, namespace.basic, namespace.variables)):
-        snapshot = get_snapshot(infile)
+    if any((namespace.find, namespace.tile, namespace.text)):
+        memory = read_snapshot(infile).tobytes()
         if namespace.find:
-            _find(snapshot, namespace.find)
+            _find(memory, namespace.find)
         elif namespace.tile:
-            _find_tile(snapshot, namespace.tile)
-        elif namespace.text:
-            _find_text(snapshot, namespace.text)
+            _find_tile(memory, namespace.tile)
+        else:
+            _find_text(memory, namespace.text)
+    elif any((namespace.graphics, namespace.peek, namespace.word, namespace.basic, namespace.variables)):
+        snapshot = read_snapshot(infile)
+        if namespace.graphics:
+            _find_graphics(snapshot, namespace.graphics, namespace.sheet)
         elif namespace.peek:
             _peek(snapshot, namespace.peek)
         elif namespace.word:
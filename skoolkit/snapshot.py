@@ -14,7 +14,9 @@
 # You should have received a copy of the GNU General Public License along with
 # SkoolKit. If not, see <http://www.gnu.org/licenses/>.
 
+import mmap
 import zlib
+from functools import partial
 
 from skoolkit import SkoolKitError, get_int_param, read_bin_file
 
@@ -51,21 +53,88 @@ Z80_REGISTERS = {
 }
 
 def get_snapshot(fname, page=None):
+    return read_snapshot(fname, page)[:]
+
+def read_snapshot(fname, page=None):
+    """Return a :class:`Snapshot` of the 64K memory in a SNA, SZX or Z80 file.
+    The RAM banks of a compressed snapshot are decompressed only when they are
+    first accessed."""
+    ext = fname[-4:].lower()
+    if ext not in ('.sna', '.z80', '.szx'):
+        raise SnapshotError("{0}: Unknown file type '{1}'".format(fname, ext[1:]))
+    try:
+        if ext == '.sna':
+            banks, slots, is128 = _read_sna(_map_file(fname), page)
+        elif ext == '.z80':
+            banks, slots, is128 = _read_z80(read_bin_file(fname), page)
+        else:
+            banks, slots, is128 = _read_szx(read_bin_file(fname), page)
+    except IndexError:
+        # A header or block header runs past the end of the file
+        raise SnapshotError('{}: file is truncated'.format(fname))
+    return Snapshot(banks, slots, is128)
+
+def get_registers(fname):
+    """Return a dictionary of the register values (and the interrupt state)
+    stored in a SNA, SZX or Z80 snapshot. The keys are 'a', 'f', 'bc', 'de',
+    'hl', 'ix', 'iy', 'sp', 'pc', 'i', 'r', '^a', '^f', '^bc', '^de', '^hl',
+    'iff' and 'im'."""
     ext = fname[-4:].lower()
     if ext not in ('.sna', '.z80', '.szx'):
         raise SnapshotError("{0}: Unknown file type '{1}'".format(fname, ext[1:]))
     data = read_bin_file(fname)
     if ext == '.sna':
-        ram = _read_sna(data, page)
-    elif ext == '.z80':
-        ram = _read_z80(data, page)
-    elif ext == '.szx':
-        ram = _read_szx(data, page)
-    if len(ram) != 49152:
-        raise SnapshotError("RAM size is {0}".format(len(ram)))
-    mem = [0] * 16384
-    mem.extend(ram)
-    return mem
+        return _get_sna_registers(data)
+    if ext == '.z80':
+        return _get_z80_registers(data)
+    return _get_szx_registers(data)
+
+def _get_registers(data, offsets):
+    registers = {}
+    for reg, index in offsets.items():
+        if reg in ('bc', 'de', 'hl', 'ix', 'iy', 'sp', 'pc', '^bc', '^de', '^hl'):
+            registers[reg] = data[index] + 256 * data[index + 1]
+        else:
+            registers[reg] = data[index]
+    return registers
+
+def _get_sna_registers(data):
+    registers = _get_registers(data, {
+        'i': 0, '^hl': 1, '^de': 3, '^bc': 5, '^f': 7, '^a': 8, 'hl': 9, 'de': 11, 'bc': 13,
+        'iy': 15, 'ix': 17, 'iff': 19, 'r': 20, 'f': 21, 'a': 22, 'sp': 23, 'im': 25
+    })
+    registers['iff'] = (registers['iff'] >> 2) & 1
+    sp = registers['sp']
+    if len(data) > 49179:
+        registers['pc'] = data[49179] + 256 * data[49180]
+    elif 16384 <= sp < 65535:
+        # The program counter is on the stack in a 48K SNA file
+        registers['pc'] = data[sp - 16357] + 256 * data[sp - 16356]
+        registers['sp'] = (sp + 2) & 65535
+    else:
+        registers['pc'] = 0
+    return registers
+
+def _get_z80_registers(data):
+    registers = {}
+    for reg in ('a', 'f', 'bc', 'de', 'hl', 'sp', 'i', 'r', '^a', '^f', '^bc', '^de', '^hl', 'ix', 'iy', 'pc'):
+        registers[reg] = Z80_REGISTERS[reg]
+    registers = _get_registers(data, registers)
+    if registers['pc'] == 0:
+        registers['pc'] = data[32] + 256 * data[33]
+    registers['r'] = (registers['r'] & 127) + 128 * (data[12] & 1)
+    registers['iff'] = data[27] & 1
+    registers['im'] = data[29] & 3
+    return registers
+
+def _get_szx_registers(data):
+    z80r = _get_zxstblock(data, 8, 'Z80R')[1]
+    if z80r is None:
+        raise SnapshotError("Z80REGS (Z80R) block not found")
+    return _get_registers(z80r, {
+        'f': 0, 'a': 1, 'bc': 2, 'de': 4, 'hl': 6, '^f': 8, '^a': 9, '^bc': 10, '^de': 12, '^hl': 14,
+        'ix': 16, 'iy': 18, 'sp': 20, 'pc': 22, 'i': 24, 'r': 25, 'iff': 26, 'im': 28
+    })
 
 def set_z80_registers(z80, *specs):
     for spec in specs:
@@ -139,20 +208,36 @@ def make_z80_ram_block(data, page):
     length = len(block)
     return [length % 256, length // 256, page] + block
 
+def _map_file(fname):
+    # Map the file into memory so that its RAM banks can be viewed in place
+    try:
+        with open(fname, 'rb') as f:
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except (ValueError, OSError):
+        # Empty files (and files on some filesystems) cannot be mapped
+        return memoryview(read_bin_file(fname))
+
 def _read_sna(data, page=None):
-    if len(data) <= 49179 or page is None:
-        return data[27:49179]
+    if len(data) <= 49179:
+        ram = data[27:49179]
+        if len(ram) != 49152:
+            raise SnapshotError("RAM size is {0}".format(len(ram)))
+        return {5: ram[:16384], 2: ram[16384:32768], 0: ram[32768:]}, (5, 2, 0), False
     paged_bank = data[49181] & 7
-    banks = [5, 2, paged_bank]
-    for i in range(8):
-        if i not in banks:
-            banks.append(i)
-    page_index = banks.index(page)
-    if page_index < 3:
-        index = 27 + page_index * 16384
-    else:
-        index = 49183 + (page_index - 3) * 16384
-    return data[27:32795] + data[index:index + 16384]
+    banks = {}
+    for index, bank in enumerate((5, 2, paged_bank)):
+        banks.setdefault(bank, data[27 + index * 16384:16411 + index * 16384])
+    index = 49183
+    for bank in range(8):
+        if bank not in banks and index < len(data):
+            banks[bank] = data[index:index + 16384]
+            index += 16384
+    if page is None:
+        page = paged_bank
+    ram_size = sum(len(banks.get(b, ())) for b in (5, 2, page))
+    if ram_size != 49152:
+        raise SnapshotError("RAM size is {0}".format(ram_size))
+    return banks, (5, 2, page), True
 
 def _read_z80(data, page=None):
     if sum(data[6:8]) > 0:
@@ -166,57 +251,68 @@ def _read_z80(data, page=None):
     header = data[:header_size]
     if version == 1:
         if header[12] & 32:
-            return _decompress_block(data[header_size:-4])
-        return data[header_size:]
+            ram = memoryview(_decompress_block(data[header_size:-4]))
+        else:
+            ram = memoryview(data)[header_size:]
+        if len(ram) != 49152:
+            raise SnapshotError("RAM size is {0}".format(len(ram)))
+        return {5: ram[:16384], 1: ram[16384:32768], 2: ram[32768:]}, (5, 1, 2), False
     machine_id = data[34]
-    extension = ()
-    if (version == 2 and machine_id < 2) or (version == 3 and machine_id in (0, 1, 3)):
+    is128 = not ((version == 2 and machine_id < 2) or (version == 3 and machine_id in (0, 1, 3)))
+    if not is128:
         if data[37] & 128:
-            banks = (5,) # 16K
-            extension = [0] * 32768
+            slots = (5, None, None) # 16K
         else:
-            banks = (5, 1, 2) # 48K
+            slots = (5, 1, 2) # 48K
     else:
         if page is None:
             page = data[35] & 7
-        banks = (5, 2, page) # 128K
-    return _decompress(data[header_size:], banks, extension)
+        slots = (5, 2, page) # 128K
+    banks = {}
+    ramz = memoryview(data)
+    j = header_size
+    while j < len(data):
+        length = data[j] + 256 * data[j + 1]
+        bank = data[j + 2] - 3
+        if length == 65535:
+            banks[bank] = ramz[j + 3:j + 16387]
+            j += 16387
+        else:
+            banks[bank] = partial(_decompress_block, data[j + 3:j + 3 + length])
+            j += 3 + length
+    return banks, slots, is128
 
 def _read_szx(data, page=None):
-    extension = ()
     machine_id = data[6]
     if machine_id == 0:
-        banks = (5,) # 16K
-        extension = [0] * 32768
+        slots = (5, None, None) # 16K
     elif machine_id == 1:
-        banks = (5, 2, 0) # 48K
+        slots = (5, 2, 0) # 48K
     else:
         if page is None:
             specregs = _get_zxstblock(data, 8, 'SPCR')[1]
             if specregs is None:
                 raise SnapshotError("SPECREGS (SPCR) block not found")
             page = specregs[1] & 7
-        banks = (5, 2, page) # 128K
-    pages = {}
-    for bank in banks:
-        pages[bank] = None
+        slots = (5, 2, page) # 128K
+    banks = {}
     i = 8
     while 1:
         i, rampage = _get_zxstblock(data, i, 'RAMP')
         if rampage is None:
             break
-        page = rampage[2]
-        if page in pages:
-            ram = rampage[3:]
-            if rampage[0] & 1:
-                try:
-                    ram = zlib.decompress(ram)
-                except zlib.error as e:
-                    raise SnapshotError("Error while decompressing page {0}: {1}".format(page, e.args[0]))
-            if len(ram) != 16384:
-                raise SnapshotError("Page {0} is {1} bytes (should be 16384)".format(page, len(ram)))
-            pages[page] = ram
-    return _concatenate_pages(pages, banks, extension)
+        bank = rampage[2]
+        if rampage[0] & 1:
+            banks[bank] = partial(_decompress_szx_page, bank, rampage[3:])
+        else:
+            banks[bank] = memoryview(rampage)[3:]
+    return banks, slots, machine_id > 1
+
+def _decompress_szx_page(page, ramz):
+    try:
+        return zlib.decompress(ramz)
+    except zlib.error as e:
+        raise SnapshotError("Error while decompressing page {0}: {1}".format(page, e.args[0]))
 
 def _get_zxstblock(data, index, block_id):
     block = None
@@ -228,53 +324,101 @@ def _get_zxstblock(data, index, block_id):
         index += 8 + size
     return index, block
 
-def _concatenate_pages(pages, banks, extension):
-    ram = []
-    for bank in banks:
-        if pages[bank] is None:
-            raise SnapshotError("Page {0} not found".format(bank))
-        ram.extend(pages[bank])
-    ram.extend(extension)
-    return ram
-
-def _decompress(ramz, banks, extension):
-    pages = {}
-    for bank in banks:
-        pages[bank] = None
-    j = 0
-    while j < len(ramz):
-        length = ramz[j] + 256 * ramz[j + 1]
-        page = ramz[j + 2] - 3
-        if length == 65535:
-            if page in pages:
-                pages[page] = ramz[j + 3:j + 16387]
-            j += 16387
-        else:
-            if page in pages:
-                pages[page] = _decompress_block(ramz[j + 3:j + 3 + length])
-            j += 3 + length
-    return _concatenate_pages(pages, banks, extension)
-
 def _decompress_block(ramz):
-    block = []
+    # Copy the literal bytes between each pair of ED ED markers in one slice,
+    # and expand each ED ED nn bb sequence in one step
+    block = bytearray()
     i = 0
-    while i < len(ramz):
-        b = ramz[i]
-        i += 1
-        if b == 237:
-            c = ramz[i]
-            i += 1
-            if c == 237:
-                length, byte = ramz[i], ramz[i + 1]
-                if length == 0:
-                    raise SnapshotError("Found ED ED 00 {0:02X}".format(byte))
-                block += [byte] * length
-                i += 2
-            else:
-                block += [b, c]
-        else:
-            block.append(b)
-    return block
+    while True:
+        j = ramz.find(b'\xed\xed', i)
+        if j < 0:
+            block += ramz[i:]
+            return block
+        block += ramz[i:j]
+        length, byte = ramz[j + 2], ramz[j + 3]
+        if length == 0:
+            raise SnapshotError("Found ED ED 00 {0:02X}".format(byte))
+        block += bytes((byte,)) * length
+        i = j + 4
+
+ZERO_PAGE = memoryview(bytes(16384))
+
+class Snapshot:
+    """A read-only view of the 64K memory in a snapshot. It may be indexed and
+    sliced like a list of byte values (a slice is returned as a list), but
+    builds no such list itself: the RAM of an uncompressed snapshot is viewed
+    in place, and a compressed RAM bank is decompressed when it is first
+    accessed.
+
+    :param banks: A dictionary of RAM banks; each value is either a 16K buffer
+                  or a function that returns one.
+    :param slots: The numbers of the RAM banks mapped to addresses 16384,
+                  32768 and 49152 (`None` for an absent bank).
+    :param is128: Whether this is a 128K snapshot (in which case all eight RAM
+                  banks may be accessed by number).
+    """
+    def __init__(self, banks, slots, is128=False):
+        self._banks = banks
+        self._slots = (None,) + tuple(slots)
+        self.is128 = is128
+        self.slots = tuple(slots)
+        self._pages = [ZERO_PAGE, None, None, None]
+
+    def bank(self, bank):
+        """Return a memoryview of a 16K RAM bank, decompressing it first if
+        necessary.
+
+        :param bank: The bank number.
+        """
+        if bank is None:
+            return ZERO_PAGE
+        data = self._banks.get(bank)
+        if data is None:
+            raise SnapshotError("Page {0} not found".format(bank))
+        if callable(data):
+            data = self._banks[bank] = memoryview(data())
+        if len(data) != 16384:
+            raise SnapshotError("Page {0} is {1} bytes (should be 16384)".format(bank, len(data)))
+        return data
+
+    def tobytes(self):
+        """Return the 64K memory as a `bytes` object."""
+        return b''.join([self._page(s) for s in range(4)])
+
+    def _page(self, slot):
+        page = self._pages[slot]
+        if page is None:
+            page = self._pages[slot] = self.bank(self._slots[slot])
+        return page
+
+    def __len__(self):
+        return 65536
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(65536)
+            if step > 0 and start < stop:
+                first, last = start // 16384, (stop - 1) // 16384
+                offset = first * 16384
+                if first == last:
+                    return self._page(first)[start - offset:stop - offset:step].tolist()
+                data = b''.join([self._page(s) for s in range(first, last + 1)])
+                return list(data[start - offset:stop - offset:step])
+            return list(self.tobytes()[index])
+        if index < 0:
+            index += 65536
+        if 0 <= index < 65536:
+            return self._page(index // 16384)[index % 16384]
+        raise IndexError('snapshot index out of range')
+
+    def __iter__(self):
+        for slot in range(4):
+            yield from self._page(slot)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, Snapshot)):
+            return self[:] == other[:]
+        return NotImplemented
 
 class SnapshotError(SkoolKitError):
     pass
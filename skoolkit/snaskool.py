@@ -16,10 +16,13 @@
 
 import sys
 import os
+import json
+import hashlib
 
-from skoolkit import SkoolKitError, warn, write_line, wrap, parse_int, get_address_format, open_file, read_bin_file
+from skoolkit import (SkoolKitError, warn, write_text, wrap, parse_int, get_address_format, open_file,
+                      read_bin_file, VERSION)
 from skoolkit.ctlparser import CtlParser
-from skoolkit.disassembler import Disassembler
+from skoolkit.disassembler import Disassembler, Instruction
 from skoolkit.skoolasm import UDGTABLE_MARKER
 from skoolkit.skoolctl import (AD_START, AD_ORG, AD_IGNOREUA,
                                TITLE, DESCRIPTION, REGISTERS, MID_BLOCK, INSTRUCTION, END)
@@ -55,7 +58,11 @@ TEXT_GAP_MAX = 8
 class CodeMapError(SkoolKitError):
     pass
 
-def _get_code_blocks(snapshot, start, end, fname):
+def _get_code_blocks(disassembler, start, end, fname):
+    if not isinstance(fname, str):
+        # An in-memory code map (e.g. from a simulator trace)
+        return _get_blocks_from_addresses(disassembler, [a for a in range(start, end) if fname[a]])
+
     if os.path.isdir(fname):
         raise SkoolKitError('{0} is a directory'.format(fname))
     try:
@@ -94,10 +101,12 @@ def _get_code_blocks(snapshot, start, end, fname):
             addresses = _get_addresses(f, fname, size, start, end)
     sys.stderr.write('\n')
 
+    return _get_blocks_from_addresses(disassembler, addresses)
+
+def _get_blocks_from_addresses(disassembler, addresses):
     code_blocks = []
-    disassembler = Disassembler(snapshot)
     for address in addresses:
-        size = disassembler.disassemble(address, address + 1)[0].size()
+        size = disassembler.instruction_size(address)
         if code_blocks and address <= sum(code_blocks[-1]):
             if address == sum(code_blocks[-1]):
                 code_blocks[-1][1] += size
@@ -173,8 +182,7 @@ def _get_addresses(f, fname, size, start, end):
 
     return sorted(addresses)
 
-def _is_terminal_instruction(instruction):
-    data = instruction.bytes
+def _is_terminal_instruction(data):
     if data[0] == 201:
         # RET
         return True
@@ -198,16 +206,16 @@ def _is_terminal_instruction(instruction):
 def _find_terminal_instruction(disassembler, ctls, start, end=65536, ctl=None):
     address = start
     while address < end:
-        instruction = disassembler.disassemble(address, address + 1)[0]
-        address = instruction.address + instruction.size()
+        i_address = address
+        address += disassembler.instruction_size(i_address)
         if ctl is None:
-            for a in range(instruction.address, address):
+            for a in range(i_address, address):
                 if a in ctls:
                     next_ctl = ctls[a]
                     del ctls[a]
             if ctls.get(address) == 'c':
                 break
-        if _is_terminal_instruction(instruction):
+        if _is_terminal_instruction(disassembler.snapshot[i_address:address]):
             if address < 65536 and address not in ctls:
                 ctls[address] = ctl or next_ctl
             break
@@ -231,19 +239,19 @@ def _generate_ctls_with_code_map(snapshot, start, end, code_map):
     # (1) Mark all executed blocks as 'c' and unexecuted blocks as 'U'
     # (unknown)
     ctls = {start: 'U', end: 'i'}
-    for address, length in _get_code_blocks(snapshot, start, end, code_map):
+    disassembler = Disassembler(snapshot)
+    for address, length in _get_code_blocks(disassembler, start, end, code_map):
         ctls[address] = 'c'
         if address + length < end:
             ctls[address + length] = 'U'
 
     # (2) Where a 'c' block doesn't end with a RET/JP/JR, extend it up to the
     # next RET/JP/JR in the following 'U' blocks, or up to the next 'c' block
-    disassembler = Disassembler(snapshot)
     while 1:
         done = True
         for ctl, b_start, b_end in _get_blocks(ctls):
             if ctl == 'c':
-                if _is_terminal_instruction(disassembler.disassemble(b_start, b_end)[-1]):
+                if _is_terminal_instruction(disassembler.disassemble(b_start, b_end)[-1].bytes):
                     continue
                 if _find_terminal_instruction(disassembler, ctls, b_end, end) < end:
                     done = False
@@ -519,7 +527,7 @@ def _analyse_blocks(disassembly, ctls):
     # terminal instruction as data
     disassembly.build()
     for entry in disassembly.entries:
-        if entry.bad_blocks or (ctls[entry.address] == 'c' and not _is_terminal_instruction(entry.instructions[-1])):
+        if entry.bad_blocks or (ctls[entry.address] == 'c' and not _is_terminal_instruction(entry.instructions[-1].bytes)):
             ctls[entry.address] = 'b'
 
     # Mark any NOP sequences at the beginning of a code block as a separate
@@ -571,6 +579,8 @@ class Entry:
         self.address = first_instruction.address
         self.description = description
         self.next = None
+        self.key = None
+        self.references = None
         self.bad_blocks = []
         for block in self.blocks:
             last_instruction = block.instructions[-1]
@@ -583,10 +593,45 @@ class Entry:
     def has_ignoreua_directive(self, comment_type):
         return comment_type in self.ignoreua_directives
 
+class DisassemblyCache:
+    def __init__(self, fname):
+        self.fname = fname
+        self.entries = {}
+        self.skool = {}
+        self._old_entries = {}
+        self._old_skool = {}
+        if os.path.isfile(fname):
+            try:
+                with open(fname) as f:
+                    data = json.load(f)
+            except ValueError:
+                data = {}
+            if data.get('version') == VERSION:
+                self._old_entries = data['entries']
+                self._old_skool = data['skool']
+
+    def get_entry(self, key):
+        return self._old_entries.get(key)
+
+    def add_entry(self, key, instructions, references):
+        self.entries[key] = (instructions, references)
+
+    def get_skool(self, key):
+        return self._old_skool.get(key)
+
+    def add_skool(self, key, skool):
+        self.skool[key] = skool
+
+    def save(self):
+        with open(self.fname, 'w') as f:
+            json.dump({'version': VERSION, 'entries': self.entries, 'skool': self.skool}, f)
+
 class Disassembly:
-    def __init__(self, snapshot, ctl_parser, final=False, defb_size=8, defb_mod=1, zfill=False, defm_width=66, asm_hex=False, asm_lower=False):
+    def __init__(self, snapshot, ctl_parser, final=False, defb_size=8, defb_mod=1, zfill=False, defm_width=66,
+                 asm_hex=False, asm_lower=False, cache=None):
         self.disassembler = Disassembler(snapshot, defb_size, defb_mod, zfill, defm_width, asm_hex, asm_lower)
         self.ctl_parser = ctl_parser
+        self.cache = cache
         if asm_hex:
             if asm_lower:
                 self.address_fmt = '{0:04x}'
@@ -629,38 +674,23 @@ class Disassembly:
                 title = title or 'Unused'
             elif block.ctl == 'i' and (block.description or block.registers or block.blocks[0].header):
                 title = title or 'Ignored'
-            for sub_block in block.blocks:
-                address = sub_block.start
-                if sub_block.ctl in 'cBT':
-                    base = sub_block.sublengths[0][1]
-                    instructions = self.disassembler.disassemble(sub_block.start, sub_block.end, base)
-                elif sub_block.ctl in 'bgstuw':
-                    sublengths = sub_block.sublengths
-                    if sublengths[0][0]:
-                        if sub_block.ctl == 's':
-                            length = sublengths[0][0]
-                        else:
-                            length = sum([s[0] for s in sublengths])
-                    else:
-                        length = sub_block.end - sub_block.start
-                    instructions = []
-                    while address < sub_block.end:
-                        end = min(address + length, sub_block.end)
-                        if sub_block.ctl == 't':
-                            instructions += self.disassembler.defm_range(address, end, sublengths)
-                        elif sub_block.ctl == 'w':
-                            instructions += self.disassembler.defw_range(address, end, sublengths)
-                        elif sub_block.ctl == 's':
-                            instructions.append(self.disassembler.defs(address, end, sublengths))
-                        else:
-                            instructions += self.disassembler.defb_range(address, end, sublengths)
-                        address += length
+            if self.cache:
+                key = self._get_entry_key(block)
+                cached = self.cache.get_entry(key)
+            else:
+                key = cached = None
+            for i, sub_block in enumerate(block.blocks):
+                if cached:
+                    snapshot = self.disassembler.snapshot
+                    instructions = [Instruction(a, op, snapshot[a:a + size]) for a, op, size in cached[0][i]]
                 else:
-                    instructions = self.disassembler.ignore(sub_block.start, sub_block.end)
+                    instructions = self._disassemble_sub_block(sub_block)
                 sub_block.instructions = instructions
                 for instruction in instructions:
                     self.instructions[instruction.address] = instruction
                     instruction.asm_directives = sub_block.asm_directives.get(instruction.address, ())
+            if key:
+                instructions = [[(i.address, i.operation, i.size()) for i in b.instructions] for b in block.blocks]
 
             sub_blocks = []
             i = 0
@@ -679,11 +709,67 @@ class Disassembly:
             entry = Entry(title, block.description, block.ctl, sub_blocks,
                           block.registers, block.end_comment, block.asm_directives,
                           block.ignoreua_directives)
+            if cached:
+                entry.references = cached[1]
+            if key:
+                entry.key = key
+                self.cache.add_entry(key, instructions, self._get_references(entry))
             self.entry_map[entry.address] = entry
             self.entries.append(entry)
         for i, entry in enumerate(self.entries[1:]):
             self.entries[i].next = entry
 
+    def _disassemble_sub_block(self, sub_block):
+        address = sub_block.start
+        if sub_block.ctl in 'cBT':
+            base = sub_block.sublengths[0][1]
+            return self.disassembler.disassemble(sub_block.start, sub_block.end, base)
+        if sub_block.ctl in 'bgstuw':
+            sublengths = sub_block.sublengths
+            if sublengths[0][0]:
+                if sub_block.ctl == 's':
+                    length = sublengths[0][0]
+                else:
+                    length = sum([s[0] for s in sublengths])
+            else:
+                length = sub_block.end - sub_block.start
+            instructions = []
+            while address < sub_block.end:
+                end = min(address + length, sub_block.end)
+                if sub_block.ctl == 't':
+                    instructions += self.disassembler.defm_range(address, end, sublengths)
+                elif sub_block.ctl == 'w':
+                    instructions += self.disassembler.defw_range(address, end, sublengths)
+                elif sub_block.ctl == 's':
+                    instructions.append(self.disassembler.defs(address, end, sublengths))
+                else:
+                    instructions += self.disassembler.defb_range(address, end, sublengths)
+                address += length
+            return instructions
+        return self.disassembler.ignore(sub_block.start, sub_block.end)
+
+    def _get_entry_key(self, block):
+        d = self.disassembler
+        sub_blocks = [(b.ctl, b.start, b.end, b.sublengths, b.header, b.comment, b.multiline_comment,
+                       sorted(b.asm_directives.items()), sorted((a, sorted(c)) for a, c in b.ignoreua_directives.items()))
+                      for b in block.blocks]
+        spec = (d.defb_size, d.defb_mod, d.zfill, d.defm_width, d.asm_hex, d.asm_lower,
+                block.ctl, block.start, block.end, block.title, block.description, block.registers,
+                block.end_comment, block.asm_directives, sorted(block.ignoreua_directives), sub_blocks)
+        data = bytes(d.snapshot[block.start:block.end + 3])
+        return hashlib.sha1(repr(spec).encode('utf-8') + data).hexdigest()
+
+    def _get_references(self, entry):
+        if entry.references is None:
+            entry.references = []
+            for instruction in entry.instructions:
+                operation = instruction.operation
+                if operation.upper().startswith(('DJ', 'JR', 'JP', 'CA', 'RS')):
+                    addr_str = get_address(operation)
+                    if addr_str:
+                        entry.references.append(parse_int(addr_str))
+        return entry.references
+
     def remove_entry(self, address):
         if address in self.entry_map:
             del self.entry_map[address]
@@ -699,23 +785,20 @@ class Disassembly:
             for instruction in entry.instructions:
                 instruction.referrers = []
         for entry in self.entries:
-            for instruction in entry.instructions:
-                operation = instruction.operation
-                if operation.upper().startswith(('DJ', 'JR', 'JP', 'CA', 'RS')):
-                    addr_str = get_address(operation)
-                    if addr_str:
-                        callee = self.instructions.get(parse_int(addr_str))
-                        if callee:
-                            callee.add_referrer(entry)
+            for address in self._get_references(entry):
+                callee = self.instructions.get(address)
+                if callee:
+                    callee.add_referrer(entry)
 
     def _address_str(self, address):
         return self.address_fmt.format(address)
 
 class SkoolWriter:
-    def __init__(self, snapshot, ctl_parser, options):
+    def __init__(self, snapshot, ctl_parser, options, cache=None):
         self.comment_width = max(options.line_width - 2, MIN_COMMENT_WIDTH)
         self.disassembly = Disassembly(snapshot, ctl_parser, True, options.defb_size, options.defb_mod, options.zfill,
-                                       options.defm_width, options.asm_hex, options.asm_lower)
+                                       options.defm_width, options.asm_hex, options.asm_lower, cache)
+        self.cache = cache
         self.address_fmt = get_address_format(options.asm_hex, options.asm_lower)
         self.asm_hex = options.asm_hex
 
@@ -727,14 +810,41 @@ class SkoolWriter:
     def write_skool(self, write_refs, text):
         if not self.disassembly.entries:
             return
+        self._lines = []
         if not self.disassembly.contains_entry_asm_directive(AD_START):
             self.write_asm_directives(AD_START)
             if not self.disassembly.contains_entry_asm_directive(AD_ORG):
                 self.write_asm_directives('{}={}'.format(AD_ORG, self.address_str(self.disassembly.org, False)))
         for entry_index, entry in enumerate(self.disassembly.entries):
             if entry_index:
-                write_line('')
-            self._write_entry(entry, write_refs, text)
+                self.write_line('')
+            if self.cache:
+                self._write_cached_entry(entry, write_refs, text)
+            else:
+                self._write_entry(entry, write_refs, text)
+            write_text(''.join(self._lines))
+            self._lines = []
+
+    def write_line(self, text):
+        self._lines.append('{}\n'.format(text))
+
+    def _write_cached_entry(self, entry, write_refs, show_text):
+        referrers = [(i.ctl, [r.address for r in i.referrers]) for i in entry.instructions]
+        spec = (entry.key, referrers, write_refs, show_text, self.comment_width)
+        key = hashlib.sha1(repr(spec).encode('utf-8')).hexdigest()
+        skool = self.cache.get_skool(key)
+        if skool is None:
+            start = len(self._lines)
+            self._write_entry(entry, write_refs, show_text)
+            skool = ''.join(self._lines[start:])
+        else:
+            self._warn_bad_blocks(entry)
+            self._lines.append(skool)
+        self.cache.add_skool(key, skool)
+
+    def _warn_bad_blocks(self, entry):
+        for block in entry.bad_blocks:
+            warn('Code block at {} overlaps the following block at {}'.format(self.address_str(block.start, False), self.address_str(block.end, False)))
 
     def _write_entry(self, entry, write_refs, show_text):
         self.write_asm_directives(*entry.asm_directives)
@@ -744,8 +854,7 @@ class SkoolWriter:
         if entry.ctl == 'i' and entry.blocks[-1].end >= 65536 and not entry.title and all([b.ctl == 'i' for b in entry.blocks]):
             return
 
-        for block in entry.bad_blocks:
-            warn('Code block at {} overlaps the following block at {}'.format(self.address_str(block.start, False), self.address_str(block.end, False)))
+        self._warn_bad_blocks(entry)
 
         if entry.title:
             self.write_comment(entry.title)
@@ -796,12 +905,12 @@ class SkoolWriter:
             if desc:
                 desc_indent = len(reg) + 1
                 desc_lines = wrap(desc, max(self.comment_width - desc_indent, MIN_COMMENT_WIDTH))
-                write_line('; {} {}'.format(reg, desc_lines[0]))
+                self.write_line('; {} {}'.format(reg, desc_lines[0]))
                 desc_prefix = '.'.ljust(desc_indent)
                 for line in desc_lines[1:]:
-                    write_line('; {}{}'.format(desc_prefix, line))
+                    self.write_line('; {}{}'.format(desc_prefix, line))
             else:
-                write_line('; {}'.format(reg))
+                self.write_line('; {}'.format(reg))
 
     def _format_block_comment(self, block, width):
         rowspan = len(block.instructions)
@@ -859,7 +968,7 @@ class SkoolWriter:
             self._write_instructions(entry, block, op_width, comment_lines, write_refs, show_text)
             indent = ' ' * line_width
             for j in range(len(block.instructions), len(comment_lines)):
-                write_line('{}; {}'.format(indent, comment_lines[j]))
+                self.write_line('{}; {}'.format(indent, comment_lines[j]))
             first_block = False
 
     def _write_instructions(self, entry, block, op_width, comment_lines, write_refs, show_text):
@@ -880,17 +989,17 @@ class SkoolWriter:
             if block.has_ignoreua_directive(instruction.address, INSTRUCTION):
                 self.write_asm_directives(AD_IGNOREUA)
             if entry.ctl == 'c' or comment:
-                write_line(('{}{} {} ; {}'.format(ctl, self.address_str(address), operation.ljust(op_width), comment)).rstrip())
+                self.write_line(('{}{} {} ; {}'.format(ctl, self.address_str(address), operation.ljust(op_width), comment)).rstrip())
             else:
-                write_line(('{}{} {}'.format(ctl, self.address_str(address), operation)).rstrip())
+                self.write_line(('{}{} {}'.format(ctl, self.address_str(address), operation)).rstrip())
             index += 1
 
     def write_comment(self, text):
         if text:
             for line in self.wrap(text):
-                write_line('; {0}'.format(line))
+                self.write_line('; {0}'.format(line))
         else:
-            write_line(';')
+            self.write_line(';')
 
     def _write_empty_paragraph(self):
         self.write_comment('')
@@ -917,7 +1026,7 @@ class SkoolWriter:
 
     def write_asm_directives(self, *directives):
         for directive in directives:
-            write_line('@' + directive)
+            self.write_line('@' + directive)
 
     def to_ascii(self, data):
         chars = ['[']
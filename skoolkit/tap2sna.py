@@ -17,10 +17,16 @@
 import sys
 import os
 import argparse
+import hashlib
+import io
+import json
+import mmap
+import multiprocessing
 import textwrap
 import tempfile
 import zipfile
-from urllib.request import urlopen
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
 from urllib.parse import urlparse
 
 from skoolkit import SkoolKitError, get_int_param, get_word, get_word3, get_dword, open_file, write_line, VERSION
@@ -50,8 +56,7 @@ def _get_z80(ram, options):
 def _write_z80(ram, options, fname):
     parent_dir = os.path.dirname(fname)
     if parent_dir and not os.path.isdir(parent_dir):
-        os.makedirs(parent_dir)
-    write_line('Writing {0}'.format(fname))
+        os.makedirs(parent_dir, exist_ok=True)
     with open(fname, 'wb') as f:
         f.write(bytearray(_get_z80(ram, options)))
 
@@ -146,7 +151,7 @@ def poke(snapshot, param_str):
     for a in range(addr1, addr2 + 1, step):
         snapshot[a] = poke_f(snapshot[a])
 
-def _get_ram(blocks, options):
+def _get_ram(tape, options):
     snapshot = [0] * 65536
 
     operations = []
@@ -162,8 +167,11 @@ def _get_ram(blocks, options):
 
     if standard_load:
         start = None
-        for block_num, block in enumerate(blocks, 1):
-            if block:
+        for block_num, length in tape.blocks():
+            if length:
+                # Read no more than a header's worth of the block unless it
+                # is a data block that is going to be loaded
+                block = tape.read(19)
                 if block[0] == 0 and len(block) >= 19:
                     # Header
                     block_type = block[1]
@@ -177,13 +185,13 @@ def _get_ram(blocks, options):
                         raise TapeError('Unknown block type ({}) in header block {}'.format(block_type, block_num))
                 elif block[0] == 255 and start is not None:
                     # Data
-                    _load_block(snapshot, block, start)
+                    _load_block(snapshot, block + tape.read(), start)
                     start = None
 
     counters = {}
     for op_type, param_str in operations:
         if op_type == 'load':
-            _load(snapshot, counters, blocks, param_str)
+            _load(snapshot, counters, tape, param_str)
         elif op_type == 'move':
             move(snapshot, param_str)
         elif op_type == 'poke':
@@ -191,158 +199,330 @@ def _get_ram(blocks, options):
 
     return snapshot[16384:]
 
-def _get_tzx_block(data, i):
-    # http://www.worldofspectrum.org/TZXformat.html
-    block_id = data[i]
-    tape_data = None
-    i += 1
-    if block_id == 16:
-        # Standard speed data block
-        length = get_word(data, i + 2)
-        tape_data = data[i + 4:i + 4 + length]
-        i += 4 + length
-    elif block_id == 17:
-        # Turbo speed data block
-        length = get_word3(data, i + 15)
-        tape_data = data[i + 18:i + 18 + length]
-        i += 18 + length
-    elif block_id == 18:
-        # Pure tone
-        i += 4
-    elif block_id == 19:
-        # Sequence of pulses of various lengths
-        i += 2 * data[i] + 1
-    elif block_id == 20:
-        # Pure data block
-        length = get_word3(data, i + 7)
-        tape_data = data[i + 10:i + 10 + length]
-        i += 10 + length
-    elif block_id == 21:
-        # Direct recording block
-        i += get_word3(data, i + 5) + 8
-    elif block_id == 24:
-        # CSW recording block
-        i += get_dword(data, i) + 4
-    elif block_id == 25:
-        # Generalized data block
-        i += get_dword(data, i) + 4
-    elif block_id == 32:
-        # Pause (silence) or 'Stop the tape' command
-        i += 2
-    elif block_id == 33:
-        # Group start
-        i += data[i] + 1
-    elif block_id == 34:
-        # Group end
-        pass
-    elif block_id == 35:
-        # Jump to block
-        i += 2
-    elif block_id == 36:
-        # Loop start
-        i += 2
-    elif block_id == 37:
-        # Loop end
-        pass
-    elif block_id == 38:
-        # Call sequence
-        i += get_word(data, i) * 2 + 2
-    elif block_id == 39:
-        # Return from sequence
-        pass
-    elif block_id == 40:
-        # Select block
-        i += get_word(data, i) + 2
-    elif block_id == 42:
-        # Stop the tape if in 48K mode
-        i += 4
-    elif block_id == 43:
-        # Set signal level
-        i += 5
-    elif block_id == 48:
-        # Text description
-        i += data[i] + 1
-    elif block_id == 49:
-        # Message block
-        i += data[i + 1] + 2
-    elif block_id == 50:
-        # Archive info
-        i += get_word(data, i) + 2
-    elif block_id == 51:
-        # Hardware type
-        i += data[i] * 3 + 1
-    elif block_id == 53:
-        # Custom info block
-        i += get_dword(data, i + 16) + 20
-    elif block_id == 90:
-        # "Glue" block
-        i += 9
-    else:
-        raise TapeError('Unknown TZX block ID: 0x{:X}'.format(block_id))
-    return i, tape_data
-
-def _get_tzx_blocks(data):
-    signature = ''.join(chr(b) for b in data[:7])
-    if signature != 'ZXTape!':
-        raise TapeError("Not a TZX file")
-    i = 10
-    blocks = []
-    while i < len(data):
-        i, tape_data = _get_tzx_block(data, i)
-        blocks.append(tape_data)
-    return blocks
-
-def _get_tap_blocks(tap):
-    blocks = []
-    i = 0
-    while i < len(tap):
-        block_len = tap[i] + 256 * tap[i + 1]
-        i += 2
-        blocks.append(tap[i:i + block_len])
-        i += block_len
-    return blocks
-
-def _get_tape_blocks(tape_type, tape):
-    if tape_type.lower() == 'tzx':
-        return _get_tzx_blocks(tape)
-    return _get_tap_blocks(tape)
-
-def _get_tape(urlstring, member=None):
+# For each TZX block ID: the length of the fixed part of the block (which
+# follows the ID), a function that returns the length of the rest of the
+# block given the fixed part, and whether the rest of the block is tape data
+# http://www.worldofspectrum.org/TZXformat.html
+TZX_BLOCKS = {
+    16: (4, lambda h: get_word(h, 2), True),        # Standard speed data block
+    17: (18, lambda h: get_word3(h, 15), True),     # Turbo speed data block
+    18: (4, lambda h: 0, False),                    # Pure tone
+    19: (1, lambda h: 2 * h[0], False),             # Sequence of pulses of various lengths
+    20: (10, lambda h: get_word3(h, 7), True),      # Pure data block
+    21: (8, lambda h: get_word3(h, 5), False),      # Direct recording block
+    24: (4, lambda h: get_dword(h, 0), False),      # CSW recording block
+    25: (4, lambda h: get_dword(h, 0), False),      # Generalized data block
+    32: (2, lambda h: 0, False),                    # Pause (silence) or 'Stop the tape' command
+    33: (1, lambda h: h[0], False),                 # Group start
+    34: (0, lambda h: 0, False),                    # Group end
+    35: (2, lambda h: 0, False),                    # Jump to block
+    36: (2, lambda h: 0, False),                    # Loop start
+    37: (0, lambda h: 0, False),                    # Loop end
+    38: (2, lambda h: get_word(h, 0) * 2, False),   # Call sequence
+    39: (0, lambda h: 0, False),                    # Return from sequence
+    40: (2, lambda h: get_word(h, 0), False),       # Select block
+    42: (4, lambda h: 0, False),                    # Stop the tape if in 48K mode
+    43: (5, lambda h: 0, False),                    # Set signal level
+    48: (1, lambda h: h[0], False),                 # Text description
+    49: (2, lambda h: h[1], False),                 # Message block
+    50: (2, lambda h: get_word(h, 0), False),       # Archive info
+    51: (1, lambda h: h[0] * 3, False),             # Hardware type
+    53: (20, lambda h: get_dword(h, 16), False),    # Custom info block
+    90: (9, lambda h: 0, False)                     # "Glue" block
+}
+
+class _Tape:
+    """A TAP or TZX file whose blocks are read one at a time from a file
+    object (and never held in memory all at once).
+
+    :param tape_type: 'tap' or 'tzx'.
+    :param open_tape: A function that returns a file object positioned at the
+                      start of the tape.
+    :param f: The underlying file object (closed by `close()`), or `None` if
+              it is shared with other tapes.
+    """
+    def __init__(self, tape_type, open_tape, f):
+        self._tzx = tape_type.lower() == 'tzx'
+        self._open = open_tape
+        self._file = f
+        self._stream = None
+        self._iter = None
+        self._pending = 0
+        self._block_num = 0
+        self._num_blocks = None
+
+    def close(self):
+        if self._stream not in (None, self._file):
+            self._stream.close()
+        if self._file:
+            self._file.close()
+
+    def _rewind(self):
+        if self._stream not in (None, self._file):
+            self._stream.close()
+        self._stream = self._open()
+        if self._stream.seekable():
+            self._stream.seek(0)
+        self._pending = 0
+        self._block_num = 0
+
+    def _skip(self, length):
+        if self._stream.seekable():
+            self._stream.seek(length, 1)
+        else:
+            while length > 0:
+                data = self._stream.read(min(length, 65536))
+                if not data:
+                    break
+                length -= len(data)
+
+    def blocks(self):
+        """Generate the number and the length of the tape data of each block
+        on the tape (`None` for a TZX block that contains no tape data).
+        The tape data of the current block may be obtained by calling
+        `read()`; whatever is not read is skipped.
+        """
+        self._rewind()
+        if self._tzx:
+            if self._stream.read(7) != b'ZXTape!':
+                raise TapeError("Not a TZX file")
+            self._skip(3)
+        while True:
+            self._skip(self._pending)
+            self._pending = 0
+            if self._tzx:
+                block_id = self._stream.read(1)
+                if not block_id:
+                    break
+                try:
+                    header_len, get_length, is_data = TZX_BLOCKS[block_id[0]]
+                except KeyError:
+                    raise TapeError('Unknown TZX block ID: 0x{:X}'.format(block_id[0]))
+                length = get_length(self._stream.read(header_len))
+                if not is_data:
+                    self._skip(length)
+                    length = None
+            else:
+                header = self._stream.read(2)
+                if len(header) < 2:
+                    break
+                length = header[0] + 256 * header[1]
+            self._block_num += 1
+            self._pending = length or 0
+            yield self._block_num, length
+
+    def read(self, length=None):
+        """Read (up to) `length` bytes of the tape data of the current block
+        (by default, all of the tape data that has not yet been read)."""
+        if length is None or length > self._pending:
+            length = self._pending
+        data = self._stream.read(length)
+        self._pending -= length
+        return data
+
+    def _count_blocks(self):
+        if self._num_blocks is None:
+            self._num_blocks = 0
+            for self._num_blocks, length in self.blocks():
+                pass
+            self._iter = None
+        return self._num_blocks
+
+    def __getitem__(self, index):
+        # Return the tape data of a block (None if it contains no tape data),
+        # rewinding the tape only if the block has already been passed; as
+        # with a list of blocks, a negative index counts back from the end
+        if index < 0:
+            index += self._count_blocks()
+            if index < 0:
+                raise IndexError
+        if self._iter is None or index < self._block_num:
+            self._iter = self.blocks()
+        for block_num, length in self._iter:
+            if block_num == index + 1:
+                if length is None:
+                    return None
+                return self.read()
+        raise IndexError
+
+class _MappedFile(io.RawIOBase):
+    """A read-only file object whose contents are memory-mapped.
+
+    :param fname: The file name.
+    """
+    def __init__(self, fname):
+        super().__init__()
+        with open(fname, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._map.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._map.tell()
+        elif whence == 2:
+            offset += len(self._map)
+        self._map.seek(min(max(offset, 0), len(self._map)))
+        return self._map.tell()
+
+    def close(self):
+        if not self.closed:
+            self._map.close()
+        super().close()
+
+def _open_mapped(fname):
+    if os.path.getsize(fname):
+        return _MappedFile(fname)
+    return open(fname, 'rb')
+
+def _copy(u, f, sha=None):
+    while 1:
+        data = u.read(65536)
+        if not data:
+            break
+        f.write(data)
+        if sha:
+            sha.update(data)
+
+def _sha256(fname):
+    sha = hashlib.sha256()
+    with open(fname, 'rb') as f:
+        for data in iter(lambda: f.read(65536), b''):
+            sha.update(data)
+    return sha.hexdigest()
+
+class _TapeCache:
+    """Resolves the URL of a remote tape to a local file: a copy in a mirror
+    directory, a copy in a cache directory (which is revalidated with the
+    server by ETag or modification time), or a fresh download (which is
+    stored in the cache directory).
+
+    :param cache_dir: The cache directory (if any).
+    :param mirror: The mirror directory (if any).
+    :param offline: Whether to resolve URLs from the mirror and the cache only.
+    """
+    def __init__(self, cache_dir=None, mirror=None, offline=False):
+        self.cache_dir = cache_dir
+        self.mirror = mirror
+        self.offline = offline
+
+    def open(self, urlstring, verbose=True):
+        """Return a file object for the contents of a URL."""
+        if self.mirror:
+            path = os.path.join(self.mirror, os.path.basename(urlparse(urlstring).path))
+            if os.path.isfile(path):
+                if verbose:
+                    write_line('Using {0}'.format(path))
+                return _open_mapped(path)
+        u = None
+        if self.cache_dir:
+            key = hashlib.sha256(urlstring.encode('utf-8')).hexdigest()
+            data_file = os.path.join(self.cache_dir, key)
+            meta = self._get_metadata(data_file)
+            if meta:
+                if not self.offline:
+                    u = self._revalidate(urlstring, meta)
+                if u is None:
+                    if verbose:
+                        write_line('Using cached {0}'.format(urlstring))
+                    return _open_mapped(data_file)
+        if self.offline:
+            raise TapeError('{}: not found in the cache or mirror'.format(urlstring))
+        if verbose:
+            write_line('Downloading {0}'.format(urlstring))
+        if u is None:
+            u = urlopen(urlstring, timeout=30)
+        if self.cache_dir:
+            return self._download(u, urlstring, data_file)
+        f = tempfile.NamedTemporaryFile(prefix='tap2sna-')
+        _copy(u, f)
+        return f
+
+    def _get_metadata(self, data_file):
+        # Return the metadata of a cached file, or None if there is no such
+        # file or its contents do not match the SHA-256 digest recorded when
+        # it was downloaded
+        try:
+            with open(data_file + '.json') as f:
+                meta = json.load(f)
+            if _sha256(data_file) == meta['sha256']:
+                return meta
+        except (IOError, ValueError, KeyError):
+            pass
+
+    def _revalidate(self, urlstring, meta):
+        # Make a conditional request for a cached URL, and return the response
+        # (None if the cached copy is up to date)
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        try:
+            return urlopen(Request(urlstring, headers=headers), timeout=30)
+        except HTTPError as e:
+            if e.code == 304:
+                return None
+            raise
+
+    def _download(self, u, urlstring, data_file):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        sha = hashlib.sha256()
+        fd, tmp_file = tempfile.mkstemp(prefix='tap2sna-', dir=self.cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            _copy(u, f, sha)
+        os.replace(tmp_file, data_file)
+        meta = {
+            'url': urlstring,
+            'etag': u.headers.get('ETag'),
+            'last_modified': u.headers.get('Last-Modified'),
+            'sha256': sha.hexdigest()
+        }
+        with open(data_file + '.json', 'w') as f:
+            json.dump(meta, f, sort_keys=True)
+        return _open_mapped(data_file)
+
+def _get_tape(urlstring, member=None, archives=None, verbose=True, cache=None):
+    if archives and urlstring in archives:
+        # This archive has already been opened (and its directory parsed) for
+        # another tape in the same batch
+        return _get_tape_from_zip(archives[urlstring][1], member, None, verbose)
     url = urlparse(urlstring)
     if url.scheme:
-        write_line('Downloading {0}'.format(urlstring))
-        u = urlopen(urlstring, timeout=30)
-        f = tempfile.NamedTemporaryFile(prefix='tap2sna-')
-        while 1:
-            data = bytearray(u.read(4096))
-            if data:
-                f.write(data)
-            else:
-                break
+        f = (cache or _TapeCache()).open(urlstring, verbose)
     elif url.path:
         f = open_file(url.path, 'rb')
 
     if urlstring.lower().endswith('.zip'):
         z = zipfile.ZipFile(f)
-        if member is None:
-            for name in z.namelist():
-                if name.lower().endswith(('.tap', '.tzx')):
-                    member = name
-                    break
-            else:
+        if archives is None:
+            return _get_tape_from_zip(z, member, f, verbose)
+        archives[urlstring] = (f, z)
+        return _get_tape_from_zip(z, member, None, verbose)
+    return _Tape(urlstring[-3:], lambda: f, f)
+
+def _get_tape_from_zip(z, member, f, verbose):
+    if member is None:
+        for name in z.namelist():
+            if name.lower().endswith(('.tap', '.tzx')):
+                member = name
+                break
+        else:
+            if f:
                 f.close()
-                raise TapeError('No TAP or TZX file found')
+            raise TapeError('No TAP or TZX file found')
+    if verbose:
         write_line('Extracting {0}'.format(member))
-        tape = z.open(member)
-        data = bytearray(tape.read())
-        tape_type = member[-3:]
-    else:
-        tape_type = urlstring[-3:]
-        f.seek(0)
-        data = bytearray(f.read())
-
-    f.close()
-    return tape_type, data
+    return _Tape(member[-3:], lambda: z.open(member), f)
 
 def _print_ram_help():
     sys.stdout.write("""
@@ -440,15 +620,94 @@ Set a hardware state attribute. Recognised names and their default values are:
   im     - interrupt mode (default=1)
 """.lstrip())
 
-def make_z80(url, options, z80):
-    tape_type, tape = _get_tape(url)
-    tape_blocks = _get_tape_blocks(tape_type, tape)
-    ram = _get_ram(tape_blocks, options)
+def make_z80(url, options, z80, archives=None, verbose=True):
+    cache = _TapeCache(options.cache, options.mirror, options.offline)
+    tape = _get_tape(url, archives=archives, verbose=verbose, cache=cache)
+    try:
+        ram = _get_ram(tape, options)
+    finally:
+        tape.close()
+    if verbose:
+        write_line('Writing {0}'.format(z80))
     _write_z80(ram, options, z80)
 
+def _convert_tapes(jobs):
+    # Convert a group of tapes (in a worker process if there is a pool),
+    # opening each archive they share only once, and return the status of
+    # each conversion
+    archives = {}
+    results = []
+    try:
+        for index, url, z80, options in jobs:
+            if options.force or not os.path.isfile(z80):
+                try:
+                    make_z80(url, options, z80, archives, False)
+                    results.append((index, z80, None))
+                except Exception as e:
+                    results.append((index, z80, 'Error: {}'.format(str(e) or e.__class__.__name__)))
+            else:
+                results.append((index, z80, 'file already exists; use -f to overwrite'))
+    finally:
+        for f, z in archives.values():
+            f.close()
+    return results
+
+def _read_manifest(parser, namespace):
+    jobs = {}
+    with open_file(namespace.manifest) as f:
+        for line_no, line in enumerate(f, 1):
+            job_args = list(parser.convert_arg_line_to_args(line))
+            if job_args:
+                options, unknown_args = parser.parse_known_args(job_args)
+                if unknown_args or len(options.args) != 2 or options.manifest:
+                    raise SkoolKitError('Invalid job on line {} of {}: {}'.format(line_no, namespace.manifest, line.strip()))
+                for name in ('output_dir', 'cache', 'mirror'):
+                    if getattr(options, name) is None:
+                        setattr(options, name, getattr(namespace, name))
+                options.force = options.force or namespace.force
+                options.offline = options.offline or namespace.offline
+                url, z80 = _get_job(options)
+                # Tapes in the same archive are converted in the same group
+                key = url if url.lower().endswith('.zip') else len(jobs)
+                jobs.setdefault(key, []).append((line_no, url, z80, options))
+    return list(jobs.values())
+
+def _run_manifest(parser, namespace):
+    groups = _read_manifest(parser, namespace)
+    if namespace.jobs > 1 and len(groups) > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        with multiprocessing.get_context('fork').Pool(namespace.jobs) as pool:
+            results = pool.map(_convert_tapes, groups, 1)
+    else:
+        results = [_convert_tapes(group) for group in groups]
+    converted = failed = 0
+    for index, z80, error in sorted(r for group in results for r in group):
+        if error is None:
+            converted += 1
+            write_line('{}: OK'.format(z80))
+        else:
+            failed += error.startswith('Error')
+            write_line('{}: {}'.format(z80, error))
+    total = sum(len(group) for group in groups)
+    write_line('Converted {} of {} tapes ({} failed, {} skipped)'.format(converted, total, failed, total - converted - failed))
+    if failed:
+        raise SkoolKitError('Failed to convert {} of {} tapes'.format(failed, total))
+
+def _get_job(options):
+    url, z80 = options.args
+    if options.output_dir:
+        z80 = os.path.join(options.output_dir, z80)
+    # Copy the list of registers first, because it may be the parser's
+    # default list (shared by every job in a manifest)
+    options.reg = options.reg[:]
+    if options.stack is not None:
+        options.reg.append('sp={}'.format(options.stack))
+    if options.start is not None:
+        options.reg.append('pc={}'.format(options.start))
+    return url, z80
+
 def main(args):
     parser = SkoolKitArgumentParser(
-        usage='\n  tap2sna.py [options] INPUT snapshot.z80\n  tap2sna.py @FILE',
+        usage='\n  tap2sna.py [options] INPUT snapshot.z80\n  tap2sna.py @FILE\n  tap2sna.py [options] -m FILE',
         description="Convert a TAP or TZX file (which may be inside a zip archive) into a Z80 snapshot. "
                     "INPUT may be the full URL to a remote zip archive or TAP/TZX file, or the path to a local file. "
                     "Arguments may be read from FILE instead of (or as well as) being given on the command line.",
@@ -457,10 +716,20 @@ def main(args):
     )
     parser.add_argument('args', help=argparse.SUPPRESS, nargs='*')
     group = parser.add_argument_group('Options')
+    group.add_argument('-c', '--cache', dest='cache', metavar='DIR',
+                       help="Keep a copy of every remote tape downloaded in this directory, and reuse it while it is up to date.")
     group.add_argument('-d', '--output-dir', dest='output_dir', metavar='DIR',
                        help="Write the snapshot file in this directory.")
     group.add_argument('-f', '--force', action='store_true',
                        help="Overwrite an existing snapshot.")
+    group.add_argument('-J', '--jobs', dest='jobs', metavar='N', type=int, default=1,
+                       help="Convert the tapes in a manifest using N worker processes (default: 1).")
+    group.add_argument('-m', '--manifest', dest='manifest', metavar='FILE',
+                       help="Convert every tape listed in FILE, one set of arguments per line, and print a report.")
+    group.add_argument('--mirror', dest='mirror', metavar='DIR',
+                       help="Look for a remote tape in this directory (by file name) before downloading it.")
+    group.add_argument('--offline', action='store_true',
+                       help="Never download a remote tape; look for it only in the mirror and cache directories.")
     group.add_argument('-p', '--stack', dest='stack', metavar='STACK', type=int,
                        help="Set the stack pointer.")
     group.add_argument('--ram', dest='ram_ops', metavar='OPERATION', action='append', default=[],
@@ -486,15 +755,12 @@ def main(args):
     if 'help' in namespace.state:
         _print_state_help()
         return
+    if namespace.manifest and not (unknown_args or namespace.args):
+        _run_manifest(parser, namespace)
+        return
     if unknown_args or len(namespace.args) != 2:
         parser.exit(2, parser.format_help())
-    url, z80 = namespace.args
-    if namespace.output_dir:
-        z80 = os.path.join(namespace.output_dir, z80)
-    if namespace.stack is not None:
-        namespace.reg.append('sp={}'.format(namespace.stack))
-    if namespace.start is not None:
-        namespace.reg.append('pc={}'.format(namespace.start))
+    url, z80 = _get_job(namespace)
     if namespace.force or not os.path.isfile(z80):
         try:
             make_z80(url, namespace, z80)
@@ -14,7 +14,7 @@
 # You should have received a copy of the GNU General Public License along with
 # SkoolKit. If not, see <http://www.gnu.org/licenses/>.
 
-from functools import partial
+from functools import lru_cache, partial
 
 from skoolkit import get_int_param, parse_int
 from skoolkit.textutils import split_unquoted
@@ -24,6 +24,19 @@ REG_PAIRS = ('BC', 'DE', 'HL', 'SP')
 INDEX_REG = ('IXH', 'IXL', 'IYH', 'IYL')
 INDEX_REG_PAIRS = ('IX', 'IY')
 
+# The maximum number of normalised operations and assembled instructions to
+# remember
+CACHE_SIZE = 16384
+
+# Mnemonics whose encoding depends on the address of the instruction
+RELATIVE = ('DJNZ', 'JR')
+
+# Operand kinds in an assembler pattern
+_BYTE, _WORD, _JUMP, _INDEX, _LITERAL = range(5)
+
+_patterns = None
+_fixed_operands = None
+
 def _parse_num(num, brackets):
     if brackets:
         if num.startswith("(") and num.endswith(")"):
@@ -441,6 +454,125 @@ def convert_case(operation, lower=True, trim=False):
         i += 1
     return converted
 
+def _template_operands(template):
+    # Convert the operands of a disassembler template into pattern operands
+    # and operand kinds
+    operands = []
+    kinds = []
+    literals = []
+    for op in split_operation(template.upper())[1:]:
+        if op.isdigit():
+            operands.append('N')
+            kinds.append(_LITERAL)
+            literals.append(int(op))
+        elif '{' in op:
+            if op.startswith('(I') and op != '({0})':
+                operands.append(op[:3] + '+D)')
+            elif op.startswith('('):
+                operands.append('(N)')
+            else:
+                operands.append('N')
+            kinds.append(None)
+        else:
+            operands.append(op)
+    return operands, kinds, tuple(literals)
+
+def _add_pattern(patterns, fixed, prefix, suffix, template, arg_kinds):
+    mnemonic = template.split(None, 1)[0].upper()
+    operands, kinds, literals = _template_operands(template)
+    fixed.update(op for op in operands if op not in ('N', '(N)') and not op.endswith('+D)'))
+    arg_kinds = iter(arg_kinds)
+    kinds = tuple(k if k is not None else next(arg_kinds) for k in kinds)
+    key = (mnemonic,) + tuple(operands)
+    encodings = patterns.setdefault(key, (kinds, {}))[1]
+    encodings.setdefault(literals, (prefix, suffix))
+
+def _build_patterns():
+    # Generate the pattern table from the disassembler's opcode tables; where
+    # two opcodes disassemble to the same instruction, the lower one wins
+    from skoolkit.disassembler import Disassembler as D
+    arg_kinds = {
+        D.no_arg: (),
+        D.byte_arg: (_BYTE,),
+        D.word_arg: (_WORD,),
+        D.jr_arg: (_JUMP,),
+        D.index: (_INDEX,),
+        D.index_arg: (_INDEX, _BYTE)
+    }
+    patterns = {}
+    fixed = set()
+    for opcode, (decoder, template) in sorted(D.ops.items()):
+        if decoder in arg_kinds:
+            _add_pattern(patterns, fixed, (opcode,), (), template, arg_kinds[decoder])
+        elif decoder == D.rst_arg:
+            _add_pattern(patterns, fixed, (opcode,), (), 'RST {}'.format(template), ())
+    for opcode, template in sorted(D.after_CB.items()):
+        _add_pattern(patterns, fixed, (203, opcode), (), template, ())
+    for opcode, (decoder, template) in sorted(D.after_ED.items()):
+        if decoder in arg_kinds:
+            _add_pattern(patterns, fixed, (237, opcode), (), template, arg_kinds[decoder])
+    for prefix, reg in ((221, 'IX'), (253, 'IY')):
+        for opcode, (decoder, template) in sorted(D.after_DD.items()):
+            if decoder in arg_kinds:
+                _add_pattern(patterns, fixed, (prefix, opcode), (), template.replace('IX', reg), arg_kinds[decoder])
+        for opcode, (decoder, template) in sorted(D.after_DDCB.items()):
+            if template:
+                _add_pattern(patterns, fixed, (prefix, 203), (opcode,), template.replace('IX', reg), (_INDEX,))
+    return patterns, frozenset(fixed)
+
+def _normalise_operand(op):
+    # Return the pattern operand and the (unparsed) value of an operand
+    if op in _fixed_operands:
+        return op, None
+    if op.startswith(('(IX+', '(IX-', '(IY+', '(IY-')) and op.endswith(')'):
+        return op[:3] + '+D)', op
+    if op.startswith('(') and op.endswith(')'):
+        return '(N)', op[1:-1]
+    return 'N', op
+
+def _encode(kinds, encodings, values, address):
+    data = []
+    literals = []
+    for kind, value in zip(kinds, values):
+        if kind == _BYTE:
+            data.append(_parse_byte(value))
+        elif kind == _WORD:
+            addr = _parse_word(value)
+            data.extend((addr % 256, addr // 256))
+        elif kind == _JUMP:
+            data.append(_address_offset(address, value))
+        elif kind == _INDEX:
+            data.append(_parse_offset(value))
+        else:
+            literals.append(get_int_param(value))
+    prefix, suffix = encodings[tuple(literals)]
+    return prefix + tuple(data) + suffix
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _assemble_instruction(parts, address):
+    global _patterns, _fixed_operands
+    if _patterns is None:
+        _patterns, _fixed_operands = _build_patterns()
+    try:
+        operands = [_normalise_operand(op) for op in parts[1:]]
+        kinds, encodings = _patterns[parts[:1] + tuple(op for op, v in operands)]
+        return _encode(kinds, encodings, [v for op, v in operands if v is not None], address)
+    except:
+        pass
+    try:
+        a = MNEMONICS[parts[0]]
+        if isinstance(a, tuple):
+            if len(parts) == 1:
+                return a
+            return
+        return a(address, *parts[1:])
+    except:
+        return
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _normalise(operation):
+    return tuple(split_operation(operation, True))
+
 def _assemble(operation, address):
     if operation.upper().startswith(('DEFB ', 'DEFM ', 'DEFS ', 'DEFW ')):
         parts = split_operation(operation)
@@ -452,16 +584,10 @@ def _assemble(operation, address):
         if directive == 'DEFW':
             return _assemble_defw(items)
 
-    parts = split_operation(operation, True)
-    try:
-        a = MNEMONICS[parts[0]]
-        if isinstance(a, tuple):
-            if len(parts) == 1:
-                return a
-            return
-        return a(address, *parts[1:])
-    except:
-        return
+    parts = _normalise(operation)
+    if parts and parts[0] in RELATIVE:
+        return _assemble_instruction(parts, address)
+    return _assemble_instruction(parts, None)
 
 def split_operation(operation, tidy=False, strip=True):
     if tidy:
@@ -1,3 +1,4 @@
+from skoolkit import skoolmacro
 from skoolkit.skoolparser import BASE_10, BASE_16, CASE_LOWER, CASE_UPPER
 
 ERROR_PREFIX = 'Error while parsing #{} macro'
@@ -286,6 +287,32 @@ class CommonSkoolMacroTest:
 
         self._assert_error(writer, '#FOR0,1(n,n', 'No closing bracket: (n,n', prefix)
 
+    def test_macro_expansion_of_many_macros(self):
+        writer = self._get_writer(snapshot=list(range(256)) * 256)
+        output = writer.expand('#FOR0,999(n,#PEEKn,;)')
+        self.assertEqual(output, ';'.join(str(n % 256) for n in range(1000)))
+        output = writer.expand(' '.join('#PEEK{}'.format(n) for n in range(1000)))
+        self.assertEqual(output, ' '.join(str(n % 256) for n in range(1000)))
+
+    def test_macro_expansion_cache_is_bounded(self):
+        writer = self._get_writer(snapshot=[1])
+        for n in range(3):
+            self.assertEqual(writer.expand('#PEEK0 {}'.format(n)), '1 {}'.format(n))
+        cache_info = skoolmacro._find_cached_macros.cache_info()
+        self.assertEqual(cache_info.maxsize, skoolmacro.MACRO_CACHE_SIZE)
+        self.assertLessEqual(cache_info.currsize, cache_info.maxsize)
+
+    def test_macro_expansion_rescans_replacement_text(self):
+        writer = self._get_writer(snapshot=[1, 2, 3])
+        # A replacement that ends with a macro name
+        self.assertEqual(writer.expand('#IF(1)(#PEEK)2;'), '3;')
+        # A replacement that ends with '#'
+        self.assertEqual(writer.expand('#IF(1)(#)PEEK1;'), '2;')
+        # A replacement that follows '#'
+        self.assertEqual(writer.expand('##IF(1)(PEEK0);'), '1;')
+        # An empty replacement between '#' and a macro name
+        self.assertEqual(writer.expand('##IF(0)(x)PEEK2;'), '3;')
+
     def test_macro_foreach(self):
         writer = self._get_writer()
 
@@ -1982,6 +1982,29 @@ class DisassemblerTest(SkoolKitTestCase):
         self.assertEqual(defw.operation, 'DEFW 1,257,514,65283')
         self.assertEqual(defw.bytes, data)
 
+    def test_disassemble_with_different_bases(self):
+        snapshot = [62, 65, 221, 54, 255, 10]
+        disassembler = self._get_disassembler(snapshot)
+        self.assertEqual(disassembler.disassemble(0, 2)[0].operation, 'LD A,65')
+        self.assertEqual(disassembler.disassemble(0, 2, 'h')[0].operation, 'LD A,$41')
+        self.assertEqual(disassembler.disassemble(0, 2, 'c')[0].operation, 'LD A,"A"')
+        self.assertEqual(disassembler.disassemble(2, 6, 'dh')[0].operation, 'LD (IX-1),$0A')
+        self.assertEqual(disassembler.disassemble(2, 6, 'hd')[0].operation, 'LD (IX-$01),10')
+
+    def test_instruction_size(self):
+        snapshot = self._get_snapshot(65532, (221, 54, 0, 195))
+        disassembler = self._get_disassembler(snapshot)
+        self.assertEqual(disassembler.instruction_size(65532), 4)
+        self.assertEqual(disassembler.instruction_size(65535), 1)
+
+    def test_reset(self):
+        snapshot = [62, 65, 0]
+        disassembler = self._get_disassembler(snapshot)
+        self.assertEqual(disassembler.disassemble(0, 2)[0].operation, 'LD A,65')
+        snapshot[1] = 66
+        disassembler.reset(1, 2)
+        self.assertEqual(disassembler.disassemble(0, 2)[0].operation, 'LD A,66')
+
     def test_num_str(self):
         disassembler = self._get_disassembler(asm_hex=False)
         self.assertEqual(disassembler.num_str(123), '123')
@@ -0,0 +1,121 @@
+import unittest
+
+from skoolkittest import SkoolKitTestCase
+from skoolkit.graphicscan import Candidate, contact_sheet, scan_graphics
+
+SPRITE = (24, 60, 126, 219, 255, 126, 60, 24)
+
+MASK = (195, 129, 0, 0, 0, 0, 129, 195)
+
+def _font():
+    font = [0] * 768
+    for c in range(1, 96):
+        b = (c * 37) & 126 or 60
+        font[8 * c:8 * c + 8] = (0, b, b, b | 24, b, b, b, 0)
+    return font
+
+class GraphicScanTest(SkoolKitTestCase):
+    def _get_memory(self, *patches):
+        memory = bytearray(65536)
+        for address, data, step in patches:
+            memory[address:address + len(data) * step:step] = bytearray(data)
+        return bytes(memory)
+
+    def _test_candidate(self, candidate, kind, address, length, macro):
+        self.assertEqual(kind, candidate.kind)
+        self.assertEqual(address, candidate.address)
+        self.assertEqual(length, candidate.length)
+        self.assertEqual(macro, candidate.macro)
+
+    def test_udg(self):
+        memory = self._get_memory((40000, SPRITE, 1))
+        candidates = scan_graphics(memory)
+        self.assertEqual(1, len(candidates))
+        self._test_candidate(candidates[0], 'udg', 40000, 8, '#UDG40000')
+        self.assertEqual(SPRITE, tuple(candidates[0].data))
+
+    def test_masked_udgs(self):
+        layouts = (
+            (0, 1, 2, '#UDG30000,step=2:30001'),
+            (1, 0, 2, '#UDG30001,step=2:30000'),
+            (0, 8, 1, '#UDG30000:30008'),
+            (8, 0, 1, '#UDG30008:30000')
+        )
+        for g_off, m_off, step, macro in layouts:
+            memory = self._get_memory((30000 + g_off, SPRITE, step), (30000 + m_off, MASK, step))
+            candidates = scan_graphics(memory)
+            self.assertEqual(1, len(candidates))
+            self._test_candidate(candidates[0], 'masked', 30000, 16, macro)
+
+    def test_mask_that_clashes_with_graphic(self):
+        mask = (255,) * 8
+        memory = self._get_memory((30000, SPRITE, 1), (30008, mask, 1))
+        candidates = scan_graphics(memory)
+        self.assertEqual(1, len(candidates))
+        self._test_candidate(candidates[0], 'udg', 30000, 8, '#UDG30000')
+
+    def test_font(self):
+        font = _font()
+        memory = self._get_memory((50000, font, 1))
+        candidates = scan_graphics(memory, limit=1)
+        self.assertEqual(1, len(candidates))
+        self._test_candidate(candidates[0], 'font', 50000, 768, '#FONT50000')
+        self.assertEqual(font, list(candidates[0].data))
+
+    def test_candidates_are_ranked_and_do_not_overlap(self):
+        memory = self._get_memory((40000, SPRITE, 1), (45000, SPRITE, 2), (45001, MASK, 2), (50000, _font(), 1))
+        candidates = scan_graphics(memory)
+        self.assertEqual(['#FONT50000', '#UDG45000,step=2:45001', '#UDG40000'], [c.macro for c in candidates[:3]])
+        scores = [c.score for c in candidates]
+        self.assertEqual(sorted(scores, reverse=True), scores)
+        taken = set()
+        for c in candidates:
+            block = set(range(c.address, c.address + c.length))
+            self.assertFalse(taken & block)
+            taken.update(block)
+
+    def test_limit(self):
+        memory = self._get_memory((30000, SPRITE, 1), (40000, SPRITE, 1), (50000, SPRITE, 1))
+        self.assertEqual(3, len(scan_graphics(memory)))
+        self.assertEqual(2, len(scan_graphics(memory, limit=2)))
+
+    def test_start_and_end(self):
+        memory = self._get_memory((100, SPRITE, 1), (30000, SPRITE, 1), (65528, SPRITE, 1))
+        self.assertEqual([30000, 65528], sorted(c.address for c in scan_graphics(memory, 16384)))
+        self.assertEqual([100], [c.address for c in scan_graphics(memory, end=30000)])
+
+    def test_org(self):
+        candidates = scan_graphics(self._get_memory((100, SPRITE, 1))[:16384], org=49152)
+        self.assertEqual(1, len(candidates))
+        self._test_candidate(candidates[0], 'udg', 49252, 8, '#UDG49252')
+
+    def test_blank_memory(self):
+        self.assertEqual([], scan_graphics(bytes(65536)))
+        self.assertEqual([], scan_graphics(bytes([255]) * 65536))
+
+    def test_candidate_udgs(self):
+        candidate = Candidate('masked', 100, 30000, 16, 30001, 2, 30000, bytes(sum(zip(MASK, SPRITE), ())))
+        udgs = candidate.udgs(7)
+        self.assertEqual(1, len(udgs))
+        self.assertEqual(7, udgs[0].attr)
+        self.assertEqual(list(SPRITE), udgs[0].data)
+        self.assertEqual(list(MASK), udgs[0].mask)
+
+    def test_contact_sheet(self):
+        udg = Candidate('udg', 100, 30000, 8, 30000, 1, None, bytes(SPRITE))
+        font = Candidate('font', 200, 50000, 768, 50000, 1, None, bytes(_font()))
+        frame = contact_sheet([udg, font, udg], 16, 1)
+        self.assertEqual(8, len(frame.udgs))
+        self.assertEqual({16}, set(len(row) for row in frame.udgs))
+        self.assertEqual(list(SPRITE), frame.udgs[0][0].data)
+        self.assertEqual(40, frame.udgs[1][0].attr)
+        self.assertEqual(list(SPRITE), frame.udgs[7][0].data)
+        self.assertEqual(56, frame.udgs[7][0].attr)
+
+    def test_empty_contact_sheet(self):
+        frame = contact_sheet([])
+        self.assertEqual(1, len(frame.udgs))
+        self.assertEqual(2, frame.scale)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,7 @@ from skoolkittest import SkoolKitTestCase
 from skoolkit.image import (ImageWriter, DEFAULT_FORMAT,
                             PNG_COMPRESSION_LEVEL, PNG_ENABLE_ANIMATION,
                             PNG_ALPHA, GIF_ENABLE_ANIMATION, GIF_TRANSPARENCY)
+from skoolkit.gifwriter import GifWriter
 from skoolkit.graphics import Udg, Frame
 
 TRANSPARENT = [0, 254, 0]
@@ -1409,5 +1410,24 @@ class GifWriterTest(SkoolKitTestCase, ImageWriterTest):
             index += 64
         self._test_image([udgs], exp_clear_codes=2)
 
+    def test_lzw_encoders_are_equivalent(self):
+        gif_writer = GifWriter(0, None)
+        for min_code_size in (2, 3, 4):
+            num_colours = 1 << min_code_size
+            for pixels in (
+                    chr(1),
+                    chr(0) * 5000,
+                    ''.join([chr(n % num_colours) for n in range(9000)]),
+                    ''.join([chr((n * n + n // 7) % num_colours) for n in range(20000)]),
+                    ''.join([chr(int(b)) * (n % 9 + 1) for n, b in enumerate('{:b}'.format(3 ** 5000))])
+            ):
+                lzw_int = gif_writer._compress_int(pixels, min_code_size)
+                lzw_str = gif_writer._compress_str(pixels, min_code_size)
+                self.assertEqual(bytes(lzw_str), bytes(lzw_int))
+
+    def test_str_lzw_encoder(self):
+        self.assertEqual(GifWriter(0, None, False)._compress.__name__, '_compress_str')
+        self.assertEqual(GifWriter(0, None)._compress.__name__, '_compress_int')
+
 if __name__ == '__main__':
     unittest.main()
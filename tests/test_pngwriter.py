@@ -0,0 +1,70 @@
+import random
+import zlib
+
+from skoolkittest import SkoolKitTestCase
+from skoolkit.image import ImageWriter
+from skoolkit.graphics import Udg, Frame
+
+def _udgs(attrs, rows, masked=False):
+    udgs = []
+    for r in range(rows):
+        row = []
+        for i, attr in enumerate(attrs):
+            data = [random.randrange(256) for _ in range(8)]
+            if masked and (r + i) % 3:
+                row.append(Udg(attr, data, [random.randrange(256) for _ in range(8)]))
+            else:
+                row.append(Udg(attr, data))
+        udgs.append(row)
+    return udgs
+
+class PngWriterTest(SkoolKitTestCase):
+    def setUp(self):
+        SkoolKitTestCase.setUp(self)
+        random.seed(4)
+
+    def _compare_builders(self, attrs, exp_bit_depth, mask_type=0):
+        image_writer = ImageWriter()
+        png_writer = image_writer.writers['png']
+        mask = image_writer.masks[mask_type]
+        if mask_type:
+            bulk_method = png_writer._build_image_data_bulk_at
+        else:
+            bulk_method = png_writer._build_image_data_bulk_nt
+        self.assertIs(png_writer.png_method_dict[exp_bit_depth][1][int(mask_type > 0)].__func__, bulk_method.__func__)
+        for scale in (1, 2, 3):
+            udgs = _udgs(attrs, 3, mask_type > 0)
+            frame = Frame(udgs, scale, mask_type)
+            image_writer._get_colours(frame, True)
+            palette, frame.attr_map = image_writer._get_palette(frame.colours, frame.attrs, frame.has_trans)
+            bit_depth = png_writer._get_bit_depth(palette)[0]
+            self.assertEqual(bit_depth, exp_bit_depth)
+            exp_data = zlib.decompress(png_writer._build_image_data_bd_any(frame, mask, bit_depth))
+            self.assertEqual(exp_data, zlib.decompress(bulk_method(frame, mask, bit_depth)))
+
+    def test_bulk_builder_bd1(self):
+        self._compare_builders((56, 56, 184), 1)
+
+    def test_bulk_builder_bd1_or_mask(self):
+        self._compare_builders((0, 0, 128), 1, 1)
+
+    def test_bulk_builder_bd1_and_mask(self):
+        self._compare_builders((0, 0, 128), 1, 2)
+
+    def test_bulk_builder_bd2(self):
+        self._compare_builders((1, 19, 1, 19), 2)
+
+    def test_bulk_builder_bd2_or_mask(self):
+        self._compare_builders((56, 56, 184), 2, 1)
+
+    def test_bulk_builder_bd2_and_mask(self):
+        self._compare_builders((56, 56, 184), 2, 2)
+
+    def test_bulk_builder_bd4(self):
+        self._compare_builders((4, 13, 22, 31, 40, 49, 66, 139), 4)
+
+    def test_bulk_builder_bd4_or_mask(self):
+        self._compare_builders((4, 13, 22, 31, 40, 49, 66, 139), 4, 1)
+
+    def test_bulk_builder_bd4_and_mask(self):
+        self._compare_builders((4, 13, 22, 31, 40, 49, 66, 139), 4, 2)
@@ -0,0 +1,50 @@
+import unittest
+
+from skoolkittest import SkoolKitTestCase
+from skoolkit.search import find_patterns
+
+class FindPatternsTest(SkoolKitTestCase):
+    def _get_memory(self, *patches):
+        memory = bytearray(65536)
+        for address, data, step in patches:
+            memory[address:address + len(data) * step:step] = bytearray(data)
+        return bytes(memory)
+
+    def test_single_pattern(self):
+        memory = self._get_memory((30000, (1, 2, 3), 1), (40000, (1, 2, 3), 1))
+        self.assertEqual([(30000, 1, 0), (40000, 1, 0)], find_patterns(memory, [(1, 2, 3)]))
+
+    def test_overlapping_matches(self):
+        memory = self._get_memory((30000, (7, 7, 7, 7), 1))
+        self.assertEqual([(30000, 1, 0), (30001, 1, 0), (30002, 1, 0)], find_patterns(memory, [(7, 7)]))
+
+    def test_multiple_patterns(self):
+        memory = self._get_memory((30000, (1, 2, 3, 4), 1), (50000, (5, 6), 1))
+        patterns = [(5, 6), (1, 2), (1, 2, 3), (2, 3, 4)]
+        exp_matches = [(30000, 1, 1), (30000, 1, 2), (30001, 1, 3), (50000, 1, 0)]
+        self.assertEqual(exp_matches, find_patterns(memory, patterns))
+
+    def test_steps(self):
+        memory = self._get_memory((30000, (1, 2, 3), 2), (40001, (1, 2, 3), 3), (50002, (4, 5), 3))
+        exp_matches = [(30000, 2, 0), (40001, 3, 0), (50002, 3, 1)]
+        self.assertEqual(exp_matches, find_patterns(memory, [(1, 2, 3), (4, 5)], range(2, 4)))
+
+    def test_start_and_end(self):
+        memory = self._get_memory((100, (9, 8), 1), (30000, (9, 8), 1), (65534, (9, 8), 1))
+        self.assertEqual([(30000, 1, 0), (65534, 1, 0)], find_patterns(memory, [(9, 8)], start=16384))
+        self.assertEqual([(100, 1, 0)], find_patterns(memory, [(9, 8)], end=30001))
+
+    def test_last_byte_must_be_a_step_before_end(self):
+        memory = self._get_memory((65531, (1, 2, 3), 2))
+        self.assertEqual([], find_patterns(memory, [(1, 2, 3)], [2]))
+
+    def test_unmatchable_patterns(self):
+        memory = self._get_memory((30000, (1, 2), 1))
+        self.assertEqual([(30000, 1, 1)], find_patterns(memory, [(256, 1), (1, 2), (-1,)]))
+        self.assertEqual([], find_patterns(memory, [(1, 2)], [0]))
+
+    def test_no_matches(self):
+        self.assertEqual([], find_patterns(bytes(65536), [(1,), (2, 3)], range(1, 5)))
+
+if __name__ == '__main__':
+    unittest.main()
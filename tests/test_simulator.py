@@ -0,0 +1,224 @@
+import unittest
+
+from skoolkittest import SkoolKitTestCase
+from skoolkit.simulator import Simulator, INTERRUPT_INTERVAL
+
+class SimulatorTest(SkoolKitTestCase):
+    def _run(self, code, start=32768, stop=None, registers=None, memory=None, max_operations=0):
+        if memory is None:
+            memory = [0] * 65536
+        memory[start:start + len(code)] = code
+        simulator = Simulator(memory, registers)
+        if stop is None:
+            stop = start + len(code)
+        simulator.run(start, stop, max_operations)
+        return simulator
+
+    def _check_registers(self, simulator, **registers):
+        actual = simulator.get_registers()
+        for reg, value in registers.items():
+            self.assertEqual(actual[reg], value, 'Register {}'.format(reg))
+
+    def test_ld_and_add(self):
+        simulator = self._run([
+            62, 5,    # LD A,5
+            198, 250, # ADD A,250
+        ])
+        self._check_registers(simulator, a=255, f=0xA8, pc=32772)
+
+    def test_add_with_overflow_and_half_carry(self):
+        simulator = self._run([
+            62, 127,  # LD A,127
+            198, 1,   # ADD A,1
+        ])
+        self._check_registers(simulator, a=128, f=0x94)
+
+    def test_sub_with_borrow(self):
+        simulator = self._run([
+            175,      # XOR A
+            214, 1,   # SUB 1
+        ])
+        self._check_registers(simulator, a=255, f=0xBB)
+
+    def test_cp(self):
+        simulator = self._run([
+            62, 5,    # LD A,5
+            254, 5,   # CP 5
+        ])
+        self._check_registers(simulator, a=5, f=0x42)
+
+    def test_inc_preserves_carry_flag(self):
+        simulator = self._run([
+            55,       # SCF
+            6, 255,   # LD B,255
+            4,        # INC B
+        ])
+        self._check_registers(simulator, b=0, f=0x51)
+
+    def test_neg(self):
+        simulator = self._run([
+            62, 1,    # LD A,1
+            237, 68,  # NEG
+        ])
+        self._check_registers(simulator, a=255, f=0xBB)
+
+    def test_daa(self):
+        simulator = self._run([
+            62, 9,    # LD A,9
+            198, 1,   # ADD A,1
+            39,       # DAA
+        ])
+        self._check_registers(simulator, a=16, f=0x10)
+
+    def test_sbc_hl(self):
+        simulator = self._run([
+            33, 0, 16,  # LD HL,4096
+            17, 1, 0,   # LD DE,1
+            167,        # AND A
+            237, 82,    # SBC HL,DE
+        ])
+        self._check_registers(simulator, hl=4095, f=0x1A)
+
+    def test_rlc(self):
+        simulator = self._run([
+            62, 129,  # LD A,129
+            203, 7,   # RLC A
+        ])
+        self._check_registers(simulator, a=3, f=0x05)
+
+    def test_djnz(self):
+        simulator = self._run([
+            6, 3,     # LD B,3
+            60,       # INC A
+            16, 253,  # DJNZ 32770
+        ])
+        self._check_registers(simulator, a=3, b=0)
+
+    def test_call_and_ret(self):
+        simulator = self._run([
+            49, 64, 156,    # 32768 LD SP,40000
+            205, 9, 128,    # 32771 CALL 32777
+            71,             # 32774 LD B,A
+            24, 3,          # 32775 JR 32780
+            62, 9,          # 32777 LD A,9
+            201,            # 32779 RET
+        ], stop=32780)
+        self._check_registers(simulator, b=9, sp=40000)
+
+    def test_push_and_pop(self):
+        simulator = self._run([
+            49, 64, 156,    # LD SP,40000
+            1, 52, 18,      # LD BC,4660
+            197,            # PUSH BC
+            209,            # POP DE
+        ])
+        self._check_registers(simulator, de=4660, sp=40000)
+        self.assertEqual(simulator.memory[39998:40000], bytearray((52, 18)))
+
+    def test_exx_and_ex_af(self):
+        simulator = self._run([
+            1, 1, 0,        # LD BC,1
+            217,            # EXX
+            1, 2, 0,        # LD BC,2
+            62, 3,          # LD A,3
+            8,              # EX AF,AF'
+        ])
+        self._check_registers(simulator, bc=2, **{'^bc': 1, '^a': 3, 'a': 0})
+
+    def test_ldir(self):
+        memory = [0] * 65536
+        memory[40000:40004] = [1, 2, 3, 4]
+        simulator = self._run([
+            33, 64, 156,    # LD HL,40000
+            17, 40, 160,    # LD DE,41000
+            1, 4, 0,        # LD BC,4
+            237, 176,       # LDIR
+        ], memory=memory)
+        self.assertEqual(simulator.memory[41000:41004], bytearray((1, 2, 3, 4)))
+        self._check_registers(simulator, hl=40004, de=41004, bc=0)
+
+    def test_index_registers(self):
+        simulator = self._run([
+            221, 33, 64, 156,   # LD IX,40000
+            221, 54, 2, 7,      # LD (IX+2),7
+            221, 126, 2,        # LD A,(IX+2)
+            253, 33, 66, 156,   # LD IY,40002
+            253, 52, 254,       # INC (IY-2)
+            221, 203, 1, 222,   # SET 3,(IX+1)
+        ])
+        self._check_registers(simulator, a=7, ix=40000, iy=40002)
+        self.assertEqual(simulator.memory[40000:40003], bytearray((1, 8, 7)))
+
+    def test_rom_is_write_protected(self):
+        simulator = self._run([
+            62, 1,          # LD A,1
+            50, 100, 0,     # LD (100),A
+        ])
+        self.assertEqual(simulator.memory[100], 0)
+
+    def test_code_map(self):
+        simulator = self._run([
+            62, 1,          # 32768 LD A,1
+            24, 1,          # 32770 JR 32773
+            0,              # 32772 NOP
+            201,            # 32773 RET
+        ], stop=32773)
+        executed = [a for a in range(65536) if simulator.code_map[a]]
+        self.assertEqual([32768, 32770], executed)
+
+    def test_max_operations(self):
+        simulator = self._run([
+            60,             # 32768 INC A
+            24, 253,        # 32769 JR 32768
+        ], max_operations=5)
+        self._check_registers(simulator, a=3, pc=32769)
+        self.assertEqual(simulator.operations, 5)
+
+    def test_im1_interrupt(self):
+        simulator = self._run([
+            49, 64, 156,    # 32768 LD SP,40000
+            237, 86,        # 32771 IM 1
+            251,            # 32773 EI
+            118,            # 32774 HALT
+        ], stop=56)
+        self._check_registers(simulator, sp=39998, iff=0)
+        self.assertEqual(simulator.memory[39998:40000], bytearray((7, 128)))
+
+    def test_im2_interrupt(self):
+        memory = [0] * 65536
+        memory[65023:65025] = [0, 144]
+        simulator = self._run([
+            49, 64, 156,    # 32768 LD SP,40000
+            62, 253,        # 32771 LD A,253
+            237, 71,        # 32773 LD I,A
+            237, 94,        # 32775 IM 2
+            251,            # 32777 EI
+            118,            # 32778 HALT
+        ], stop=36864, memory=memory)
+        self.assertEqual(simulator.pc, 36864)
+        self.assertEqual(simulator.memory[39998:40000], bytearray((11, 128)))
+
+    def test_halt_with_interrupts_disabled(self):
+        simulator = self._run([
+            243,            # 32768 DI
+            118,            # 32769 HALT
+        ], stop=-1)
+        self.assertEqual(simulator.pc, 32769)
+        self.assertEqual(simulator.operations, INTERRUPT_INTERVAL)
+
+    def test_set_registers(self):
+        registers = {'a': 1, 'f': 2, 'bc': 770, 'de': 1284, 'hl': 1798, 'ix': 2312, 'iy': 2826, 'sp': 3340, 'i': 14, 'r': 143}
+        simulator = Simulator([0] * 65536, registers)
+        self._check_registers(simulator, **registers)
+
+    def test_ld_a_r(self):
+        simulator = self._run([
+            62, 128,        # LD A,128
+            237, 79,        # LD R,A
+            0,              # NOP
+            237, 95,        # LD A,R
+        ])
+        self._check_registers(simulator, a=131)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,7 +13,7 @@ def mock_run(*args):
 
 class MockSkoolParser:
     def __init__(self, skoolfile, case, base, asm_mode, warnings, fix_mode, html,
-                 create_labels, asm_labels, min_address, max_address):
+                 create_labels, asm_labels, min_address, max_address, stream=False, cache_dir=None):
         global mock_skool_parser
         mock_skool_parser = self
         self.skoolfile = skoolfile
@@ -27,6 +27,8 @@ class MockSkoolParser:
         self.asm_labels = asm_labels
         self.min_address = min_address
         self.max_address = max_address
+        self.stream = stream
+        self.cache_dir = cache_dir
         self.properties = {}
         self.asm_writer_class = ''
 
@@ -38,9 +40,13 @@ class MockAsmWriter:
         self.properties = properties
         self.lower = lower
         self.wrote = False
+        self.outfile = None
+        self.jobs = None
 
-    def write(self):
+    def write(self, outfile=None, jobs=1):
         self.wrote = True
+        self.outfile = outfile
+        self.jobs = jobs
 
 class Skool2AsmTest(SkoolKitTestCase):
     def setUp(self):
@@ -65,6 +71,10 @@ class Skool2AsmTest(SkoolKitTestCase):
         self.assertFalse(options.create_labels)
         self.assertEqual(options.start, 0)
         self.assertEqual(options.end, 65536)
+        self.assertFalse(options.stream)
+        self.assertIsNone(options.parse_cache)
+        self.assertIsNone(options.output)
+        self.assertEqual(options.jobs, 1)
 
     @patch.object(skool2asm, 'SkoolParser', MockSkoolParser)
     @patch.object(skool2asm, 'AsmWriter', MockAsmWriter)
@@ -83,6 +93,8 @@ class Skool2AsmTest(SkoolKitTestCase):
         self.assertTrue(mock_skool_parser.asm_labels)
         self.assertEqual(mock_skool_parser.min_address, 0)
         self.assertEqual(mock_skool_parser.max_address, 65536)
+        self.assertFalse(mock_skool_parser.stream)
+        self.assertIsNone(mock_skool_parser.cache_dir)
 
         self.assertIs(mock_asm_writer.parser, mock_skool_parser)
         self.assertFalse(mock_asm_writer.lower)
@@ -100,7 +112,7 @@ class Skool2AsmTest(SkoolKitTestCase):
         self.assertTrue(error.startswith('usage: skool2asm.py'))
 
     def test_invalid_option_value(self):
-        for args in ('-i ABC', '-f +'):
+        for args in ('-i ABC', '-f +', '-v f4', '-v x'):
             output, error = self.run_skool2asm(args, catch_exit=2)
             self.assertEqual(len(output), 0)
             self.assertTrue(error.startswith('usage: skool2asm.py'))
@@ -262,6 +274,230 @@ class Skool2AsmTest(SkoolKitTestCase):
             mock_skool_parser.create_labels = None
             mock_asm_writer.wrote = False
 
+    @patch.object(skool2asm, 'SkoolParser', MockSkoolParser)
+    @patch.object(skool2asm, 'AsmWriter', MockAsmWriter)
+    def test_option_k(self):
+        cache_dir = 'cache'
+        for option in ('-k', '--parse-cache'):
+            output, error = self.run_skool2asm('-q {} {} test-k.skool'.format(option, cache_dir))
+            self.assertEqual(mock_skool_parser.cache_dir, cache_dir)
+            self.assertTrue(mock_asm_writer.wrote)
+
+    def test_option_k_output(self):
+        skool = '\n'.join((
+            '@start',
+            '; Routine',
+            ';',
+            '; Used by the routine at #R32768.',
+            'c32768 LD A,B  ; Load A',
+            ' 32769 JR 32768',
+            '',
+            '; Data',
+            'b32771 DEFB 1,2,3',
+            ' 32774 DEFW 32768',
+        ))
+        skoolfile = self.write_text_file(skool, suffix='.skool')
+        cache_dir = self.make_directory()
+        exp_output, exp_error = self.run_skool2asm('-q {}'.format(skoolfile))
+        for i in range(2):
+            output, error = self.run_skool2asm('-q -k {} {}'.format(cache_dir, skoolfile))
+            self.assertEqual(exp_output, output)
+            self.assertEqual(exp_error, error)
+        self.assertTrue(exp_error)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+    @patch.object(skool2asm, 'SkoolParser', MockSkoolParser)
+    @patch.object(skool2asm, 'AsmWriter', MockAsmWriter)
+    def test_option_J(self):
+        for option in ('-J', '--jobs'):
+            output, error = self.run_skool2asm('-q {} 4 test-J.skool'.format(option))
+            self.assertTrue(mock_asm_writer.wrote)
+            self.assertEqual(mock_asm_writer.jobs, 4)
+
+    @patch.object(skool2asm, 'SkoolParser', MockSkoolParser)
+    @patch.object(skool2asm, 'AsmWriter', MockAsmWriter)
+    def test_option_J_with_option_M(self):
+        output, error = self.run_skool2asm('-q -J 4 -M test-J.skool')
+        self.assertTrue(mock_asm_writer.wrote)
+        self.assertEqual(mock_asm_writer.jobs, 1)
+
+    def test_option_o(self):
+        skool = '\n'.join((
+            '@start',
+            '; Routine',
+            'c32768 XOR A',
+            ' 32769 RET'
+        ))
+        skoolfile = self.write_text_file(skool, suffix='.skool')
+        exp_asm = '; Routine\n  XOR A\n  RET\n\n'
+        for option in ('-o', '--output'):
+            asmfile = self.write_text_file(suffix='.asm')
+            output, error = self.run_skool2asm('{} {} {}'.format(option, asmfile, skoolfile), err_lines=True)
+            self.assertEqual([], output)
+            self.assertTrue(error[1].startswith('Wrote ASM to {} ('.format(asmfile)))
+            with open(asmfile) as f:
+                self.assertEqual(exp_asm, f.read())
+
+    def test_option_o_with_crlf_property(self):
+        skool = '\n'.join((
+            '@start',
+            '@set-crlf=1',
+            '; Routine',
+            'c32768 RET'
+        ))
+        skoolfile = self.write_text_file(skool, suffix='.skool')
+        asmfile = self.write_text_file(suffix='.asm')
+        self.run_skool2asm('-q -o {} {}'.format(asmfile, skoolfile))
+        with open(asmfile, 'rb') as f:
+            self.assertEqual(b'; Routine\r\n  RET\r\n\r\n', f.read())
+
+    def test_option_v(self):
+        skool = '\n'.join((
+            '@start',
+            '; Routine',
+            ';',
+            '; .',
+            ';',
+            '; A Value',
+            '@label=START',
+            'c32768 LD A,1',
+            '@ssub=JR 32768+1',
+            ' 32770 JR 32768',
+            '@ofix=LD B,2',
+            ' 32772 LD B,1',
+            '@rsub+begin',
+            '       LD C,$0A',
+            '@rsub+end',
+            ' 32774 CALL 32768',
+            '',
+            '; Data',
+            'b32777 DEFW 32768',
+        ))
+        skoolfile = self.write_text_file(skool, suffix='.skool')
+        root = os.path.join(self.make_directory(), 'game')
+        variants = {
+            'f0': '',
+            'lH': '-l -H',
+            'uD': '-u -D',
+            'f1s': '-f 1 -s',
+            'rl': '-r -l',
+            'f3uH': '-f 3 -u -H'
+        }
+        for option in ('-v', '--variant'):
+            args = ' '.join('{} {}'.format(option, spec) for spec in variants)
+            asmfile = root + '.asm'
+            output, error = self.run_skool2asm('-c {} -o {} {}'.format(args, asmfile, skoolfile), err_lines=True)
+            self.assertEqual([], output)
+            self.assertEqual(12, len(error))
+            self.assertTrue(error[0].startswith('Parsed {} (f0) ('.format(skoolfile)))
+            self.assertTrue(error[1].startswith('Wrote ASM to {}-f0.asm ('.format(root)))
+            self.assertTrue(error[2].startswith('Converted {} (lH) ('.format(skoolfile)))
+            for spec, options in variants.items():
+                exp_asm, error = self.run_skool2asm('-q -c {} {}'.format(options, skoolfile), out_lines=False)
+                with open('{}-{}.asm'.format(root, spec)) as f:
+                    self.assertEqual(exp_asm, f.read())
+
+    def test_option_v_without_option_o(self):
+        skool = '@start\n; Routine\nc32768 RET'
+        self.write_text_file(skool, 'test-v.skool')
+        self.tempfiles.extend(('test-v-l.asm', 'test-v-H.asm'))
+        output, error = self.run_skool2asm('-q -v l -v H test-v.skool')
+        self.assertEqual([], output)
+        with open('test-v-l.asm') as f:
+            self.assertEqual('; Routine\n  ret\n\n', f.read())
+        with open('test-v-H.asm') as f:
+            self.assertEqual('; Routine\n  RET\n\n', f.read())
+
+    def test_option_v_with_stdin(self):
+        self.write_stdin('@start\n; Routine\nc32768 RET')
+        asmfile = os.path.join(self.make_directory(), 'game.asm')
+        output, error = self.run_skool2asm('-q -v l -v uH -o {} -'.format(asmfile))
+        with open(asmfile[:-4] + '-uH.asm') as f:
+            self.assertEqual('; Routine\n  RET\n\n', f.read())
+
+        self.write_stdin('@start\n; Routine\nc32768 RET')
+        with self.assertRaisesRegex(SkoolKitError, 'Cannot read standard input more than once for variants with different substitution or fix modes'):
+            self.run_skool2asm('-q -v l -v s -o {} -'.format(asmfile))
+
+    @patch.object(skool2asm, 'SkoolParser', MockSkoolParser)
+    @patch.object(skool2asm, 'AsmWriter', MockAsmWriter)
+    def test_option_M(self):
+        for option in ('-M', '--stream'):
+            output, error = self.run_skool2asm('-q {} test-M.skool'.format(option))
+            self.assertTrue(mock_skool_parser.stream)
+            self.assertTrue(mock_asm_writer.wrote)
+
+    def test_option_M_output(self):
+        skool = '\n'.join((
+            '; Header comment',
+            ';',
+            '; More header',
+            '',
+            '@start',
+            '@replace=/#foo/bar',
+            '@equ=ATTRS=22528',
+            '; Routine at 30000',
+            ';',
+            '; Used by the routines at #R30010 and #R30020. #foo',
+            '; #FOREACH(REF30000)(x,#Rx, )',
+            ';',
+            '; A Accumulator',
+            '; .',
+            '; B Counter',
+            '@label=START',
+            'c30000 LD A,(30020)   ; {Load #foo #R30010',
+            ' 30003 JR 30006       ; }',
+            '@nowarn',
+            '*30005 LD HL,30013    ; Point HL',
+            '*30008 JP 30000       ; Loop #D30000',
+            '; Mid comment',
+            ' 30011 LD (22528),A',
+            ' 30014 RET',
+            '; End comment #foo',
+            '',
+            '; Data block',
+            '@label=DATA',
+            'b30015 DEFB 1,2,3     ; Data',
+            '@ssub=DEFW 30000+1',
+            ' 30018 DEFW 30000',
+            '; Unused',
+            'u30020 DEFS 5',
+            'd30025 DEFB 7',
+            ' 30026 DEFB 8',
+            'c30027 CALL 30000     ; Go #PEEK30025',
+            '@rsub-begin',
+            ' 30030 LD BC,30000',
+            '@rsub+else',
+            ' 30030 LD BC,START',
+            '@rsub+end',
+            '@ofix-begin',
+            ' 30033 RET',
+            '@ofix+else',
+            ' 30033 JP 30005',
+            '@ofix+end',
+            '',
+            'r$C000 ROM',
+            '',
+            '; Routine',
+            'c30036 CALL 49152',
+            ' 30039 JP 30008  ; {Multi',
+            '                 ; line',
+            ' 30042 RET       ; }',
+            '@replace=/#bar/baz',
+            '; Last #bar',
+            'c30043 JR 30043',
+            '',
+            '; Out of range',
+            'c40000 JP 30000'
+        ))
+        skoolfile = self.write_text_file(skool, suffix='.skool')
+        for args in ('', '-s', '-r', '-f 3', '-l -c', '-u -H', '-D', '-S 30015', '-E 30036', '-S 30010 -E 30040'):
+            exp_output, exp_error = self.run_skool2asm('-q {} {}'.format(args, skoolfile))
+            for option in ('-M', '--stream'):
+                output, error = self.run_skool2asm('-q {} {} {}'.format(option, args, skoolfile))
+                self.assertEqual(exp_output, output)
+                self.assertEqual(sorted(exp_error.split('\n')), sorted(error.split('\n')))
+
     def test_writer(self):
         skool = '\n'.join((
             '@start',
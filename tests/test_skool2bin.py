@@ -1,5 +1,6 @@
 import unittest
-from unittest.mock import patch
+from io import BytesIO
+from unittest.mock import patch, Mock
 
 from skoolkittest import SkoolKitTestCase
 from skoolkit import SkoolKitError, VERSION, skool2bin
@@ -14,11 +15,17 @@ class MockBinWriter:
         self.binfile = None
         self.start = None
         self.end = None
+        self.writes = []
+        self.mapfile = None
 
     def write(self, binfile, start, end):
         self.binfile = binfile
         self.start = start
         self.end = end
+        self.writes.append((binfile, start, end))
+
+    def write_map(self, mapfile):
+        self.mapfile = mapfile
 
 class Skool2BinTest(SkoolKitTestCase):
     def test_no_arguments(self):
@@ -33,7 +40,7 @@ class Skool2BinTest(SkoolKitTestCase):
 
     def test_invalid_option_value(self):
         skoolfile = self.write_text_file(suffix='.skool')
-        for option in ('-E ABC', '-S ='):
+        for option in ('-E ABC', '-S =', '-r 1,2', '-r x,2,f.bin'):
             output, error = self.run_skool2bin('{} {}'.format(option, skoolfile), catch_exit=2)
             self.assertEqual(len(output), 0)
             self.assertTrue(error.startswith('usage: skool2bin.py'))
@@ -50,6 +57,7 @@ class Skool2BinTest(SkoolKitTestCase):
         self.assertEqual(mock_bin_writer.binfile, exp_binfile)
         self.assertIsNone(mock_bin_writer.start)
         self.assertIsNone(mock_bin_writer.end)
+        self.assertIsNone(mock_bin_writer.mapfile)
 
     @patch.object(skool2bin, 'BinWriter', MockBinWriter)
     def test_nonstandard_skool_name(self):
@@ -115,6 +123,16 @@ class Skool2BinTest(SkoolKitTestCase):
             self.assertIsNone(mock_bin_writer.start)
             self.assertIsNone(mock_bin_writer.end)
 
+    @patch.object(skool2bin, 'BinWriter', MockBinWriter)
+    def test_option_m(self):
+        skoolfile = 'test-m.skool'
+        exp_binfile = skoolfile[:-6] + '.bin'
+        for option in ('-m', '--map'):
+            output, error = self.run_skool2bin('{} test.map {}'.format(option, skoolfile))
+            self.assertEqual(len(error), 0)
+            self.assertEqual(mock_bin_writer.binfile, exp_binfile)
+            self.assertEqual(mock_bin_writer.mapfile, 'test.map')
+
     @patch.object(skool2bin, 'BinWriter', MockBinWriter)
     def test_option_o(self):
         skoolfile = 'test-o.skool'
@@ -129,6 +147,14 @@ class Skool2BinTest(SkoolKitTestCase):
             self.assertIsNone(mock_bin_writer.start)
             self.assertIsNone(mock_bin_writer.end)
 
+    @patch.object(skool2bin, 'BinWriter', MockBinWriter)
+    def test_option_r(self):
+        skoolfile = 'test-r.skool'
+        for option in ('-r', '--region'):
+            output, error = self.run_skool2bin('{0} 32768,32800,a.bin {0} $9000,$9100,b.bin {1}'.format(option, skoolfile))
+            self.assertEqual(len(error), 0)
+            self.assertEqual([('a.bin', 32768, 32800), ('b.bin', 36864, 37120)], mock_bin_writer.writes)
+
     @patch.object(skool2bin, 'BinWriter', MockBinWriter)
     def test_option_s(self):
         skoolfile = 'test-s.skool'
@@ -157,6 +183,46 @@ class Skool2BinTest(SkoolKitTestCase):
             self.assertEqual(mock_bin_writer.start, value)
             self.assertIsNone(mock_bin_writer.end)
 
+    def test_option_m_with_stdout(self):
+        skool = '\n'.join((
+            '@label=START',
+            'c50000 XOR A',
+            '@label=END',
+            ' 50001 RET',
+        ))
+        skoolfile = self.write_text_file(skool, suffix='.skool')
+        binfile = skoolfile[:-6] + '.bin'
+        self.tempfiles.append(binfile)
+        output, error = self.run_skool2bin('-m - {} {}'.format(skoolfile, binfile), err_lines=True)
+        self.assertEqual(['START EQU 50000', 'END EQU 50001'], output)
+        self.assertEqual('Wrote stdout: 2 labels', error[-1])
+
+    def test_option_m_with_stdout_and_binary_file_to_stdout(self):
+        for args in ('test-m.skool -', '-r 30000,30002,- test-m.skool', '-r 30000,30002,a.bin -r 40000,40002,- test-m.skool'):
+            with self.assertRaisesRegex(SkoolKitError, '^The map file and the binary file cannot both be written to standard output$'):
+                self.run_skool2bin('-m - {}'.format(args))
+
+    def test_option_r_with_start_end_or_binfile(self):
+        for args in ('-S 30000 test-r.skool', '-E 40000 test-r.skool', 'test-r.skool test-r.bin'):
+            with self.assertRaisesRegex(SkoolKitError, "--region cannot be used with --start, --end or 'file.bin'"):
+                self.run_skool2bin('-r 30000,30002,a.bin {}'.format(args))
+
+    def test_write_regions(self):
+        skool = '\n'.join((
+            'c30000 LD A,C',
+            ' 30001 RET',
+            '',
+            'c40000 XOR B',
+            ' 40001 RET'
+        ))
+        skoolfile = self.write_text_file(skool, suffix='.skool')
+        binfiles = [skoolfile[:-6] + '-{}.bin'.format(n) for n in range(2)]
+        self.tempfiles.extend(binfiles)
+        self.run_skool2bin('-r 30000,30002,{} -r 40000,40002,{} {}'.format(binfiles[0], binfiles[1], skoolfile))
+        for binfile, exp_data in zip(binfiles, ([121, 201], [168, 201])):
+            with open(binfile, 'rb') as f:
+                self.assertEqual(exp_data, list(f.read()))
+
     def test_option_V(self):
         for option in ('-V', '--version'):
             output, error = self.run_skool2bin(option, err_lines=True, catch_exit=0)
@@ -242,6 +308,16 @@ class BinWriterTest(SkoolKitTestCase):
         self.assertEqual(self.out.getvalue(), b'abc')
         self.assertEqual(self.err.getvalue(), "Wrote stdout: start=30000, end=30003, size=3\n")
 
+    def test_regions_to_stdout(self):
+        skoolfile = self.write_text_file('t30000 DEFM "abc"', suffix='.skool')
+        bin_writer = skool2bin.BinWriter(skoolfile)
+        stdout = BytesIO()
+        with patch.object(skool2bin, 'open_file', Mock(return_value=stdout)):
+            bin_writer.write('-', 30000, 30001)
+            bin_writer.write('-', 30001, 30003)
+        self.assertFalse(stdout.closed)
+        self.assertEqual(stdout.getvalue(), b'abc')
+
     def test_start_address(self):
         skool = '\n'.join((
             'c50000 LD A,C',
@@ -373,5 +449,134 @@ class BinWriterTest(SkoolKitTestCase):
         exp_data = [6, 2]
         self._test_write(skool, 30000, exp_data, fix_mode=2)
 
+    def test_labels(self):
+        skool = '\n'.join((
+            '@label=START',
+            'c30000 LD HL,30008',
+            '@ssub=LD DE,TABLE+2',
+            ' 30003 LD DE,30015',
+            '@label=LOOP',
+            ' 30006 JR NZ,30006',
+            '@ssub=JR NZ,LOOP',
+            ' 30008 JR 30000',
+            '@ssub=LD A,(TABLE-$01)',
+            ' 30010 LD A,(30012)',
+            '',
+            '@label=TABLE',
+            'b30013 DEFB 1,2,3'
+        ))
+        exp_data = [33, 56, 117, 17, 63, 117, 32, 254, 32, 252, 58, 60, 117, 1, 2, 3]
+        self._test_write(skool, 30000, exp_data, asm_mode=2)
+
+    def test_labels_on_skipped_entries(self):
+        skool = '\n'.join((
+            '@label=DATA',
+            'd40000 DEFB 1',
+            '',
+            '@label=SPACE',
+            'r40001 DEFS 9',
+            '',
+            '@label=START',
+            'c40010 LD HL,DATA',
+            ' 40013 LD DE,SPACE',
+            ' 40016 JP START'
+        ))
+        exp_data = [33, 64, 156, 17, 65, 156, 195, 74, 156]
+        self._test_write(skool, 40010, exp_data)
+
+    def test_label_on_skipped_entry_with_invalid_address(self):
+        skool = '\n'.join((
+            '@label=DATA',
+            'd4000x DEFB 1',
+            '',
+            '@label=START',
+            'c40010 JP START'
+        ))
+        exp_err = ['WARNING: Ignoring label (DATA) on line with invalid address:', 'd4000x DEFB 1']
+        self._test_write(skool, 40010, [195, 74, 156], exp_err)
+
+    def test_label_on_instruction_excluded_by_fix_mode(self):
+        skool = '\n'.join((
+            '@label=START',
+            '@ofix-begin',
+            'c40000 LD A,1',
+            '@ofix+else',
+            'c40000 LD A,2',
+            '@ofix+end',
+            '@label=NEXT',
+            ' 40002 JR START',
+            ' 40004 JP NEXT'
+        ))
+        self._test_write(skool, 40000, [62, 2, 24, 252, 195, 66, 156], fix_mode=1)
+
+    def test_undefined_label(self):
+        skool = '\n'.join((
+            '@label=START',
+            'c40000 XOR A',
+            '@ssub=JP BEGIN',
+            ' 40001 JP 40000',
+            ' 40004 RET'
+        ))
+        exp_err = ['WARNING: Failed to assemble:', ' 40001 JP BEGIN']
+        self._test_write(skool, 40000, [175, 0, 0, 0, 201], exp_err, asm_mode=2)
+
+    def test_labels_in_defw_and_defb_directives(self):
+        skool = '\n'.join((
+            '@label=START',
+            'c30000 XOR A',
+            '@label=LOOP',
+            ' 30001 RET',
+            '',
+            '@ssub=DEFW TABLE,LOOP+1',
+            'b30002 DEFW 0,0',
+            '@ssub=DEFB 1,LOOP-30000',
+            ' 30006 DEFB 0,0',
+            '',
+            '@label=TABLE',
+            'b30008 DEFB 9'
+        ))
+        exp_data = [175, 201, 56, 117, 50, 117, 1, 1, 9]
+        self._test_write(skool, 30000, exp_data, asm_mode=2)
+
+    def test_unresolved_label_in_defw_directive(self):
+        skool = '\n'.join((
+            '@label=START',
+            'c30000 RET',
+            '@ssub=DEFW START,TABLE',
+            ' 30001 DEFW 0,0',
+        ))
+        exp_err = ['WARNING: Unresolved label (TABLE):', ' 30001 DEFW START,TABLE']
+        self._test_write(skool, 30000, [201, 48, 117, 0, 0], exp_err, asm_mode=2)
+
+    def test_duplicate_label(self):
+        skool = '\n'.join((
+            '@label=START',
+            'c40000 XOR A',
+            '@label=START',
+            ' 40001 RET',
+            '@ssub=JP START',
+            ' 40002 JP 40001'
+        ))
+        exp_err = ['WARNING: Duplicate label: START']
+        self._test_write(skool, 40000, [175, 201, 195, 64, 156], exp_err, asm_mode=2)
+
+    def test_write_map(self):
+        skool = '\n'.join((
+            '@label=START',
+            'c50000 XOR A',
+            '@label=END',
+            ' 50001 RET',
+            '',
+            '@label=DATA',
+            'b49999 DEFB 0'
+        ))
+        skoolfile = self.write_text_file(skool, suffix='.skool')
+        mapfile = skoolfile[:-6] + '.map'
+        self.tempfiles.append(mapfile)
+        skool2bin.BinWriter(skoolfile).write_map(mapfile)
+        with open(mapfile) as f:
+            self.assertEqual(['DATA EQU 49999', 'START EQU 50000', 'END EQU 50001'], f.read().splitlines())
+        self.assertEqual(self.err.getvalue(), 'Wrote {}: 3 labels\n'.format(mapfile))
+
 if __name__ == '__main__':
     unittest.main()
@@ -7,7 +7,7 @@ from skoolkit import skool2ctl, VERSION
 ELEMENTS = 'abtdrmsc'
 
 class MockCtlWriter:
-    def __init__(self, skoolfile, elements, write_hex, preserve_base, min_address, max_address):
+    def __init__(self, skoolfile, elements, write_hex, preserve_base, min_address, max_address, cache_dir):
         global mock_ctl_writer
         self.skoolfile = skoolfile
         self.elements = elements
@@ -15,6 +15,7 @@ class MockCtlWriter:
         self.preserve_base = preserve_base
         self.min_address = min_address
         self.max_address = max_address
+        self.cache_dir = cache_dir
         self.write_called = False
         mock_ctl_writer = self
 
@@ -43,6 +44,7 @@ class Skool2CtlTest(SkoolKitTestCase):
         self.assertFalse(mock_ctl_writer.preserve_base)
         self.assertEqual(mock_ctl_writer.min_address, 0)
         self.assertEqual(mock_ctl_writer.max_address, 65536)
+        self.assertIsNone(mock_ctl_writer.cache_dir)
         self.assertTrue(mock_ctl_writer.write_called)
 
     def test_option_V(self):
@@ -77,6 +79,15 @@ class Skool2CtlTest(SkoolKitTestCase):
             self.assertEqual(mock_ctl_writer.max_address, 65536)
             self.assertTrue(mock_ctl_writer.write_called)
 
+    @patch.object(skool2ctl, 'CtlWriter', MockCtlWriter)
+    def test_option_k(self):
+        skoolfile = 'test.skool'
+        for option in ('-k', '--parse-cache'):
+            skool2ctl.main((option, 'cache', skoolfile))
+            self.assertEqual(mock_ctl_writer.skoolfile, skoolfile)
+            self.assertEqual(mock_ctl_writer.cache_dir, 'cache')
+            self.assertTrue(mock_ctl_writer.write_called)
+
     @patch.object(skool2ctl, 'CtlWriter', MockCtlWriter)
     def test_option_l(self):
         skoolfile = 'test.skool'
@@ -74,6 +74,7 @@ class MockSkoolParser:
         self.case = kwargs.get('case')
         self.create_labels = kwargs.get('create_labels')
         self.asm_labels = kwargs.get('asm_labels')
+        self.cache_dir = kwargs.get('cache_dir')
         self.snapshot = None
         self.entries = {}
         self.memory_map = []
@@ -161,6 +162,9 @@ class Skool2HtmlTest(SkoolKitTestCase):
         self.assertEqual(options.files, 'dimoP')
         self.assertEqual(options.pages, [])
         self.assertEqual(options.output_dir, None)
+        self.assertEqual(options.jobs, 1)
+        self.assertIsNone(options.image_cache)
+        self.assertIsNone(options.parse_cache)
 
     def test_no_arguments(self):
         output, error = self.run_skool2html(catch_exit=2)
@@ -716,6 +720,49 @@ class Skool2HtmlTest(SkoolKitTestCase):
             with self.assertRaisesRegex(SkoolKitError, error_msg):
                 self.run_skool2html('{} {} -d {} {}'.format(option, single_css, self.odir, skoolfile))
 
+    def _read_files(self, topdir):
+        files = {}
+        for root, subdirs, fnames in os.walk(topdir):
+            for fname in fnames:
+                path = os.path.join(root, fname)
+                with open(path, 'rb') as f:
+                    files[os.path.relpath(path, topdir)] = f.read()
+        return files
+
+    def test_option_J(self):
+        skool = []
+        for a in range(32768, 32798, 3):
+            skool.extend(('; Routine at {}'.format(a), ';', '; #UDG{},{}(udg{})'.format(a, a % 128, a), 'c{} JP {}'.format(a, a + 3), ''))
+        skoolfile = self.write_text_file('\n'.join(skool), suffix='.skool')
+        self.write_text_file('[Page:Custom]\nPageContent=#R32771 #UDG32768', '{}.ref'.format(skoolfile[:-6]))
+        self.run_skool2html('-d {}/serial {}'.format(self.odir, skoolfile))
+        exp_files = self._read_files('{}/serial'.format(self.odir))
+        self.assertIn(os.path.join(skoolfile[:-6], 'images', 'udgs', 'udg32771.png'), exp_files)
+        for option in ('-J', '--jobs'):
+            odir = '{}/{}'.format(self.odir, option)
+            output, error = self.run_skool2html('{} 2 -d {} {}'.format(option, odir, skoolfile))
+            self.assertEqual(error, '')
+            self.assertEqual(exp_files, self._read_files(odir))
+
+    def test_option_I(self):
+        skoolfile = self.write_text_file('; Routine\n;\n; #UDG32768(udg)\nc32768 RET', suffix='.skool')
+        cache_dir = '{}/cache'.format(self.odir)
+        image_path = os.path.join(skoolfile[:-6], 'images', 'udgs', 'udg.png')
+        for option in ('-I', '--image-cache'):
+            odir = '{}/{}'.format(self.odir, option)
+            output, error = self.run_skool2html('{} {} -d {} {}'.format(option, cache_dir, odir, skoolfile))
+            self.assertEqual(error, '')
+            images = self._read_files(odir)
+            self.assertIn(image_path, images)
+            cached_images = list(self._read_files(cache_dir).values())
+            self.assertEqual(cached_images, [images[image_path]])
+
+    def test_option_J_with_snapshot_macro(self):
+        skoolfile = self.write_text_file('; Routine\n;\n; #PUSHS #POKES32768,1 #POPS\nc32768 RET', suffix='.skool')
+        output, error = self.run_skool2html('-J 2 -d {} {}'.format(self.odir, skoolfile))
+        self.assertEqual(error, '')
+        self.assertIn('Writing files serially (found #CALL/#POKES/#POPS/#PUSHS/#UDGARRAY* in the input)', output)
+
     @patch.object(skool2html, 'get_class', Mock(return_value=TestHtmlWriter))
     @patch.object(skool2html, 'SkoolParser', MockSkoolParser)
     @patch.object(skool2html, 'write_disassembly', mock_write_disassembly)
@@ -892,6 +939,16 @@ class Skool2HtmlTest(SkoolKitTestCase):
             self.assertEqual(error, '')
             self.assertTrue(html_writer.file_info.replace_images)
 
+    @patch.object(skool2html, 'get_class', Mock(return_value=TestHtmlWriter))
+    @patch.object(skool2html, 'SkoolParser', MockSkoolParser)
+    @patch.object(skool2html, 'write_disassembly', mock_write_disassembly)
+    def test_option_k(self):
+        skoolfile = self.write_text_file(suffix='.skool')
+        for option in ('-k', '--parse-cache'):
+            output, error = self.run_skool2html('{} cache {}'.format(option, skoolfile))
+            self.assertEqual(error, '')
+            self.assertEqual(mock_skool_parser.cache_dir, 'cache')
+
     @patch.object(skool2html, 'get_class', Mock(return_value=TestHtmlWriter))
     @patch.object(skool2html, 'SkoolParser', MockSkoolParser)
     @patch.object(skool2html, 'write_disassembly', mock_write_disassembly)
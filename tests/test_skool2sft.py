@@ -32,10 +32,11 @@ class Skool2SftTest(SkoolKitTestCase):
     def test_default_option_values(self):
         skoolfile = 'test.skool'
         skool2sft.main((skoolfile,))
-        infile, write_hex, preserve_base = mock_sft_writer.args
+        infile, write_hex, preserve_base, cache_dir = mock_sft_writer.args
         self.assertEqual(infile, skoolfile)
         self.assertEqual(write_hex, 0)
         self.assertFalse(preserve_base)
+        self.assertIsNone(cache_dir)
         self.assertTrue(mock_sft_writer.write_called)
         self.assertEqual(mock_sft_writer.min_address, 0)
         self.assertEqual(mock_sft_writer.max_address, 65536)
@@ -50,18 +51,28 @@ class Skool2SftTest(SkoolKitTestCase):
         skoolfile = 'test.skool'
         for option in ('-h', '--hex'):
             skool2sft.main((option, skoolfile))
-            infile, write_hex, preserve_base = mock_sft_writer.args
+            infile, write_hex, preserve_base, cache_dir = mock_sft_writer.args
             self.assertEqual(infile, skoolfile)
             self.assertEqual(write_hex, 1)
             self.assertFalse(preserve_base)
             self.assertTrue(mock_sft_writer.write_called)
 
+    @patch.object(skool2sft, 'SftWriter', MockSftWriter)
+    def test_option_k(self):
+        skoolfile = 'test.skool'
+        for option in ('-k', '--parse-cache'):
+            skool2sft.main((option, 'cache', skoolfile))
+            infile, write_hex, preserve_base, cache_dir = mock_sft_writer.args
+            self.assertEqual(infile, skoolfile)
+            self.assertEqual(cache_dir, 'cache')
+            self.assertTrue(mock_sft_writer.write_called)
+
     @patch.object(skool2sft, 'SftWriter', MockSftWriter)
     def test_option_l(self):
         skoolfile = 'test.skool'
         for option in ('-l', '--hex-lower'):
             skool2sft.main((option, skoolfile))
-            infile, write_hex, preserve_base = mock_sft_writer.args
+            infile, write_hex, preserve_base, cache_dir = mock_sft_writer.args
             self.assertEqual(infile, skoolfile)
             self.assertEqual(write_hex, -1)
             self.assertFalse(preserve_base)
@@ -72,7 +83,7 @@ class Skool2SftTest(SkoolKitTestCase):
         skoolfile = 'test.skool'
         for option in ('-b', '--preserve-base'):
             skool2sft.main((option, skoolfile))
-            infile, write_hex, preserve_base = mock_sft_writer.args
+            infile, write_hex, preserve_base, cache_dir = mock_sft_writer.args
             self.assertEqual(infile, skoolfile)
             self.assertEqual(write_hex, 0)
             self.assertTrue(preserve_base)
@@ -1,10 +1,13 @@
+import io
 import re
 import unittest
 import textwrap
+from unittest.mock import patch
 
 from skoolkittest import SkoolKitTestCase
 from macrotest import CommonSkoolMacroTest, nest_macros
 from skoolkit import SkoolParsingError
+from skoolkit import skoolasm
 from skoolkit.skoolasm import AsmWriter
 from skoolkit.skoolparser import SkoolParser, CASE_LOWER, CASE_UPPER, BASE_10, BASE_16
 
@@ -724,6 +727,100 @@ class AsmWriterTest(SkoolKitTestCase, CommonSkoolMacroTest):
         warnings = self.err.getvalue().split('\n')[:-1]
         self.assertEqual(len(warnings), 0)
 
+    def test_suppressed_warnings_are_not_checked(self):
+        skool = '\n'.join((
+            '@start',
+            '; Routine at 24576',
+            ';',
+            '; Used by the routine at 24576.',
+            ';',
+            '; A Address 24576',
+            'c24576 JP 24576 ; Jump to 24576',
+        ))
+        writer = self._get_writer(skool, warn=False)
+        with patch.object(AsmWriter, 'find_unconverted_address') as mock_find:
+            writer.write()
+        mock_find.assert_not_called()
+
+    def test_write_to_file(self):
+        skool = '\n'.join((
+            '@start',
+            '; Routine',
+            'c32768 XOR A',
+            ' 32769 RET',
+            '',
+            '; Data',
+            'b32770 DEFB 0',
+        ))
+        exp_asm = self._get_asm(skool)
+        self.clear_streams()
+        outfile = io.StringIO()
+        self._get_writer(skool).write(outfile)
+        self.assertEqual(exp_asm, outfile.getvalue().split('\n')[:-1])
+        self.assertEqual('', self.out.getvalue())
+
+    def test_write_in_chunks(self):
+        skool = '\n'.join(['@start'] + ['; Routine\nc{} RET\n'.format(a) for a in range(32768, 32778)])
+        exp_asm = '\n'.join(self._get_asm(skool)) + '\n'
+        outfile = io.StringIO()
+        with patch.object(skoolasm, 'BUFFER_LINES', 9):
+            with patch.object(outfile, 'write', wraps=outfile.write) as mock_write:
+                self._get_writer(skool).write(outfile)
+        self.assertEqual(exp_asm, outfile.getvalue())
+        chunks = [c[0][0] for c in mock_write.call_args_list]
+        self.assertEqual(['; Routine\n  RET\n\n' * 3] * 3 + ['; Routine\n  RET\n\n'], chunks)
+
+    def test_write_in_parallel(self):
+        skool = ['@start', '@org=32768']
+        for a in range(32768, 32868, 2):
+            skool.extend(('; Routine', ';', '; Used by #R{}.'.format(a), '@label=L{}'.format(a), 'c{} JP {} ; Jump'.format(a, a), ''))
+        skool = '\n'.join(skool)
+        exp_asm = self._get_asm(skool)
+        self.clear_streams()
+        with patch.object(skoolasm, 'BUFFER_LINES', 20):
+            self._get_writer(skool).write(jobs=3)
+        self.assertEqual(exp_asm, self.out.getvalue().split('\n')[:-1])
+
+    def test_write_in_parallel_with_warnings(self):
+        skool = ['@start', '@org=32768']
+        for a in range(32768, 32808, 2):
+            skool.extend(('; Routine at {}'.format(a), '@label=L{}'.format(a), 'c{} JP {}'.format(a, a), ''))
+        skool = '\n'.join(skool)
+        self._get_writer(skool, warn=True).write()
+        exp_asm = self.out.getvalue()
+        exp_warnings = self.err.getvalue()
+        self.assertEqual(20, exp_warnings.count('WARNING: Comment contains address'))
+        self.clear_streams()
+        with patch.object(skoolasm, 'BUFFER_LINES', 20):
+            self._get_writer(skool, warn=True).write(jobs=3)
+        self.assertEqual(exp_asm, self.out.getvalue())
+        self.assertEqual(exp_warnings, self.err.getvalue())
+
+    def test_write_in_parallel_until_snapshot_is_modified(self):
+        skool = '\n'.join((
+            '@start',
+            '; Data',
+            'b32768 DEFB 1',
+            '',
+            '; Data',
+            'b32769 DEFB 2',
+            '',
+            '; Data #PEEK32768',
+            'b32770 DEFB 3',
+            '',
+            '; Data #POKES32768,7',
+            'b32771 DEFB 4',
+            '',
+            '; Data #PEEK32768',
+            'b32772 DEFB 5',
+        ))
+        exp_asm = self._get_asm(skool)
+        self.assertIn('; Data 1', exp_asm)
+        self.assertIn('; Data 7', exp_asm)
+        self.clear_streams()
+        self._get_writer(skool).write(jobs=2)
+        self.assertEqual(exp_asm, self.out.getvalue().split('\n')[:-1])
+
     def test_option_crlf(self):
         skool = '\n'.join((
             '@start',
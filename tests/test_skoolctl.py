@@ -1,8 +1,10 @@
+import os
 import unittest
+from unittest.mock import patch
 
 from skoolkittest import SkoolKitTestCase
 from skoolkit import SkoolParsingError
-from skoolkit.skoolctl import CtlWriter
+from skoolkit.skoolctl import CtlWriter, SkoolParser
 
 DIRECTIVES = 'bcgistuw'
 
@@ -653,6 +655,19 @@ class CtlWriterTest(SkoolKitTestCase):
         writer.write()
         return self.out.getvalue().split('\n')[:-1]
 
+    def test_cache(self):
+        skoolfile = self.write_text_file(TEST_SKOOL, suffix='.skool')
+        cache_dir = self.make_directory()
+        CtlWriter(skoolfile, cache_dir=cache_dir).write()
+        exp_ctl = self.out.getvalue()
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        self.clear_streams()
+        with patch.object(SkoolParser, '_parse_skool') as mock_parse_skool:
+            CtlWriter(skoolfile, cache_dir=cache_dir).write()
+        mock_parse_skool.assert_not_called()
+        self.assertEqual(exp_ctl, self.out.getvalue())
+
     def _test_ctl(self, skool, exp_ctl, write_hex=0, preserve_base=False, min_address=0, max_address=65536):
         ctl = self._get_ctl(skool=skool, write_hex=write_hex, preserve_base=preserve_base,
                             min_address=min_address, max_address=max_address)
@@ -178,6 +178,7 @@ class MockFileInfo:
     def __init__(self):
         self.fname = None
         self.mode = None
+        self.image_cache = None
 
     def open_file(self, *names, mode='w'):
         self.fname = join(*names)
@@ -553,6 +554,87 @@ class MethodTest(HtmlWriterTestCase):
         self.assertEqual(image_writer.frames, frames)
         self.assertEqual(image_writer.img_format, 'gif')
 
+    def _read_image(self, writer, image_path):
+        with open(join(writer.file_info.odir, image_path), 'rb') as f:
+            return f.read()
+
+    def test_write_animated_image_with_image_cache(self):
+        writer = self._get_writer()
+        cache_dir = self.make_directory()
+        image_writer = writer.image_writer
+        writes = []
+        def write_image(frames, img_file, img_format):
+            writes.append(img_format)
+            img_file.write(bytes((len(writes),)))
+        image_writer.write_image = write_image
+        image_path = 'images/test.png'
+        frames = [Frame([[Udg(56, (1, 2, 3, 4, 5, 6, 7, 8))]], 2)]
+
+        # Cache miss
+        writer.file_info = FileInfo(self.make_directory(), GAMEDIR, False, cache_dir)
+        writer.write_animated_image(image_path, frames)
+        self.assertEqual(writes, ['png'])
+        self.assertEqual(self._read_image(writer, image_path), b'\x01')
+
+        # Cache hit in another output directory
+        writer.file_info = FileInfo(self.make_directory(), GAMEDIR, True, cache_dir)
+        writer.write_animated_image(image_path, frames)
+        self.assertEqual(writes, ['png'])
+        self.assertEqual(self._read_image(writer, image_path), b'\x01')
+        self.assertIn(image_path, writer.file_info.images)
+
+        # Cache hit with the existing image replaced
+        writer.write_animated_image(image_path, frames)
+        self.assertEqual(writes, ['png'])
+
+        # Different UDG contents
+        frames = [Frame([[Udg(56, (1, 2, 3, 4, 5, 6, 7, 9))]], 2)]
+        writer.write_animated_image(image_path, frames)
+        self.assertEqual(writes, ['png', 'png'])
+        self.assertEqual(self._read_image(writer, image_path), b'\x02')
+
+        # Different scale
+        frames = [Frame([[Udg(56, (1, 2, 3, 4, 5, 6, 7, 9))]], 1)]
+        writer.write_animated_image(image_path, frames)
+        self.assertEqual(writes, ['png', 'png', 'png'])
+
+        # Original image in the cache is intact
+        frames = [Frame([[Udg(56, (1, 2, 3, 4, 5, 6, 7, 8))]], 2)]
+        writer.write_animated_image(image_path, frames)
+        self.assertEqual(len(writes), 3)
+        self.assertEqual(self._read_image(writer, image_path), b'\x01')
+
+    def test_image_from_cache_can_be_rewritten_without_cache(self):
+        writer = self._get_writer()
+        cache_dir = self.make_directory()
+        image_writer = writer.image_writer
+        writes = []
+        def write_image(frames, img_file, img_format):
+            writes.append(img_format)
+            img_file.write(bytes((len(writes),)))
+        image_writer.write_image = write_image
+        image_path = 'images/test.png'
+        frames = [Frame([[Udg(56, (1, 2, 3, 4, 5, 6, 7, 8))]], 2)]
+        odir = self.make_directory()
+
+        # Build the image, then take it from the cache
+        writer.file_info = FileInfo(self.make_directory(), GAMEDIR, True, cache_dir)
+        writer.write_animated_image(image_path, frames)
+        writer.file_info = FileInfo(odir, GAMEDIR, True, cache_dir)
+        writer.write_animated_image(image_path, frames)
+        self.assertEqual(writes, ['png'])
+
+        # Rewrite the image in place without the cache
+        writer.file_info = FileInfo(odir, GAMEDIR, True)
+        writer.write_animated_image(image_path, [Frame([[Udg(56, (1, 2, 3, 4, 5, 6, 7, 9))]], 2)])
+        self.assertEqual(self._read_image(writer, image_path), b'\x02')
+
+        # The cached image is unchanged
+        writer.file_info = FileInfo(self.make_directory(), GAMEDIR, True, cache_dir)
+        writer.write_animated_image(image_path, frames)
+        self.assertEqual(writes, ['png', 'png'])
+        self.assertEqual(self._read_image(writer, image_path), b'\x01')
+
     def test_write_animated_image_unsupported_format(self):
         writer = self._get_writer(mock_file_info=True)
 
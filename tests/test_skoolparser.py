@@ -1,4 +1,6 @@
+import os
 import unittest
+from unittest.mock import patch
 import re
 
 from skoolkittest import SkoolKitTestCase
@@ -1160,6 +1162,165 @@ class SkoolParserTest(SkoolKitTestCase):
     def test_invalid_entry_address(self):
         self.assert_error('c3000f RET', "Invalid address: '3000f'")
 
+    def test_stream(self):
+        skool = '\n'.join((
+            '; Routine',
+            ';',
+            '; Details.',
+            ';',
+            '; A Value',
+            '@label=START',
+            'c32768 LD A,1    ; {Load A',
+            ' 32770 JR 32768  ; }',
+            '; End comment.',
+            '',
+            '; Data',
+            'b32772 DEFW 32768 ; Address'
+        ))
+        parser = self._get_parser(skool, stream=True)
+
+        # Only an index of the entries is kept after the first pass
+        self.assertEqual([32768, 32772], [e.address for e in parser.memory_map])
+        routine, data = parser.memory_map
+        self.assertEqual('Routine', routine.description)
+        self.assertEqual((), routine.details)
+        self.assertEqual([], routine.registers)
+        self.assertEqual((), routine.end_comment)
+        self.assertIsNone(routine.instructions[0].comment)
+        self.assertEqual('START', parser.get_asm_label(32768))
+        self.assertEqual([32768], parser.get_entry_point_refs(32768))
+        self.assertEqual('DEFW 32768', data.instructions[0].operation)
+
+        # Each entry is parsed in full on the second pass
+        routine, data = parser.get_entries()
+        self.assertEqual(['Details.'], routine.details)
+        self.assertEqual(['End comment.'], routine.end_comment)
+        self.assertEqual('A', routine.registers[0].name)
+        self.assertEqual((2, 'Load A'), (routine.instructions[0].comment.rowspan, routine.instructions[0].comment.text))
+        self.assertEqual('JR START', routine.instructions[1].operation)
+        self.assertEqual([32768], [e.address for e in routine.instructions[0].referrers])
+        self.assertEqual('DEFW START', data.instructions[0].operation)
+        self.assertEqual('Address', data.instructions[0].comment.text)
+
+    def test_cache(self):
+        skool = '\n'.join((
+            '@start',
+            '; Routine',
+            '@label=START',
+            'c32768 LD A,1    ; Load A',
+            ' 32770 JP 32775',
+            '',
+            '; Data',
+            'b32773 DEFW 32768',
+            '',
+            '; Another routine',
+            'c32775 JR 32768',
+        ))
+        skoolfile = self.write_text_file(skool, suffix='.skool')
+        cache_dir = self.make_directory()
+        parser1 = SkoolParser(skoolfile, asm_mode=1, warnings=True, cache_dir=cache_dir)
+        warnings = self.err.getvalue()
+        self.assertIn('WARNING: Found no label for operand', warnings)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        self.err.clear()
+        with patch.object(SkoolParser, '_parse_skool') as mock_parse_skool:
+            parser2 = SkoolParser(skoolfile, asm_mode=1, warnings=True, cache_dir=cache_dir)
+        mock_parse_skool.assert_not_called()
+        self.assertEqual(warnings, self.err.getvalue())
+
+        self.assertEqual([e.address for e in parser1.memory_map], [e.address for e in parser2.memory_map])
+        routine, data, routine2 = parser2.memory_map
+        self.assertIs(routine, parser2.get_entry(32768))
+        self.assertIs(routine, routine.instructions[0].container)
+        self.assertIs(routine2, routine.instructions[1].reference.entry)
+        self.assertEqual('JP 32775', routine.instructions[1].operation)
+        self.assertEqual('JR START', routine2.instructions[0].operation)
+        self.assertEqual([routine2], parser2.get_instruction(32768).referrers)
+        self.assertEqual('Load A', routine.instructions[0].comment.text)
+
+        # A different set of options misses the cache
+        SkoolParser(skoolfile, asm_mode=2, cache_dir=cache_dir)
+        cache_files = sorted(os.listdir(cache_dir))
+        self.assertEqual(len(cache_files), 2)
+
+        # An edited skool file replaces the stale cache file for the same
+        # options, and leaves the one for the other options alone
+        self.write_text_file(skool.replace('Load A', 'Set A'), skoolfile)
+        parser3 = SkoolParser(skoolfile, asm_mode=1, warnings=True, cache_dir=cache_dir)
+        self.assertEqual('Set A', parser3.get_instruction(32768).comment.text)
+        new_cache_files = sorted(os.listdir(cache_dir))
+        self.assertEqual(len(new_cache_files), 2)
+        self.assertEqual(len(set(cache_files) & set(new_cache_files)), 1)
+
+    def _get_state(self, parser):
+        entries = []
+        for entry in parser.memory_map:
+            instructions = [(i.addr_str, i.addr_base, i.operation, i.sub, i.asm_label, [e.address for e in i.referrers]) for i in entry.instructions]
+            registers = [(r.prefix, r.name, r.contents) for r in entry.registers]
+            entries.append((entry.addr_str, registers, instructions, [e.address for e in entry.referrers]))
+        return entries
+
+    def test_variants(self):
+        skool = '\n'.join((
+            '@start',
+            '@label=START',
+            '; Routine',
+            ';',
+            '; .',
+            ';',
+            '; A Value',
+            '; bc Counter',
+            'c$8000 ld a,1     ; Load A',
+            '@ssub=LD HL,32769+1',
+            ' $8002 LD HL,32769',
+            '*$8005 JR $8000',
+            '@rsub+begin',
+            '       ld (iy+$1F),a',
+            '@rsub+end',
+            ' $8007 CALL 32773',
+            '',
+            '; Data',
+            'b32778 DEFW 32768,$8005',
+            ' 32782 DEFB 1,$0A,"a"',
+        ))
+        skoolfile = self.write_text_file(skool, suffix='.skool')
+        for asm_mode in (1, 2, 3):
+            parser = SkoolParser(skoolfile, asm_mode=asm_mode, create_labels=True, variants=True)
+            for case in (None, CASE_LOWER, CASE_UPPER):
+                for base in (None, BASE_10, BASE_16):
+                    variant = parser.get_variant(case, base)
+                    expected = SkoolParser(skoolfile, case, base, asm_mode, create_labels=True)
+                    self.assertEqual(self._get_state(expected), self._get_state(variant))
+                    self.assertEqual((case, base), (variant.case, variant.base))
+                    self.assertEqual(expected.convert_address_operand('$8000'), variant.convert_address_operand('$8000'))
+            self.assertEqual(self._get_state(SkoolParser(skoolfile, asm_mode=asm_mode, create_labels=True)), self._get_state(parser))
+
+    def test_variants_with_case_and_base(self):
+        skool = '\n'.join((
+            '@start',
+            '; Routine',
+            'c$8000 LD A,1',
+            ' $8002 JR 32768',
+        ))
+        parser = self._get_parser(skool, CASE_LOWER, BASE_10, 1, variants=True)
+        self.assertEqual(['ld a,1', 'jr 32768'], [i.operation for i in parser.memory_map[0].instructions])
+        variant = parser.get_variant(CASE_UPPER, BASE_16)
+        self.assertEqual(['LD A,$01', 'JR $8000'], [i.operation for i in variant.memory_map[0].instructions])
+        self.assertEqual(['ld a,1', 'jr 32768'], [i.operation for i in parser.memory_map[0].instructions])
+
+    def test_variants_have_their_own_snapshots(self):
+        parser = self._get_parser('@start\n; Data\nb32768 DEFB 1', asm_mode=1, variants=True)
+        variant = parser.get_variant(CASE_LOWER)
+        variant.snapshot[32768] = 2
+        self.assertEqual(1, parser.snapshot[32768])
+        self.assertEqual(1, parser.get_variant().snapshot[32768])
+
+    def test_get_variant_without_variants(self):
+        parser = self._get_parser('; Routine\nc32768 RET')
+        with self.assertRaisesRegex(SkoolParsingError, 'No mode-neutral copy of the skool file is available'):
+            parser.get_variant(CASE_LOWER)
+
     def test_entry_sizes(self):
         skool = '\n'.join((
             'c65500 LD A,1',
@@ -1678,6 +1839,83 @@ class SkoolParserTest(SkoolKitTestCase):
         self.assertEqual(entry.asm_id, 'start')
         self.assertEqual(entry.address, 16384)
 
+    def test_find_instruction(self):
+        skool = '\n'.join((
+            'r16384 start',
+            '',
+            '; Routine',
+            'c32768 LD A,(IX+1)',
+            ' 32771 JR 32768',
+            '',
+            '; Data',
+            'b32773 DEFB 1,2,3',
+            ' 32776 DEFW 32768',
+            '',
+            '; Unused',
+            'u32780 DEFS 10',
+        ))
+        parser = self._get_parser(skool)
+        exp_addresses = (
+            (32767, None),
+            (32768, 32768),
+            (32770, 32768),
+            (32771, 32771),
+            (32772, 32771),
+            (32773, 32773),
+            (32775, 32773),
+            (32776, 32776),
+            (32777, 32776),
+            (32778, None),
+            (32779, None),
+            (32780, 32780),
+            (32789, 32780),
+            (32790, None)
+        )
+        for address, exp_address in exp_addresses:
+            instruction = parser.find_instruction(address)
+            if exp_address is None:
+                self.assertIsNone(instruction, address)
+            else:
+                self.assertEqual(instruction.address, exp_address, address)
+                self.assertIs(instruction, parser.get_instruction(exp_address))
+        self.assertEqual(16384, parser.find_instruction(16384, 'START').address)
+        self.assertIsNone(parser.find_instruction(16384))
+        self.assertIsNone(parser.find_instruction(32768, 'start'))
+        self.assertEqual(32790, parser.end_address)
+
+    def test_find_entry(self):
+        skool = '\n'.join((
+            '; Routine',
+            'c40000 XOR A',
+            ' 40001 RET',
+            '',
+            '; Routine at 40002',
+            'c40002 INC A',
+            '; Mid-routine entry point',
+            '*40003 RET',
+            '',
+            '; Message',
+            't40010 DEFM "Hi"',
+        ))
+        parser = self._get_parser(skool)
+        exp_addresses = (
+            (39999, None),
+            (40000, 40000),
+            (40001, 40000),
+            (40002, 40002),
+            (40003, 40002),
+            (40004, None),
+            (40010, 40010),
+            (40011, 40010),
+            (40012, None)
+        )
+        for address, exp_address in exp_addresses:
+            entry = parser.find_entry(address)
+            if exp_address is None:
+                self.assertIsNone(entry, address)
+            else:
+                self.assertIs(entry, parser.get_entry(exp_address), address)
+
     def test_references(self):
         skool = '\n'.join((
             '; Routine',
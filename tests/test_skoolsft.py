@@ -1,4 +1,6 @@
+import os
 import unittest
+from unittest.mock import patch
 
 from skoolkittest import SkoolKitTestCase
 from skoolkit import SkoolParsingError
@@ -430,6 +432,19 @@ class SftWriterTest(SkoolKitTestCase):
         sft = self.out.getvalue().split('\n')[:-1]
         self.assertEqual(exp_sft, sft)
 
+    def test_cache(self):
+        skoolfile = self.write_text_file(TEST_SKOOL, suffix='.skool')
+        cache_dir = self.make_directory()
+        SftWriter(skoolfile, cache_dir=cache_dir).write()
+        exp_sft = self.out.getvalue()
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        self.clear_streams()
+        with patch.object(SftWriter, '_parse_skool') as mock_parse_skool:
+            SftWriter(skoolfile, cache_dir=cache_dir).write()
+        mock_parse_skool.assert_not_called()
+        self.assertEqual(exp_sft, self.out.getvalue())
+
     def test_invalid_address(self):
         writer = SftWriter(self.write_text_file('c4000f RET'))
         with self.assertRaises(SkoolParsingError) as cm:
@@ -1,4 +1,5 @@
 import re
+import json
 import unittest
 from unittest.mock import patch, Mock
 
@@ -287,12 +288,13 @@ class MockSftParser:
         self.wrote_skool = True
 
 class MockSkoolWriter:
-    def __init__(self, snapshot, ctl_parser, options):
+    def __init__(self, snapshot, ctl_parser, options, cache=None):
         global mock_skool_writer
         mock_skool_writer = self
         self.snapshot = snapshot
         self.ctl_parser = ctl_parser
         self.options = options
+        self.cache = cache
         self.wrote_skool = False
 
     def write_skool(self, write_refs, text):
@@ -373,6 +375,7 @@ class OptionsTest(SkoolKitTestCase):
         self.assertIsNone(options.ctlfile)
         self.assertIsNone(options.sftfile)
         self.assertIsNone(options.genctlfile)
+        self.assertIsNone(options.cache)
         self.assertFalse(options.ctl_hex)
         self.assertFalse(options.asm_hex)
         self.assertFalse(options.asm_lower)
@@ -475,6 +478,32 @@ class OptionsTest(SkoolKitTestCase):
             self.assertEqual(mock_ctl_parser.ctlfile, ctlfile)
             self.assertTrue(mock_skool_writer.wrote_skool)
 
+    def test_option_C(self):
+        binfile = self.write_bin_file((205, 3, 128, 201, 175, 201), suffix='.bin')
+        ctl = 'c 32768 Start\nc 32771 Exit\nc 32772 Clear A\ni 32774\n'
+        for option in ('-C', '--cache'):
+            ctlfile = self.write_text_file(ctl, suffix='.ctl')
+            cachefile = '{}/cache.json'.format(self.make_directory())
+            args = '-c {} -o 32768 {} {}'.format(ctlfile, binfile, '{}')
+            exp_skool = self.run_sna2skool(args.format(''))[0]
+            skool = self.run_sna2skool(args.format('{} {}'.format(option, cachefile)))[0]
+            self.assertEqual(exp_skool, skool)
+
+            # Modify the cached skool text of each entry
+            with open(cachefile) as f:
+                cache = json.load(f)
+            for key, text in cache['skool'].items():
+                cache['skool'][key] = text.replace('; ', '; Cached: ', 1)
+            with open(cachefile, 'w') as f:
+                json.dump(cache, f)
+
+            # Now modify the control file for one entry only
+            self.write_text_file(ctl.replace('Exit', 'Finish'), ctlfile)
+            skool = self.run_sna2skool(args.format('{} {}'.format(option, cachefile)))[0]
+            self.assertIn('; Cached: Start', skool)
+            self.assertIn('; Finish', skool)
+            self.assertIn('; Cached: Clear A', skool)
+
     @patch.object(sna2skool, 'CtlParser', MockCtlParser)
     @patch.object(sna2skool, 'SkoolWriter', MockSkoolWriter)
     def test_option_e(self):
@@ -898,6 +927,64 @@ class OptionsTest(SkoolKitTestCase):
             self.assertEqual(mock_skool_writer.options.line_width, line_width)
             self.assertTrue(mock_skool_writer.wrote_skool)
 
+    @patch.object(sna2skool, 'CtlParser', MockCtlParser)
+    @patch.object(sna2skool, 'SkoolWriter', MockSkoolWriter)
+    def test_option_x(self):
+        data = [
+            62, 1,        # 32768 LD A,1
+            205, 9, 128,  # 32770 CALL 32777
+            24, 254,      # 32773 JR 32773
+            255, 255,     # 32775 DEFB 255,255
+            60,           # 32777 INC A
+            201           # 32778 RET
+        ]
+        binfile = self.write_bin_file(data, suffix='.bin')
+        for option in ('-x', '--trace'):
+            ctlfile = self.write_text_file()
+            output, error = self.run_sna2skool('-g {} {} 32768,32773 -o 32768 {}'.format(ctlfile, option, binfile))
+            self.assertEqual(error, 'Traced 4 instructions from 32768\n')
+            with open(ctlfile, 'r') as f:
+                gen_ctl = [line.rstrip() for line in f]
+            self.assertEqual(['c 32768', 'b 32775', 'c 32777', 'i 32779'], gen_ctl)
+            self.assertTrue(mock_skool_writer.wrote_skool)
+
+    @patch.object(sna2skool, 'CtlParser', MockCtlParser)
+    @patch.object(sna2skool, 'SkoolWriter', MockSkoolWriter)
+    def test_option_x_from_snapshot_pc(self):
+        ram = [0] * 49152
+        ram[16384:16390] = [
+            205, 5, 128,  # 32768 CALL 32773
+            24, 254,      # 32771 JR 32771
+            201           # 32773 RET
+        ]
+        header = [0] * 86
+        header[30] = 54 # Version 3
+        header[8:10] = (0, 192) # SP=49152
+        header[32:34] = (0, 128) # PC=32768
+        z80file = self.write_z80_file(header, ram)
+        ctlfile = self.write_text_file()
+        output, error = self.run_sna2skool('-g {} -x ,32771,10 -s 32768 -e 32774 {}'.format(ctlfile, z80file))
+        self.assertEqual(error, 'Traced 2 instructions from 32768\n')
+        with open(ctlfile, 'r') as f:
+            gen_ctl = [line.rstrip() for line in f]
+        self.assertEqual(['c 32768', 'c 32773', 'i 32774'], gen_ctl)
+
+    def test_option_x_with_invalid_specification(self):
+        binfile = self.write_bin_file([201], suffix='.bin')
+        with self.assertRaisesRegex(SkoolKitError, 'Invalid trace specification: 32768,x'):
+            self.run_sna2skool('-g {} -x 32768,x {}'.format(self.write_text_file(), binfile))
+
+    def test_option_x_without_option_g(self):
+        binfile = self.write_bin_file([201], suffix='.bin')
+        for option in ('-x', '--trace'):
+            with self.assertRaisesRegex(SkoolKitError, '^--trace requires --generate-ctl$'):
+                self.run_sna2skool('{} 0 {}'.format(option, binfile))
+
+    def test_option_x_without_start_address_for_binary_file(self):
+        binfile = self.write_bin_file([201], suffix='.bin')
+        with self.assertRaisesRegex(SkoolKitError, 'A start address is required to trace {}'.format(binfile)):
+            self.run_sna2skool('-g {} -x ,65535 {}'.format(self.write_text_file(), binfile))
+
     @patch.object(sna2skool, 'get_snapshot', mock_get_snapshot)
     @patch.object(sna2skool, 'CtlParser', MockCtlParser)
     @patch.object(sna2skool, 'SkoolWriter', MockSkoolWriter)
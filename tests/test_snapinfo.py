@@ -1,9 +1,15 @@
+import json
+import os
 import unittest
 from unittest.mock import patch
 
 from skoolkittest import SkoolKitTestCase
 from skoolkit import SkoolKitError, snapinfo, VERSION
 
+SPRITE = [24, 60, 126, 219, 255, 126, 60, 24]
+
+MASK = [195, 129, 0, 0, 0, 0, 129, 195]
+
 class MockBasicLister:
     def list_basic(self, snapshot):
         global mock_basic_lister
@@ -18,6 +24,16 @@ class MockVariableLister:
         self.snapshot = snapshot
         return 'VARIABLES DONE!'
 
+class MockImageWriter:
+    def __init__(self, options):
+        global image_writer
+        image_writer = self
+        self.options = options
+
+    def write_image(self, frames, img_file, img_format):
+        self.frames = frames
+        self.img_format = img_format
+
 class SnapinfoTest(SkoolKitTestCase):
     def _test_sna(self, ram, exp_output, options='', header=None):
         if header is None:
@@ -851,6 +867,19 @@ class SnapinfoTest(SkoolKitTestCase):
         exp_output = ['47983-48035-26 BB6F-BBA3-1A: {}'.format(seq_str)]
         self._test_sna(ram, exp_output, '-f {}-${:02x}'.format(seq_str, step))
 
+    def test_option_f_multiple_times(self):
+        ram = [0] * 49152
+        ram[30000 - 16384:30003 - 16384] = (1, 2, 3)
+        ram[40000 - 16384:40004 - 16384:2] = (4, 5)
+        ram[50000 - 16384:50002 - 16384] = (1, 2)
+        exp_output = [
+            '30000-30002-1 7530-7532-1: 1,2,3',
+            '30000-30001-1 7530-7531-1: 1,2',
+            '50000-50001-1 C350-C351-1: 1,2',
+            '40000-40002-2 9C40-9C42-2: 4,5'
+        ]
+        self._test_sna(ram, exp_output, '-f 1,2,3 --find 4,5-2 -f 1,2')
+
     def test_option_find_with_nonexistent_byte_sequence(self):
         ram = [0] * 49152
         exp_output = []
@@ -870,6 +899,65 @@ class SnapinfoTest(SkoolKitTestCase):
         self._test_bad_spec('--find', '7,8,9-z-5', exp_error.format('z-5'), False)
         self._test_bad_spec('-f', '10,11,12-q-?', exp_error.format('q-?'), False)
 
+    def test_option_g(self):
+        ram = [0] * 49152
+        ram[40000 - 16384:40008 - 16384] = SPRITE
+        ram[30000 - 16384:30016 - 16384:2] = SPRITE
+        ram[30001 - 16384:30016 - 16384:2] = MASK
+        exp_output = [
+            '30000-30015 7530-753F: masked 131 #UDG30000,step=2:30001',
+            '40000-40007 9C40-9C47: udg 115 #UDG40000'
+        ]
+        self._test_sna(ram, exp_output, '-g 5')
+
+    def test_option_find_graphics_with_limit(self):
+        ram = [0] * 49152
+        ram[40000 - 16384:40008 - 16384] = SPRITE
+        ram[30000 - 16384:30016 - 16384:2] = SPRITE
+        ram[30001 - 16384:30016 - 16384:2] = MASK
+        exp_output = ['30000-30015 7530-753F: masked 131 #UDG30000,step=2:30001']
+        self._test_sna(ram, exp_output, '--find-graphics 1')
+
+    def test_option_g_128k(self):
+        ram = [0] * 49152
+        ram[40000 - 16384:40008 - 16384] = SPRITE
+        bank3 = [0] * 16384
+        bank3[100:116] = MASK + SPRITE
+        z80file = self.write_z80(ram, machine_id=4, pages={3: bank3})[1]
+        exp_output = [
+            '49252-49267 C064-C073: masked 131 #UDG49260:49252 (bank 3)',
+            '40000-40007 9C40-9C47: udg 115 #UDG40000'
+        ]
+        output, error = self.run_snapinfo('-g 3 {}'.format(z80file))
+        self.assertEqual(error, '')
+        self.assertEqual(exp_output, output)
+
+    @patch.object(snapinfo, 'ImageWriter', MockImageWriter)
+    @patch.object(snapinfo, 'open')
+    def test_option_c(self, mock_open):
+        ram = [0] * 49152
+        ram[40000 - 16384:40008 - 16384] = SPRITE
+        snafile = self.write_bin_file([0] * 27 + ram, suffix='.sna')
+        output, error = self.run_snapinfo('-g 1 -c sprites.png {}'.format(snafile))
+        self.assertEqual(error, '')
+        self.assertEqual(['40000-40007 9C40-9C47: udg 115 #UDG40000'], output)
+        mock_open.assert_called_with('sprites.png', 'wb')
+        self.assertEqual({snapinfo.GIF_ENABLE_ANIMATION: 0, snapinfo.PNG_ENABLE_ANIMATION: 0}, image_writer.options)
+        self.assertEqual('png', image_writer.img_format)
+        udgs = image_writer.frames[0].udgs
+        self.assertEqual(1, len(udgs))
+        self.assertEqual(SPRITE, udgs[0][0].data)
+
+    @patch.object(snapinfo, 'ImageWriter', MockImageWriter)
+    @patch.object(snapinfo, 'open')
+    def test_option_contact_sheet_gif(self, mock_open):
+        snafile = self.write_bin_file([0] * 49179, suffix='.sna')
+        output, error = self.run_snapinfo('--find-graphics 10 --contact-sheet sprites.GIF {}'.format(snafile))
+        self.assertEqual(error, '')
+        self.assertEqual([], output)
+        mock_open.assert_called_with('sprites.GIF', 'wb')
+        self.assertEqual('gif', image_writer.img_format)
+
     def test_option_p_with_single_address(self):
         ram = [0] * 49152
         address = 31759
@@ -1098,6 +1186,17 @@ class SnapinfoTest(SkoolKitTestCase):
             exp_output.append('{0}-{1} {0:04X}-{1:04X}: {2}'.format(a, a + len(text) - 1, text))
         self._test_sna(ram, exp_output, '--find-text {}'.format(text))
 
+    def test_option_t_multiple_times(self):
+        ram = [0] * 49152
+        ram[25000 - 16384:25005 - 16384] = [ord(c) for c in 'ABCDE']
+        ram[45000 - 16384:45003 - 16384] = [ord(c) for c in 'XYZ']
+        exp_output = [
+            '25000-25004 61A8-61AC: ABCDE',
+            '25001-25002 61A9-61AA: BC',
+            '45000-45002 AFC8-AFCA: XYZ'
+        ]
+        self._test_sna(ram, exp_output, '-t XYZ --find-text BC -t ABCDE')
+
     def test_option_t_with_no_occurrences(self):
         ram = [0] * 49152
         exp_output = []
@@ -1183,6 +1282,87 @@ class SnapinfoTest(SkoolKitTestCase):
         self._test_bad_spec('--find-tile', '8,9-z-5', exp_error.format('z-5'), False)
         self._test_bad_spec('-T', '11,12-q-?', exp_error.format('q-?'), False)
 
+    def _write_batch(self, snapshots):
+        snapdir = self.make_directory()
+        for name, ram in snapshots:
+            self.write_bin_file([0] * 27 + ram, '{}/{}'.format(snapdir, name))
+        return snapdir
+
+    def _run_batch(self, args):
+        output, error = self.run_snapinfo(args)
+        self.assertEqual(error, '')
+        return [json.loads(line) for line in output]
+
+    def test_batch_find_in_directory(self):
+        ram1 = [0] * 49152
+        ram1[20000 - 16384:20003 - 16384] = (1, 2, 3)
+        ram2 = [0] * 49152
+        ram2[40000 - 16384:40006 - 16384:2] = (1, 2, 3)
+        snapdir = self._write_batch((('a.sna', ram1), ('b.sna', ram2), ('notes.txt', ram2)))
+        exp_results = [
+            {'file': os.path.join(snapdir, 'a.sna'), 'address': 20000, 'end': 20002, 'step': 1, 'match': '1,2,3'},
+            {'file': os.path.join(snapdir, 'b.sna'), 'address': 40000, 'end': 40004, 'step': 2, 'match': '1,2,3'}
+        ]
+        self.assertEqual(exp_results, self._run_batch('-f 1,2,3-1-2 {}'.format(snapdir)))
+
+    def test_batch_find_text_in_files_and_glob_pattern(self):
+        text = 'HELLO'
+        ram = [0] * 49152
+        ram[30000 - 16384:30005 - 16384] = [ord(c) for c in text]
+        snapdir = self._write_batch((('a.sna', ram), ('b.sna', [0] * 49152), ('c.sna', ram)))
+        exp_results = [
+            {'file': '{}/a.sna'.format(snapdir), 'address': 30000, 'end': 30004, 'step': 1, 'match': text},
+            {'file': '{}/c.sna'.format(snapdir), 'address': 30000, 'end': 30004, 'step': 1, 'match': text},
+        ]
+        self.assertEqual(exp_results[:1], self._run_batch('-t {0} {1}/a.sna {1}/b.sna'.format(text, snapdir)))
+        self.assertEqual(exp_results, self._run_batch('--find-text {} {}/*.sna'.format(text, snapdir)))
+
+    def test_batch_find_tile_with_worker_processes(self):
+        tile_data = [0, 24, 12, 6, 127, 6, 12, 24]
+        snapshots = []
+        for n in range(6):
+            ram = [0] * 49152
+            ram[:2048:256] = tile_data
+            ram[30000 + n - 16384:30008 + n - 16384] = tile_data
+            snapshots.append(('{}.sna'.format(n), ram))
+        snapdir = self._write_batch(snapshots)
+        exp_results = [
+            {'file': os.path.join(snapdir, '{}.sna'.format(n)), 'address': 30000 + n, 'end': 30007 + n, 'step': 1, 'match': '0,24,12,6,127,6,12,24'}
+            for n in range(6)
+        ]
+        for option in ('-J', '--jobs'):
+            self.assertEqual(exp_results, self._run_batch('{} 3 -T 0,0 {}'.format(option, snapdir)))
+
+    def test_batch_with_bad_snapshot(self):
+        snapdir = self._write_batch((('bad.sna', [0] * 3),))
+        exp_results = [{'file': os.path.join(snapdir, 'bad.sna'), 'error': 'RAM size is 3'}]
+        self.assertEqual(exp_results, self._run_batch('-f 1 {}'.format(snapdir)))
+
+    def test_batch_with_truncated_snapshots(self):
+        ram = [0] * 49152
+        ram[32768 - 16384:32771 - 16384] = (1, 2, 3)
+        snapdir = self._write_batch((('a.sna', ram), ('d.sna', ram)))
+        self.write_bin_file([0] * 10, '{}/b.z80'.format(snapdir))
+        self.write_bin_file([90, 88, 83, 84], '{}/c.szx'.format(snapdir))
+        exp_results = [
+            {'file': os.path.join(snapdir, 'a.sna'), 'address': 32768, 'end': 32770, 'step': 1, 'match': '1,2,3'},
+            {'file': os.path.join(snapdir, 'b.z80'), 'error': '{}: file is truncated'.format(os.path.join(snapdir, 'b.z80'))},
+            {'file': os.path.join(snapdir, 'c.szx'), 'error': '{}: file is truncated'.format(os.path.join(snapdir, 'c.szx'))},
+            {'file': os.path.join(snapdir, 'd.sna'), 'address': 32768, 'end': 32770, 'step': 1, 'match': '1,2,3'}
+        ]
+        for options in ('', '-J 2 '):
+            self.assertEqual(exp_results, self._run_batch('{}-f 1,2,3 {}'.format(options, snapdir)))
+
+    def test_batch_with_invalid_byte_sequence(self):
+        snapdir = self._write_batch((('a.sna', [0] * 49152),))
+        with self.assertRaisesRegex(SkoolKitError, '^Invalid byte sequence: x$'):
+            self.run_snapinfo('-f x {}'.format(snapdir))
+
+    def test_batch_without_search_option(self):
+        snapdir = self._write_batch((('a.sna', [0] * 49152),))
+        with self.assertRaisesRegex(SkoolKitError, '^Batch mode requires --find, --find-text or --find-tile$'):
+            self.run_snapinfo('-p 16384 {}'.format(snapdir))
+
     def test_option_V(self):
         for option in ('-V', '--version'):
             output, error = self.run_snapinfo(option, err_lines=True, catch_exit=0)
@@ -1,7 +1,7 @@
 import unittest
 
 from skoolkittest import SkoolKitTestCase
-from skoolkit.snapshot import get_snapshot, make_z80_ram_block, SnapshotError
+from skoolkit.snapshot import get_registers, get_snapshot, make_z80_ram_block, read_snapshot, SnapshotError
 
 class SnapshotTest(SkoolKitTestCase):
     def _check_ram(self, ram, exp_ram, model, out_7ffd, pages, page):
@@ -109,6 +109,15 @@ class Z80Test(SnapshotTest):
         exp_ram += [128] * (49152 - len(exp_ram))
         self._test_z80(exp_ram, 1, True)
 
+    def test_z80v1_compressed_block_ending_with_single_ED(self):
+        header = [0] * 30
+        header[6] = 255 # Set PC > 0 to indicate a v1 Z80 snapshot
+        header[12] |= 32 # Signal that the RAM data block is compressed
+        ramz = [237, 237, 255, 0] * 192 + [237, 237, 191, 0] + [237]
+        z80_file = self.write_bin_file(header + ramz + [0, 237, 237, 0], suffix='.z80')
+        snapshot = get_snapshot(z80_file)
+        self.assertEqual([0] * 49151 + [237], snapshot[16384:])
+
     def test_z80v2_16k_compressed(self):
         exp_ram = [(n + 7) & 255 for n in range(49152)]
         self._test_z80(exp_ram, 2, True, modify=True)
@@ -148,6 +157,21 @@ class Z80Test(SnapshotTest):
         pages = {4: [(n + 249) & 255 for n in range(16384)]}
         self._test_z80(exp_ram, 3, False, machine_id=4, pages=pages, page=4)
 
+    def test_z80v2_128k_compressed(self):
+        exp_ram = [237] * 300 + [237, 1, 237, 237] + [(n * 3) & 255 for n in range(49152 - 304)]
+        self._test_z80(exp_ram, 2, True, machine_id=3)
+
+    def test_z80v3_128k_compressed_every_page(self):
+        exp_ram = [(n + 11) & 255 for n in range(49152)]
+        pages = {}
+        for bank in (0, 1, 3, 4, 6, 7):
+            # Runs of ED and other bytes, single EDs, and incompressible data
+            data = [237] * (bank + 2) + [bank] * 1000 + [237, bank, 237]
+            data += [(n * bank) & 255 for n in range(16384 - len(data))]
+            pages[bank] = data
+        for page in range(8):
+            self._test_z80(exp_ram, 3, True, machine_id=4, pages=pages, page=page)
+
     def test_bad_z80(self):
         header = [0] * 30
         header[6] = 255 # Set PC > 0 to indicate a v1 Z80 snapshot
@@ -247,5 +271,119 @@ class SZXTest(SnapshotTest):
         pages = {1: [(n + 19) & 255 for n in range(16384)]}
         self._test_szx(exp_ram, False, machine_id=2, pages=pages, page=1)
 
+class ReadSnapshotTest(SkoolKitTestCase):
+    def test_indexing_and_slicing(self):
+        ram = [(n + 29) & 255 for n in range(49152)]
+        snapshot = read_snapshot(self.write_bin_file([0] * 27 + ram, suffix='.sna'))
+        exp_memory = [0] * 16384 + ram
+        self.assertEqual(len(snapshot), 65536)
+        for index in (0, 16383, 16384, 32767, 32768, 65535, -1, -16384):
+            self.assertEqual(snapshot[index], exp_memory[index])
+        for index in (slice(16380, 16390), slice(30000, 50000, 3), slice(65530, 65540), slice(20000, 10000), slice(None, None, -7)):
+            self.assertEqual(snapshot[index], exp_memory[index])
+        self.assertEqual(list(snapshot), exp_memory)
+        self.assertEqual(snapshot.tobytes(), bytes(exp_memory))
+        self.assertEqual(snapshot, exp_memory)
+        with self.assertRaisesRegex(IndexError, 'snapshot index out of range'):
+            snapshot[65536]
+
+    def test_bank_views(self):
+        header = [0] * 27
+        banks = {b: [(n + b * 41) & 255 for n in range(16384)] for b in range(8)}
+        config = [0, 0, 4, 0] # PC, port 7ffd (page 4 mapped to 49152-65535), TR-DOS ROM not paged
+        sna = header + banks[5] + banks[2] + banks[4] + config
+        for b in (0, 1, 3, 6, 7):
+            sna += banks[b]
+        snapshot = read_snapshot(self.write_bin_file(sna, suffix='.sna'))
+        for b in range(8):
+            self.assertEqual(snapshot.bank(b).tolist(), banks[b])
+        self.assertEqual(snapshot[49152:], banks[4])
+
+    def test_banks_are_decompressed_when_first_accessed(self):
+        exp_ram = [(n + 3) & 255 for n in range(49152)]
+        model, z80file = self.write_z80(exp_ram, 3, True, machine_id=4)
+        with open(z80file, 'rb') as f:
+            z80 = bytearray(f.read())
+        # Corrupt page 7
+        i = 86
+        while z80[i + 2] != 10:
+            i += 3 + z80[i] + 256 * z80[i + 1]
+        z80[i + 3:i + 7] = (237, 237, 0, 7)
+        with open(z80file, 'wb') as f:
+            f.write(z80)
+
+        snapshot = read_snapshot(z80file)
+        self.assertEqual(snapshot[16384:49152], exp_ram[:32768])
+        with self.assertRaisesRegex(SnapshotError, 'Found ED ED 00 07'):
+            snapshot.bank(7)
+
+    def test_is128(self):
+        ram = [0] * 49152
+        snapshots = (
+            (self.write_bin_file([0] * 27 + ram, suffix='.sna'), False),
+            (self.write_bin_file([0] * 27 + ram + [0] * 4 + [0] * 81920, suffix='.sna'), True),
+            (self.write_z80(ram, 1)[1], False),
+            (self.write_z80(ram, 3, machine_id=0)[1], False),
+            (self.write_z80(ram, 3, machine_id=4, out_7ffd=3)[1], True),
+            (self.write_szx(ram, machine_id=1), False),
+            (self.write_szx(ram, machine_id=2, pages={p: [0] * 16384 for p in (1, 3, 4, 6, 7)}), True)
+        )
+        for snapfile, is128 in snapshots:
+            snapshot = read_snapshot(snapfile)
+            self.assertIs(snapshot.is128, is128, snapfile)
+        self.assertEqual(snapshot.slots, (5, 2, 0))
+
+    def test_szx_page_not_found(self):
+        szx = self._get_szx_header(2)
+        for page in (5, 2, 0):
+            szx.extend(self._get_zxstrampage(page, True, [0] * 16384))
+        snapshot = read_snapshot(self.write_bin_file(szx, suffix='.szx'))
+        self.assertEqual(snapshot[16384:16387], [0, 0, 0])
+        with self.assertRaisesRegex(SnapshotError, 'Page 3 not found'):
+            snapshot.bank(3)
+
+class RegistersTest(SkoolKitTestCase):
+    def test_sna_48k(self):
+        header = [0] * 27
+        header[13:15] = (2, 1) # BC=258
+        header[19] = 4 # IFF2=1
+        header[23:25] = (254, 127) # SP=32766
+        header[25] = 1 # IM 1
+        ram = [0] * 49152
+        ram[16382:16384] = (0, 128) # PC=32768 on the stack
+        registers = get_registers(self.write_bin_file(header + ram, suffix='.sna'))
+        self.assertEqual(registers['bc'], 258)
+        self.assertEqual(registers['iff'], 1)
+        self.assertEqual(registers['im'], 1)
+        self.assertEqual(registers['pc'], 32768)
+        self.assertEqual(registers['sp'], 32768)
+
+    def test_z80v3(self):
+        header = [0] * 86
+        header[30] = 54 # Version 3
+        header[0] = 7 # A=7
+        header[11:13] = (3, 1) # R=131
+        header[25:27] = (52, 18) # IX=4660
+        header[27] = 1 # IFF1=1
+        header[29] = 2 # IM 2
+        header[32:34] = (1, 128) # PC=32769
+        registers = get_registers(self.write_z80_file(header, [0] * 49152))
+        self.assertEqual(registers['a'], 7)
+        self.assertEqual(registers['r'], 131)
+        self.assertEqual(registers['ix'], 4660)
+        self.assertEqual(registers['iff'], 1)
+        self.assertEqual(registers['im'], 2)
+        self.assertEqual(registers['pc'], 32769)
+
+    def test_szx(self):
+        z80r = [0] * 37
+        z80r[6:8] = (0, 64) # HL=16384
+        z80r[22:24] = (0, 192) # PC=49152
+        z80r[28] = 1 # IM 1
+        registers = get_registers(self.write_szx([0] * 49152, registers=z80r))
+        self.assertEqual(registers['hl'], 16384)
+        self.assertEqual(registers['pc'], 49152)
+        self.assertEqual(registers['im'], 1)
+
 if __name__ == '__main__':
     unittest.main()
@@ -3,7 +3,7 @@ import unittest
 
 from skoolkittest import SkoolKitTestCase
 from skoolkit import SkoolKitError
-from skoolkit.snaskool import Disassembly, SkoolWriter, write_ctl
+from skoolkit.snaskool import Disassembly, DisassemblyCache, SkoolWriter, write_ctl
 from skoolkit.ctlparser import CtlParser
 
 DISASSEMBLY_SNAPSHOT = [0] * 65536
@@ -1047,11 +1047,11 @@ class MockOptions:
 
 class SkoolWriterTest(SkoolKitTestCase):
     def _get_writer(self, snapshot, ctl, line_width=79, defb_size=8, defb_mod=1, zfill=False, defm_width=66,
-                    asm_hex=False, asm_lower=False):
+                    asm_hex=False, asm_lower=False, cache=None):
         ctl_parser = CtlParser()
         ctl_parser.parse_ctl(self.write_text_file(ctl))
         options = MockOptions(line_width, defb_size, defb_mod, zfill, defm_width, asm_hex, asm_lower)
-        return SkoolWriter(snapshot, ctl_parser, options)
+        return SkoolWriter(snapshot, ctl_parser, options, cache)
 
     def _test_write_skool(self, snapshot, ctl, exp_skool, write_refs=0, show_text=False, **kwargs):
         writer = self._get_writer(snapshot, ctl, **kwargs)
@@ -1065,6 +1065,23 @@ class SkoolWriterTest(SkoolKitTestCase):
         skool = self.out.getvalue().split('\n')[:-1]
         self.assertEqual(SKOOL, skool)
 
+    def test_write_skool_with_cache(self):
+        cachefile = '{}/cache.json'.format(self.make_directory())
+        cache = DisassemblyCache(cachefile)
+        writer = self._get_writer(WRITER_SNAPSHOT, WRITER_CTL, cache=cache)
+        writer.write_skool(0, False)
+        skool = self.out.getvalue().split('\n')[:-1]
+        self.assertEqual(SKOOL, skool)
+        self.assertEqual(self.out.getvalue(), '\n'.join(cache.skool.values()))
+        cache.save()
+
+        cache = DisassemblyCache(cachefile)
+        writer = self._get_writer(WRITER_SNAPSHOT, WRITER_CTL, cache=cache)
+        self.clear_streams()
+        writer.write_skool(0, False)
+        skool = self.out.getvalue().split('\n')[:-1]
+        self.assertEqual(SKOOL, skool)
+
     def test_empty_disassembly(self):
         snapshot = []
         ctl = ''
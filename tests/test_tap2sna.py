@@ -1,5 +1,7 @@
 import os
+import threading
 import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from zipfile import ZipFile
 from io import BytesIO
 from unittest.mock import patch, Mock
@@ -26,6 +28,26 @@ def mock_write_z80(ram, namespace, z80):
     global snapshot
     snapshot = [0] * 16384 + ram
 
+class TapeRequestHandler(BaseHTTPRequestHandler):
+    # Serve tapes from the 'tapes' dictionary of the server, each with an
+    # ETag, and record the response code of every request
+    def do_GET(self):
+        content, etag = self.server.tapes[self.path]
+        if self.headers.get('If-None-Match') == etag:
+            self.server.responses.append(304)
+            self.send_response(304)
+            self.end_headers()
+        else:
+            self.server.responses.append(200)
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
 class Tap2SnaTest(SkoolKitTestCase):
     def _write_tap(self, blocks, zip_archive=False, tap_name=None):
         tap_data = []
@@ -295,6 +317,24 @@ class Tap2SnaTest(SkoolKitTestCase):
         self.assertEqual(snapshot[start], data[0])
         self.assertEqual(snapshot[(start + 2 * step) & 65535], data[2])
 
+    def test_ram_load_block_counted_from_end_of_tape(self):
+        blocks = [create_tap_data_block([n]) for n in (1, 2, 3)]
+        load_options = '--ram load=0,30000 --ram load=-1,30001 --ram load=-2,30002 --ram load=3,30003'
+        snapshot = self._get_snapshot(load_options=load_options, blocks=blocks)
+        self.assertEqual([3, 2, 1, 3], snapshot[30000:30004])
+
+    def test_ram_load_block_counted_from_end_of_tzx(self):
+        blocks = [create_tzx_data_block([n]) for n in (4, 5)]
+        load_options = '--ram load=0,30000 --ram load=1,30001 --ram load=-1,30002'
+        snapshot = self._get_snapshot(load_options=load_options, blocks=blocks, tzx=True)
+        self.assertEqual([5, 4, 4], snapshot[30000:30003])
+
+    def test_ram_load_nonexistent_block_counted_from_end_of_tape(self):
+        tapfile = self._write_tap([create_tap_data_block([1])])
+        with self.assertRaises(SkoolKitError) as cm:
+            self.run_tap2sna('--ram load=-1,16384 {} test.z80'.format(tapfile))
+        self.assertEqual(cm.exception.args[0], 'Error while getting snapshot test.z80: Block -1 not found')
+
     def test_ram_load_bad_address(self):
         self._test_bad_spec('--ram load=1,abcde', 'Invalid integer in load spec: 1,abcde')
 
@@ -397,6 +437,49 @@ class Tap2SnaTest(SkoolKitTestCase):
         snapshot = get_snapshot(z80file)
         self.assertEqual(data, snapshot[start:start + len(data)])
 
+    def test_load_blocks_out_of_order_from_zip_archive(self):
+        blocks = [create_tzx_data_block([n] * 3) for n in (1, 2, 3)]
+        zip_fname = self._write_tzx(blocks, zip_archive=True)
+        z80file = self.write_bin_file(suffix='.z80')
+        load_options = '--ram load=3,30000 --ram load=1,30010 --ram load=2,30020'
+        output, error = self.run_tap2sna('--force {} {} {}'.format(load_options, zip_fname, z80file))
+        self.assertEqual(error, '')
+        snapshot = get_snapshot(z80file)
+        self.assertEqual([3, 3, 3], snapshot[30000:30003])
+        self.assertEqual([1, 1, 1], snapshot[30010:30013])
+        self.assertEqual([2, 2, 2], snapshot[30020:30023])
+
+    def test_blocks_after_the_last_one_loaded_are_not_read(self):
+        blocks = [create_tzx_data_block([1, 2]), [22, 0]] # Unknown block ID 0x16
+        snapshot = self._get_snapshot(load_options='--ram load=1,40000', blocks=blocks, tzx=True)
+        self.assertEqual([1], snapshot[40000:40001])
+
+    def test_tape_read_from_unseekable_stream(self):
+        class Stream(BytesIO):
+            def seekable(self):
+                return False
+
+        tap = []
+        for data in ([1] * 65000, [2, 3], [4]):
+            tap.extend(create_tap_data_block(data))
+        open_tape = lambda: Stream(bytes(tap))
+        tape = tap2sna._Tape('tap', open_tape, Stream())
+        self.assertEqual([(1, 65002), (2, 4), (3, 3)], list(tape.blocks()))
+        self.assertEqual(bytes(create_data_block([4])), tape[2])
+        self.assertEqual(bytes(create_data_block([2, 3])), tape[1])
+        with self.assertRaises(IndexError):
+            tape[3]
+        tape.close()
+
+    def test_tzx_blocks_without_tape_data(self):
+        blocks = [(48, 1, 65), create_tzx_data_block([5]), (32, 0, 0)]
+        tzxfile = self._write_tzx(blocks)
+        tape = tap2sna._get_tape(tzxfile)
+        self.assertEqual([(1, None), (2, 3), (3, None)], list(tape.blocks()))
+        self.assertIsNone(tape[0])
+        self.assertEqual(bytes(create_data_block([5])), tape[1])
+        tape.close()
+
     def test_invalid_tzx_file(self):
         tzxfile = self.write_bin_file([1, 2, 3], suffix='.tzx')
         z80file = 'test.z80'
@@ -682,5 +765,209 @@ class Tap2SnaTest(SkoolKitTestCase):
         self.assertEqual(output[0], '{}: file already exists; use -f to overwrite'.format(z80file))
         self.assertEqual(error, '')
 
+    def _start_server(self, tapes):
+        server = HTTPServer(('127.0.0.1', 0), TapeRequestHandler)
+        server.tapes = tapes
+        server.responses = []
+        thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+        thread.start()
+        def stop():
+            server.shutdown()
+            thread.join()
+            server.server_close()
+        self.addCleanup(stop)
+        return server, 'http://127.0.0.1:{}'.format(server.server_port)
+
+    def _get_zip(self, tap_data):
+        archive = BytesIO()
+        with ZipFile(archive, 'w') as z:
+            z.writestr('game.tap', bytes(tap_data))
+        return archive.getvalue()
+
+    def test_option_cache(self):
+        tapes = {'/game.zip': (self._get_zip(create_tap_data_block([1, 2])), '"v1"')}
+        server, base_url = self._start_server(tapes)
+        url = base_url + '/game.zip'
+        cache_dir = self.make_directory()
+        z80file = self.write_bin_file(suffix='.z80')
+        args = '-f --ram load=1,30000 {} {} {}'
+        output, error = self.run_tap2sna(args.format('-c ' + cache_dir, url, z80file))
+        self.assertEqual(error, '')
+        self.assertEqual(['Downloading {}'.format(url), 'Extracting game.tap', 'Writing {}'.format(z80file)], output)
+        self.assertEqual([200], server.responses)
+
+        output, error = self.run_tap2sna(args.format('--cache ' + cache_dir, url, z80file))
+        self.assertEqual(error, '')
+        self.assertEqual(['Using cached {}'.format(url), 'Extracting game.tap', 'Writing {}'.format(z80file)], output)
+        self.assertEqual([200, 304], server.responses)
+        self.assertEqual([1, 2], get_snapshot(z80file)[30000:30002])
+
+        # The tape has changed on the server
+        tapes['/game.zip'] = (self._get_zip(create_tap_data_block([3, 4])), '"v2"')
+        output, error = self.run_tap2sna(args.format('-c ' + cache_dir, url, z80file))
+        self.assertEqual(error, '')
+        self.assertEqual('Downloading {}'.format(url), output[0])
+        self.assertEqual([200, 304, 200], server.responses)
+        self.assertEqual([3, 4], get_snapshot(z80file)[30000:30002])
+
+    def test_option_cache_with_corrupted_file(self):
+        tapes = {'/game.tap': (bytes(create_tap_data_block([5])), '"v1"')}
+        server, base_url = self._start_server(tapes)
+        url = base_url + '/game.tap'
+        cache_dir = self.make_directory()
+        z80file = self.write_bin_file(suffix='.z80')
+        args = '-f -c {} --ram load=1,30000 {} {}'.format(cache_dir, url, z80file)
+        self.run_tap2sna(args)
+        for fname in os.listdir(cache_dir):
+            if not fname.endswith('.json'):
+                with open(os.path.join(cache_dir, fname), 'wb') as f:
+                    f.write(bytes(create_tap_data_block([6])))
+        output, error = self.run_tap2sna(args)
+        self.assertEqual(error, '')
+        self.assertEqual('Downloading {}'.format(url), output[0])
+        self.assertEqual([200, 200], server.responses)
+        self.assertEqual([5], get_snapshot(z80file)[30000:30001])
+
+    def test_option_offline(self):
+        tapes = {'/game.tap': (bytes(create_tap_data_block([7, 8])), '"v1"')}
+        server, base_url = self._start_server(tapes)
+        url = base_url + '/game.tap'
+        cache_dir = self.make_directory()
+        z80file = self.write_bin_file(suffix='.z80')
+        self.run_tap2sna('-f -c {} {} {}'.format(cache_dir, url, z80file))
+        output, error = self.run_tap2sna('-f -c {} --offline --ram load=1,30000 {} {}'.format(cache_dir, url, z80file))
+        self.assertEqual(error, '')
+        self.assertEqual(['Using cached {}'.format(url), 'Writing {}'.format(z80file)], output)
+        self.assertEqual([200], server.responses)
+        self.assertEqual([7, 8], get_snapshot(z80file)[30000:30002])
+
+    def test_option_offline_with_uncached_url(self):
+        url = 'http://127.0.0.1:1/game.zip'
+        with self.assertRaises(SkoolKitError) as cm:
+            self.run_tap2sna('--offline -c {} {} test.z80'.format(self.make_directory(), url))
+        self.assertEqual(cm.exception.args[0], 'Error while getting snapshot test.z80: {}: not found in the cache or mirror'.format(url))
+
+    def test_option_mirror(self):
+        mirror = self.make_directory()
+        self.write_bin_file(self._get_zip(create_tap_data_block([9])), '{}/game.zip'.format(mirror))
+        url = 'http://127.0.0.1:1/pub/games/game.zip'
+        z80file = self.write_bin_file(suffix='.z80')
+        output, error = self.run_tap2sna('-f --offline --mirror {} --ram load=1,30000 {} {}'.format(mirror, url, z80file))
+        self.assertEqual(error, '')
+        self.assertEqual(['Using {}/game.zip'.format(mirror), 'Extracting game.tap', 'Writing {}'.format(z80file)], output)
+        self.assertEqual([9], get_snapshot(z80file)[30000:30001])
+
+    def test_mapped_file(self):
+        fname = self.write_bin_file(range(10))
+        f = tap2sna._MappedFile(fname)
+        self.assertEqual(b'\x00\x01\x02', f.read(3))
+        self.assertEqual(8, f.seek(5, 1))
+        self.assertEqual(b'\x08\x09', f.read())
+        self.assertEqual(10, f.seek(100))
+        self.assertEqual(b'', f.read(1))
+        self.assertEqual(1, f.seek(-9, 2))
+        f.close()
+        self.assertTrue(f.closed)
+
+    def _write_manifest(self, *jobs):
+        return self.write_text_file('\n'.join(jobs), suffix='.txt')
+
+    def test_manifest(self):
+        odir = self.make_directory()
+        zip_fname = self._write_tap([create_tap_data_block([1, 2]), create_tap_data_block([3])], zip_archive=True)
+        tapfile = self._write_tap([create_tap_data_block([4, 5])])
+        t2sfile = self.write_text_file('{} c.z80\n--ram load=1,32768 ; Load block 1\n--reg pc=32768'.format(tapfile), suffix='.t2s')
+        manifest = self._write_manifest(
+            '; Tapes to convert',
+            '{} a.z80 --ram load=1,30000'.format(zip_fname),
+            '',
+            '{} b.z80 --ram load=2,40000 -s 40000 # Block 2'.format(zip_fname),
+            '@{}'.format(t2sfile)
+        )
+        output, error = self.run_tap2sna('-d {} --manifest {}'.format(odir, manifest))
+        self.assertEqual(error, '')
+        exp_output = [
+            '{}/a.z80: OK'.format(odir),
+            '{}/b.z80: OK'.format(odir),
+            '{}/c.z80: OK'.format(odir),
+            'Converted 3 of 3 tapes (0 failed, 0 skipped)'
+        ]
+        self.assertEqual(exp_output, output)
+        self.assertEqual([1, 2], get_snapshot('{}/a.z80'.format(odir))[30000:30002])
+        self.assertEqual([3], get_snapshot('{}/b.z80'.format(odir))[40000:40001])
+        self.assertEqual([4, 5], get_snapshot('{}/c.z80'.format(odir))[32768:32770])
+        with open('{}/b.z80'.format(odir), 'rb') as f:
+            z80 = f.read(34)
+        self.assertEqual(40000, z80[32] + 256 * z80[33])
+
+    def test_manifest_opens_each_archive_once(self):
+        odir = self.make_directory()
+        zip_fname = self._write_tap([create_tap_data_block([1])], zip_archive=True)
+        manifest = self._write_manifest(*['{} {}.z80 --ram load=1,{}'.format(zip_fname, n, 30000 + n) for n in range(3)])
+        with patch.object(tap2sna.zipfile, 'ZipFile', Mock(wraps=ZipFile)) as mock_zipfile:
+            output, error = self.run_tap2sna('-d {} -m {}'.format(odir, manifest))
+        self.assertEqual(error, '')
+        self.assertEqual('Converted 3 of 3 tapes (0 failed, 0 skipped)', output[-1])
+        self.assertEqual(1, mock_zipfile.call_count)
+        self.assertEqual([1], get_snapshot('{}/2.z80'.format(odir))[30002:30003])
+
+    def test_manifest_with_failed_and_skipped_jobs(self):
+        odir = self.make_directory()
+        tapfile = self._write_tap([create_tap_data_block([1])])
+        self.write_bin_file(path='{}/b.z80'.format(odir))
+        manifest = self._write_manifest(
+            '{} a.z80 --ram load=2,30000'.format(tapfile),
+            '{} b.z80'.format(tapfile),
+            'nonexistent.tap c.z80',
+            '{} d.z80'.format(tapfile)
+        )
+        with self.assertRaises(SkoolKitError) as cm:
+            self.run_tap2sna('-m {} -d {}'.format(manifest, odir))
+        self.assertEqual(cm.exception.args[0], 'Failed to convert 2 of 4 tapes')
+        exp_output = [
+            '{}/a.z80: Error: Block 2 not found'.format(odir),
+            '{}/b.z80: file already exists; use -f to overwrite'.format(odir),
+            '{}/c.z80: Error: nonexistent.tap: file not found'.format(odir),
+            '{}/d.z80: OK'.format(odir),
+            'Converted 1 of 4 tapes (2 failed, 1 skipped)'
+        ]
+        self.assertEqual(exp_output, self.out.getvalue().split('\n')[:-1])
+        self.assertEqual(self.err.getvalue(), '')
+
+    @patch.object(tap2sna, 'make_z80', Mock(side_effect=[ValueError(), None]))
+    def test_manifest_with_job_that_fails_without_a_message(self):
+        odir = self.make_directory()
+        manifest = self._write_manifest('game.tap a.z80', 'game.tap b.z80')
+        with self.assertRaises(SkoolKitError) as cm:
+            self.run_tap2sna('-m {} -d {}'.format(manifest, odir))
+        self.assertEqual(cm.exception.args[0], 'Failed to convert 1 of 2 tapes')
+        exp_output = [
+            '{}/a.z80: Error: ValueError'.format(odir),
+            '{}/b.z80: OK'.format(odir),
+            'Converted 1 of 2 tapes (1 failed, 0 skipped)'
+        ]
+        self.assertEqual(exp_output, self.out.getvalue().split('\n')[:-1])
+
+    def test_manifest_with_worker_processes(self):
+        odir = self.make_directory()
+        jobs = []
+        for n in range(4):
+            tapfile = self._write_tap([create_tap_data_block([n + 1])])
+            jobs.append('{} {}.z80 --ram load=1,{}'.format(tapfile, n, 30000 + n))
+        manifest = self._write_manifest(*jobs)
+        output, error = self.run_tap2sna('-J 2 -d {} -m {}'.format(odir, manifest))
+        self.assertEqual(error, '')
+        exp_output = ['{}/{}.z80: OK'.format(odir, n) for n in range(4)]
+        exp_output.append('Converted 4 of 4 tapes (0 failed, 0 skipped)')
+        self.assertEqual(exp_output, output)
+        for n in range(4):
+            self.assertEqual([n + 1], get_snapshot('{}/{}.z80'.format(odir, n))[30000 + n:30001 + n])
+
+    def test_manifest_with_invalid_job(self):
+        manifest = self._write_manifest('game.tap game.z80', 'game.tap')
+        with self.assertRaises(SkoolKitError) as cm:
+            self.run_tap2sna('-m {}'.format(manifest))
+        self.assertEqual(cm.exception.args[0], 'Invalid job on line 2 of {}: game.tap'.format(manifest))
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,5 @@
 from skoolkittest import SkoolKitTestCase
+from skoolkit.disassembler import Disassembler
 from skoolkit.z80 import assemble, get_size
 
 OPERATIONS = (
@@ -1365,6 +1366,26 @@ class Z80Test(SkoolKitTestCase):
         for address, operation, exp_data in RELATIVE_JUMPS:
             self._test_assembly(operation, exp_data, address)
 
+    def test_repeated_relative_jumps(self):
+        for address, exp_data in ((30000, (24, 254)), (30002, (24, 252)), (30000, (24, 254))):
+            self._test_assembly('JR 30000', exp_data, address)
+        for address in (29000, 30000):
+            self._test_assembly('JP 30000', (195, 48, 117), address)
+
+    def test_round_trip_every_opcode(self):
+        memory = [0] * 65536
+        sequences = [(op, 128, 250, 1) for op in range(256)]
+        for prefix in (203, 221, 237, 253):
+            sequences.extend((prefix, op, 128, 250) for op in range(256))
+        for prefix in (221, 253):
+            sequences.extend((prefix, 203, 128, op) for op in range(256))
+        for seq in sequences:
+            memory[32768:32772] = seq
+            for asm_hex in (False, True):
+                instruction = Disassembler(memory, asm_hex=asm_hex).disassemble(32768, 32769)[0]
+                if not instruction.operation.startswith('DEFB'):
+                    self._test_assembly(instruction.operation, tuple(instruction.bytes), 32768, True)
+
     def test_unusual_whitespace(self):
         for operation, exp_data in UNUSUAL_WHITESPACE:
             self._test_assembly(operation, exp_data)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import time
+import gc
+
+# Use the current development version of SkoolKit
+SKOOLKIT_HOME = os.environ.get('SKOOLKIT_HOME')
+if not SKOOLKIT_HOME:
+    sys.stderr.write('SKOOLKIT_HOME is not set; aborting\n')
+    sys.exit(1)
+if not os.path.isdir(SKOOLKIT_HOME):
+    sys.stderr.write('SKOOLKIT_HOME={}; directory not found\n'.format(SKOOLKIT_HOME))
+    sys.exit(1)
+sys.path.insert(0, SKOOLKIT_HOME)
+
+from skoolkit import z80
+from skoolkit.disassembler import Disassembler
+
+ORG = 32768
+
+def write(line):
+    print(line)
+
+def clear_caches():
+    z80._normalise.cache_clear()
+    z80._assemble_instruction.cache_clear()
+
+def clock(method, *args, cold=False):
+    # Return the shortest of three timings of method(*args)
+    elapsed = []
+    for n in range(3):
+        if cold:
+            clear_caches()
+        gc.collect()
+        start = time.time()
+        method(*args)
+        elapsed.append((time.time() - start) * 1000)
+    return min(elapsed)
+
+def opcode_sequences():
+    # Yield a 4-byte sequence for every opcode (with and without prefixes),
+    # with operand bytes that exercise positive and negative offsets
+    for args in ((1, 52, 18), (128, 250, 128)):
+        for opcode in range(256):
+            yield (opcode,) + args
+            for prefix in (203, 221, 237, 253):
+                yield (prefix, opcode) + args[1:]
+        for prefix in (221, 253):
+            for opcode in range(256):
+                yield (prefix, 203, args[0], opcode)
+
+def disassemble_all(asm_hex):
+    instructions = []
+    memory = [0] * 65536
+    for seq in opcode_sequences():
+        memory[ORG:ORG + 4] = seq
+        disassembler = Disassembler(memory, asm_hex=asm_hex)
+        instruction = disassembler.disassemble(ORG, ORG + 1)[0]
+        if not instruction.operation.startswith('DEFB'):
+            instructions.append((instruction.operation, tuple(instruction.bytes)))
+    return instructions
+
+def assemble_all(instructions, passes):
+    for n in range(passes):
+        for operation, data in instructions:
+            z80.assemble(operation, ORG)
+
+def check(instructions):
+    failures = 0
+    for operation, data in instructions:
+        assembled = z80.assemble(operation, ORG)
+        if assembled != data:
+            write('{}: expected {}, got {}'.format(operation, data, assembled))
+            failures += 1
+    return failures
+
+def parse_args(args):
+    passes = 10
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == '-n':
+            passes = int(args[i + 1])
+            i += 1
+        else:
+            show_usage()
+        i += 1
+    return passes
+
+def show_usage():
+    sys.stderr.write("""Usage: {} [options]
+
+  Disassemble every Z80 opcode (in decimal and in hexadecimal), check that the
+  current development version of SkoolKit assembles each instruction back to
+  the same bytes, and time how long it takes to assemble them all, both with
+  empty caches and with warm caches.
+
+Available options:
+  -n N  Assemble every instruction N times in each timing (default: 10)
+""".format(os.path.basename(sys.argv[0])))
+    sys.exit()
+
+###############################################################################
+# Begin
+###############################################################################
+passes = parse_args(sys.argv[1:])
+instructions = disassemble_all(False) + disassemble_all(True)
+failures = check(instructions)
+write('Round trip: {} instructions, {} failures'.format(len(instructions), failures))
+num_ops = len(instructions) * passes
+elapsed = clock(assemble_all, instructions, 1, cold=True)
+write('Cold: {:0.2f}ms for {} operations ({:0.2f}us per operation)'.format(elapsed, len(instructions), 1000 * elapsed / len(instructions)))
+clock(assemble_all, instructions, 1)
+elapsed = clock(assemble_all, instructions, passes)
+write('Warm: {:0.2f}ms for {} operations ({:0.2f}us per operation)'.format(elapsed, num_ops, 1000 * elapsed / num_ops))
+if failures:
+    sys.exit(1)
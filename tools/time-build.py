@@ -16,7 +16,7 @@ if not os.path.isdir(SKOOLKIT_HOME):
 sys.path.insert(0, SKOOLKIT_HOME)
 
 from skoolkit.image import ImageWriter
-from skoolkit.skoolhtml import Udg, Frame
+from skoolkit.graphics import Udg, Frame
 
 def write(line):
     print(line)
@@ -54,8 +54,8 @@ def get_method(iw, method):
 def _get_attr_map(iw, udgs, scale):
     frame = Frame(udgs, scale)
     use_flash = True
-    colours, attrs, flash_rect = iw._get_colours(frame, use_flash)
-    palette, attr_map = iw._get_palette(colours, attrs, frame.has_trans)
+    iw._get_colours(frame, use_flash)
+    palette, attr_map = iw._get_palette(frame.colours, frame.attrs, frame.has_trans)
     palette_size = len(palette) // 3
     if palette_size > 4:
         bit_depth = 4
@@ -92,10 +92,19 @@ def _compare_methods(iw, method1, method2, udg_arrays, scales, mask_type):
     else:
         write('{} is slower than {} for all UDG arrays tested'.format(method1, method2))
 
-def bd4(iw, method1, method2, udg_arrays, scales):
+def bd4(iw, method1, method2, udg_arrays, scales, masked=False):
     mask_type = 0
 
-    if not udg_arrays:
+    if masked:
+        mask_type = 1
+        if not udg_arrays:
+            mask_data = (15,) * 8
+            udg_arrays = (
+                [[Udg(4, (1,) * 8, mask_data), Udg(13, (2,) * 8, mask_data)]],   # 2 UDGs, 2 attrs
+                [[Udg(i, (240,) * 8, mask_data) for i in range(16)]] * 64,  # 1024 UDGs, 16 attrs
+                [[Udg(i, (240,) * 8, mask_data) for i in range(24)]] * 128  # 3072 UDGs, 24 attrs
+            )
+    elif not udg_arrays:
         udg_arrays = (
             [[Udg(4, (1,) * 8), Udg(13, (2,) * 8)]],        # 2 UDGs, 2 attrs
             [[Udg(i, (240,) * 8) for i in range(16)]] * 64, # 1024 UDGs, 16 attrs
@@ -133,6 +142,7 @@ def bd2(iw, method1, method2, udg_arrays, scales, masked=False):
     _compare_methods(iw, method1, method2, udg_arrays, scales, mask_type)
 
 def bd1(iw, method1, method2, udg_arrays, scales, masked=False):
+    mask_type = int(masked)
     udg_arrays = udg_arrays or []
 
     if not udg_arrays:
@@ -148,7 +158,7 @@ def bd1(iw, method1, method2, udg_arrays, scales, masked=False):
 
     scales = scales or (1, 2, 3, 4, 5, 6, 7, 8)
 
-    _compare_methods(iw, method1, method2, udg_arrays, scales, mask_type=0)
+    _compare_methods(iw, method1, method2, udg_arrays, scales, mask_type)
 
 def bd1_at(iw, method1, method2, udg_arrays, scales):
     bd1(iw, method1, method2, udg_arrays, scales, masked=True)
@@ -156,27 +166,29 @@ def bd1_at(iw, method1, method2, udg_arrays, scales):
 def bd2_at(iw, method1, method2, udg_arrays, scales):
     bd2(iw, method1, method2, udg_arrays, scales, masked=True)
 
+def bd4_at(iw, method1, method2, udg_arrays, scales):
+    bd4(iw, method1, method2, udg_arrays, scales, masked=True)
+
 METHODS = (
     # Bit depth 4
-    ('bd_any', 'bd4_nt', bd4),
+    ('bd_any', 'bulk_nt', bd4),
+    ('bd_any', 'bulk_at', bd4_at),
 
     # Bit depth 2
-    ('bd_any', 'bd2_at', bd2_at),
-    ('bd_any', 'bd2_nt', bd2),
+    ('bd_any', 'bulk_nt', bd2),
+    ('bd_any', 'bulk_at', bd2_at),
 
     # Bit depth 1
-    ('bd_any', 'bd1_at', bd1_at),
-    ('bd_any', 'bd1_nt', bd1),
-    ('bd1_at', 'bd1_nt', bd1)
+    ('bd_any', 'bulk_nt', bd1),
+    ('bd_any', 'bulk_at', bd1_at)
 )
 
 def time_methods(method1_name, method2_name, udg_arrays, scale):
-    for name1, name2, f in METHODS:
-        if set((name1, name2)) == set((method1_name, method2_name)):
-            f(ImageWriter(), name1, name2, udg_arrays, scale)
-            break
-    else:
+    comparisons = [(n1, n2, f) for n1, n2, f in METHODS if set((n1, n2)) == set((method1_name, method2_name))]
+    if not comparisons:
         write('{} v. {}: not implemented'.format(method1_name, method2_name))
+    for name1, name2, f in comparisons:
+        f(ImageWriter(), name1, name2, udg_arrays, scale)
 
 def list_methods():
     prefix = '_build_image_data_'
@@ -249,7 +261,7 @@ udg_arrays = tuple([eval(udg_array) for udg_array in udgs])
 gc.disable()
 if run_all:
     for name1, name2, f in METHODS:
-        time_methods(name1, name2, udg_arrays, scales)
+        f(ImageWriter(), name1, name2, udg_arrays, scales)
         write('')
 else:
     time_methods(method1_name, method2_name, udg_arrays, scales)
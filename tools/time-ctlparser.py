@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import time
+import gc
+import tempfile
+
+# Use the current development version of SkoolKit
+SKOOLKIT_HOME = os.environ.get('SKOOLKIT_HOME')
+if not SKOOLKIT_HOME:
+    sys.stderr.write('SKOOLKIT_HOME is not set; aborting\n')
+    sys.exit(1)
+if not os.path.isdir(SKOOLKIT_HOME):
+    sys.stderr.write('SKOOLKIT_HOME={}; directory not found\n'.format(SKOOLKIT_HOME))
+    sys.exit(1)
+sys.path.insert(0, SKOOLKIT_HOME)
+
+from skoolkit.ctlparser import CtlParser
+
+def write(line):
+    print(line)
+
+def clock(setup, method):
+    # Return the shortest of three timings of method(setup()), and the result
+    elapsed = []
+    for n in range(3):
+        arg = setup()
+        gc.collect()
+        start = time.time()
+        result = method(arg)
+        elapsed.append((time.time() - start) * 1000)
+    return min(elapsed), result
+
+def write_ctl(ctlfile, block_size, sub_block_size):
+    # Write a control file that covers 64K with a block every 'block_size'
+    # bytes and a sub-block every 'sub_block_size' bytes, and an ASM directive
+    # and @ignoreua directive on every other sub-block
+    lines = []
+    for address in range(0, 65536, block_size):
+        lines.append('c {} Routine at {}'.format(address, address))
+        lines.append('D {} Description.'.format(address))
+        for sub_address in range(address, min(address + block_size, 65536), sub_block_size):
+            if sub_address % (2 * sub_block_size) == 0:
+                lines.append('@ {} label=L{}'.format(sub_address, sub_address))
+                lines.append('@ {} ignoreua:i'.format(sub_address))
+            if sub_address > address:
+                lines.append('B {},{} Comment'.format(sub_address, sub_block_size))
+    lines.append('i 65535')
+    with open(ctlfile, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return len(lines)
+
+def parse_ctl(ctlfile):
+    ctl_parser = CtlParser()
+    ctl_parser.parse_ctl(ctlfile)
+    return ctl_parser
+
+def parse_args(args):
+    block_size, sub_block_size = 256, 4
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == '-b':
+            block_size = int(args[i + 1])
+            i += 1
+        elif arg == '-s':
+            sub_block_size = int(args[i + 1])
+            i += 1
+        else:
+            show_usage()
+        i += 1
+    return block_size, sub_block_size
+
+def show_usage():
+    sys.stderr.write("""Usage: {} [options]
+
+  Time how long it takes the current development version of SkoolKit to parse a
+  synthetic control file that covers 64K and build its blocks.
+
+Available options:
+  -b N  Start a new block every N bytes (default: 256)
+  -s N  Start a new sub-block every N bytes (default: 4)
+""".format(os.path.basename(sys.argv[0])))
+    sys.exit()
+
+###############################################################################
+# Begin
+###############################################################################
+block_size, sub_block_size = parse_args(sys.argv[1:])
+with tempfile.TemporaryDirectory() as tmpdir:
+    ctlfile = os.path.join(tmpdir, 'test.ctl')
+    num_lines = write_ctl(ctlfile, block_size, sub_block_size)
+    write('Control file: {} lines'.format(num_lines))
+    elapsed, ctl_parser = clock(lambda: ctlfile, parse_ctl)
+    write('CtlParser.parse_ctl: {:0.2f}ms'.format(elapsed))
+    # get_blocks() modifies the parser's ASM directives, so use a fresh parser
+    # each time
+    elapsed, blocks = clock(lambda: parse_ctl(ctlfile), CtlParser.get_blocks)
+    write('CtlParser.get_blocks: {:0.2f}ms ({} blocks, {} sub-blocks)'.format(elapsed, len(blocks), sum(len(b.blocks) for b in blocks)))
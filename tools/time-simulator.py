@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import time
+
+# Use the current development version of SkoolKit
+SKOOLKIT_HOME = os.environ.get('SKOOLKIT_HOME')
+if not SKOOLKIT_HOME:
+    sys.stderr.write('SKOOLKIT_HOME is not set; aborting\n')
+    sys.exit(1)
+if not os.path.isdir(SKOOLKIT_HOME):
+    sys.stderr.write('SKOOLKIT_HOME={}; directory not found\n'.format(SKOOLKIT_HOME))
+    sys.exit(1)
+sys.path.insert(0, SKOOLKIT_HOME)
+
+from skoolkit.simulator import Simulator
+
+# A loop that copies and modifies a page of memory, and exercises the CB, DD
+# and ED prefixes, a CALL and a RET on every iteration
+CODE = (
+    0x31, 0x00, 0x00,       # 32768 LD SP,0
+    0x21, 0x00, 0x40,       # 32771 LD HL,16384
+    0x11, 0x00, 0xC0,       # 32774 LD DE,49152
+    0x01, 0x00, 0x01,       # 32777 LD BC,256
+    0x7E,                   # 32780 LD A,(HL)
+    0xC6, 0x03,             # 32781 ADD A,3
+    0x12,                   # 32783 LD (DE),A
+    0x23,                   # 32784 INC HL
+    0x13,                   # 32785 INC DE
+    0x0B,                   # 32786 DEC BC
+    0x78,                   # 32787 LD A,B
+    0xB1,                   # 32788 OR C
+    0x20, 0xF5,             # 32789 JR NZ,32780
+    0xDD, 0x21, 0x00, 0x90, # 32791 LD IX,36864
+    0xDD, 0x34, 0x05,       # 32795 INC (IX+5)
+    0xCB, 0x27,             # 32798 SLA A
+    0xCD, 0x28, 0x80,       # 32800 CALL 32808
+    0xC3, 0x03, 0x80,       # 32803 JP 32771
+    0x00, 0x00,             # 32806 DEFB 0,0
+    0xED, 0x44,             # 32808 NEG
+    0xC9,                   # 32810 RET
+)
+
+def write(line):
+    print(line)
+
+def clock(max_operations):
+    # Return the shortest of three timings of running the code
+    elapsed = []
+    for n in range(3):
+        memory = bytearray(65536)
+        memory[32768:32768 + len(CODE)] = CODE
+        simulator = Simulator(memory)
+        start = time.time()
+        simulator.run(32768, max_operations=max_operations)
+        elapsed.append(time.time() - start)
+    return min(elapsed)
+
+def parse_args(args):
+    max_operations = 10000000
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == '-n':
+            max_operations = int(args[i + 1])
+            i += 1
+        else:
+            show_usage()
+        i += 1
+    return max_operations
+
+def show_usage():
+    sys.stderr.write("""Usage: {} [options]
+
+  Time how long it takes the current development version of SkoolKit's Z80
+  simulator to execute a loop of typical instructions, and report the number
+  of millions of instructions executed per second.
+
+Available options:
+  -n N  Execute N instructions (default: 10000000)
+""".format(os.path.basename(sys.argv[0])))
+    sys.exit()
+
+###############################################################################
+# Begin
+###############################################################################
+max_operations = parse_args(sys.argv[1:])
+elapsed = clock(max_operations)
+write('Simulator.run: {} instructions in {:0.2f}s ({:0.2f} MIPS)'.format(max_operations, elapsed, max_operations / elapsed / 1000000))
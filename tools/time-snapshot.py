@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import time
+import gc
+import random
+import tempfile
+
+# Use the current development version of SkoolKit
+SKOOLKIT_HOME = os.environ.get('SKOOLKIT_HOME')
+if not SKOOLKIT_HOME:
+    sys.stderr.write('SKOOLKIT_HOME is not set; aborting\n')
+    sys.exit(1)
+if not os.path.isdir(SKOOLKIT_HOME):
+    sys.stderr.write('SKOOLKIT_HOME={}; directory not found\n'.format(SKOOLKIT_HOME))
+    sys.exit(1)
+sys.path.insert(0, SKOOLKIT_HOME)
+
+from skoolkit.snapshot import get_snapshot, make_z80_ram_block, read_snapshot
+
+def write(line):
+    print(line)
+
+def clock(method, *args):
+    # Return the shortest of three timings of method(*args)
+    elapsed = []
+    for n in range(3):
+        gc.collect()
+        start = time.time()
+        method(*args)
+        elapsed.append((time.time() - start) * 1000)
+    return min(elapsed)
+
+def make_bank(rnd):
+    # Build a 16K RAM bank that resembles the memory of a typical game: runs
+    # of identical bytes (which compress to ED ED nn bb), stray ED bytes, and
+    # incompressible code and data
+    bank = []
+    while len(bank) < 16384:
+        kind = rnd.randrange(4)
+        if kind == 0:
+            bank.extend([rnd.choice((0, 0, 255, 237, rnd.randrange(256)))] * rnd.randrange(5, 600))
+        elif kind == 1:
+            bank.extend((237, rnd.randrange(256)))
+        else:
+            bank.extend(rnd.randrange(256) for i in range(rnd.randrange(1, 400)))
+    return bank[:16384]
+
+def write_z80_128k(fname, rnd):
+    header = [0] * 86
+    header[30] = 54 # Version 3
+    header[32] = 1 # PC=1
+    header[34] = 4 # 128K
+    z80 = header
+    for bank in range(8):
+        z80 += make_z80_ram_block(make_bank(rnd), bank + 3)
+    with open(fname, 'wb') as f:
+        f.write(bytearray(z80))
+
+def read_corpus(snapshots):
+    for fname in snapshots:
+        for page in range(8):
+            get_snapshot(fname, page)
+
+def peek_corpus(snapshots):
+    for fname in snapshots:
+        for page in range(8):
+            read_snapshot(fname, page)[49152]
+
+def parse_args(args):
+    num_snapshots = 20
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == '-n':
+            num_snapshots = int(args[i + 1])
+            i += 1
+        else:
+            show_usage()
+        i += 1
+    return num_snapshots
+
+def show_usage():
+    sys.stderr.write("""Usage: {} [options]
+
+  Time how long it takes the current development version of SkoolKit to read
+  every RAM page from each snapshot in a corpus of compressed 128K Z80
+  snapshots, both in full (as a list) and by peeking at a single byte in the
+  page.
+
+Available options:
+  -n N  Build a corpus of N snapshots (default: 20)
+""".format(os.path.basename(sys.argv[0])))
+    sys.exit()
+
+###############################################################################
+# Begin
+###############################################################################
+num_snapshots = parse_args(sys.argv[1:])
+rnd = random.Random(128)
+with tempfile.TemporaryDirectory() as tmpdir:
+    snapshots = []
+    for n in range(num_snapshots):
+        fname = os.path.join(tmpdir, 'game{}.z80'.format(n))
+        write_z80_128k(fname, rnd)
+        snapshots.append(fname)
+    size = sum(os.path.getsize(f) for f in snapshots)
+    write('Corpus: {} 128K Z80 snapshots ({} bytes)'.format(num_snapshots, size))
+    elapsed = clock(read_corpus, snapshots)
+    num_reads = num_snapshots * 8
+    write('get_snapshot: {:0.2f}ms for {} reads ({:0.2f}ms per read)'.format(elapsed, num_reads, elapsed / num_reads))
+    elapsed = clock(peek_corpus, snapshots)
+    write('read_snapshot: {:0.2f}ms for {} peeks ({:0.2f}ms per peek)'.format(elapsed, num_reads, elapsed / num_reads))